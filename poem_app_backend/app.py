@@ -2,35 +2,85 @@ from flask import Flask, send_from_directory, current_app, render_template, requ
 import jwt
 from datetime import datetime
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config import Config
 from routes.auth import auth_bp
 from routes.articles import articles_bp
 from routes.generate import generate_bp
 from routes.likes import likes_bp
+from routes.tags import tags_bp
+from routes.sync import sync_bp
+from routes.admin import admin_bp
 from models.supabase_client import supabase_client
 from routes.upload import upload_bp
 from routes.cloudflare import cloudflare_bp
+from utils.json_provider import FastJSONProvider, feed_fragments
+from utils.http_cache import response_compressor
+from utils.mail_outbox import mail_outbox
+from utils.email_templates import email_templates
+from utils.article_events import article_events
+from utils.search_index import search_index
+from utils.tag_index import tag_index
+from utils.trending import trending_index
+from utils.related import related_index
+from utils.near_duplicates import near_duplicates
+from utils.replica import article_replica
+from utils.change_feed import change_feed
+from utils.live_likes import like_stream
+from utils.abuse_guard import like_guard
+from utils.rate_limit import rate_limiter
+from utils.warm_snapshot import warm_snapshot
 
 from dotenv import load_dotenv
 load_dotenv()
 
 from builtins import print, Exception, RuntimeError
 
+# --preload 预热时在主进程中提前导入的重型模块。
+# 普通启动时它们都在首次使用时才导入；预热后 worker 通过写时复制共享这些只读模块对象。
+PRELOAD_MODULES = (
+    'supabase.client',
+    'bcrypt',
+    'requests',
+    'PIL.Image',
+    'utils.ai_image_generator',
+    'utils.cloudflare_client',
+    'utils.mail',
+    'numpy',
+    'scipy.sparse',
+)
+
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    app.json = FastJSONProvider(app)
+    # 按可信代理层数取 X-Forwarded-For 中的客户端地址，之后统一使用 request.remote_addr
+    if app.config.get('TRUSTED_PROXY_COUNT'):
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_COUNT'], x_proto=0)
+    feed_fragments.init_app(app)
+    response_compressor.init_app(app)
+    mail_outbox.init_app(app)
+    email_templates.init_app(app)
+    article_events.init_app(app)
+    search_index.init_app(app)
+    tag_index.init_app(app)
+    trending_index.init_app(app)
+    related_index.init_app(app)
+    near_duplicates.init_app(app)
+    article_replica.init_app(app)
+    change_feed.init_app(app)
+    like_stream.init_app(app)
+    like_guard.init_app(app)
+    rate_limiter.init_app(app)
+    warm_snapshot.init_app(app)
     
     # 检查 Supabase 配置
     if not app.config.get('SUPABASE_URL') or not app.config.get('SUPABASE_KEY'):
         raise RuntimeError("Supabase 配置缺失")
     
-    # 初始化Supabase客户端
+    # 初始化Supabase客户端（只记录配置，客户端在每个worker首次请求时创建）
     try:
         supabase_client.init_app(app)
-        # 简化连接测试，减少启动时间
-        if supabase_client.supabase is None:
-            raise RuntimeError("Supabase 客户端初始化后仍为 None")
-        
     except Exception as e:
         raise RuntimeError(f"Supabase 初始化失败: {e}")
     
@@ -49,6 +99,9 @@ def create_app():
     app.register_blueprint(articles_bp, url_prefix='/api')
     app.register_blueprint(generate_bp, url_prefix='/api')
     app.register_blueprint(likes_bp, url_prefix='/api')
+    app.register_blueprint(tags_bp, url_prefix='/api')
+    app.register_blueprint(sync_bp, url_prefix='/api')
+    app.register_blueprint(admin_bp, url_prefix='/api')
     app.register_blueprint(upload_bp)
     app.register_blueprint(cloudflare_bp)
     
@@ -149,6 +202,30 @@ def create_app():
     
     return app
 
+def warmup_app(app):
+    """
+    gunicorn --preload 模式下在主进程 fork 之前调用：
+    提前导入重型模块、构建内存索引，并冻结 GC 跟踪的对象，使这些只读状态以写时复制方式在所有 worker 间共享
+    （冻结后 worker 的 GC 不再触碰这些对象，避免引用计数写入导致内存页被复制）。
+    """
+    import gc
+    import importlib
+
+    for module_name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(module_name)
+        except ImportError as e:
+            print(f"Warmup skipped {module_name}: {e}")
+
+    # 在主进程中完成一次文章扫描，内存索引随 fork 以写时复制方式共享给所有 worker
+    with app.app_context():
+        if article_events.enabled and not article_events.bootstrapped:
+            article_events.bootstrap()
+
+    gc.collect()
+    gc.freeze()
+    return app
+
 if __name__ == '__main__':
     try:
         app = create_app()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+文章缓存内存占用基准
+
+用 tracemalloc 对比同一批合成文章（默认 10 万篇）保存为 supabase-py 行字典与 ArticleRecord 紧凑记录时
+分配的内存，以及每篇转换回字典（to_dict）与序列化的耗时。
+"复制"一列模拟同一批文章在多个缓存条目中各被查询一次（每次查询返回新的行字典与新的正文字符串）。
+
+用法:
+    python bench_article_memory.py [--count 100000]
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from bench_json import make_articles
+from utils.article_record import ArticleRecord, compact_articles
+
+
+def fresh_rows(articles):
+    """模拟再次查询：每行都是新字典，字符串是新对象（与 JSON 反序列化的结果一样不共享）"""
+    return [{key: (value.encode().decode() if isinstance(value, str) else
+                   [tag.encode().decode() for tag in value] if isinstance(value, list) else value)
+             for key, value in article.items()} for article in articles]
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return kept, current
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文章缓存内存占用基准')
+    parser.add_argument('--count', type=int, default=100000)
+    args = parser.parse_args()
+
+    source = make_articles(args.count)
+    body = sum(len(article['content'].encode('utf-8')) for article in source) / args.count
+    print(f'{args.count} 篇文章，正文平均 {body:.0f} 字节（UTF-8）')
+
+    rows, dict_bytes = measure(lambda: fresh_rows(source))
+    _, dict_twice = measure(lambda: (fresh_rows(source), fresh_rows(source)))
+    del rows
+    records, record_bytes = measure(lambda: compact_articles(fresh_rows(source)))
+    # 第二份查询结果与已登记的记录相同，直接复用
+    _, record_twice = measure(lambda: compact_articles(fresh_rows(source)))
+
+    print(f"{'':<14}{'一份':>14}{'每篇':>10}{'两份缓存':>14}")
+    print(f"{'行字典':<14}{dict_bytes / 2**20:>12.1f}MB{dict_bytes / args.count:>9.0f}B"
+          f"{dict_twice / 2**20:>12.1f}MB")
+    print(f"{'ArticleRecord':<14}{record_bytes / 2**20:>12.1f}MB{record_bytes / args.count:>9.0f}B"
+          f"{(record_bytes + record_twice) / 2**20:>12.1f}MB")
+
+    sample = records[:1000]
+    start = time.perf_counter()
+    for record in sample:
+        record.to_dict()
+    to_dict_us = (time.perf_counter() - start) / len(sample) * 1e6
+    start = time.perf_counter()
+    for record in sample:
+        ArticleRecord.from_row(record.to_dict())
+    from_row_us = (time.perf_counter() - start) / len(sample) * 1e6
+    print(f'to_dict 每篇 {to_dict_us:.1f}us，from_row（命中已登记记录）每篇 {from_row_us:.1f}us')
+
+
+if __name__ == '__main__':
+    main()
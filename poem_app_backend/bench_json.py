@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+文章列表 JSON 序列化基准
+
+对比 10/50/200 篇文章一页时三种方式的序列化耗时：
+- Flask 默认 jsonify（标准库 json，ensure_ascii + sort_keys）
+- FastJSONProvider（orjson 可用时使用 orjson）
+- FeedFragmentCache 预序列化片段拼接（缓存已热）
+
+用法:
+    python bench_json.py [--repeat 200]
+"""
+
+import argparse
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from utils.json_provider import FastJSONProvider, FeedFragmentCache, orjson
+
+POEM_CHARS = '床前明月光疑是地上霜举头望山低思故乡春眠不觉晓处闻啼鸟夜来风雨声花落知多少白日依尽黄河入海流欲穷千里目更上一层楼'
+
+def make_articles(count, seed=0):
+    """生成结构与 articles 表一致的合成文章"""
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1)
+    articles = []
+    for i in range(count):
+        lines = [''.join(rng.choice(POEM_CHARS) for _ in range(7)) for _ in range(rng.randint(4, 40))]
+        created = base + timedelta(minutes=i)
+        articles.append({
+            'id': str(uuid.UUID(int=rng.getrandbits(128))),
+            'user_id': str(uuid.UUID(int=rng.getrandbits(128))),
+            'title': ''.join(rng.choice(POEM_CHARS) for _ in range(4)),
+            'content': '，\n'.join(lines) + '。',
+            'tags': ['唐诗', '月亮'][:rng.randint(0, 2)],
+            'author': f'诗人{rng.randint(1, 500)}',
+            'image_url': f'https://images.shipian.app/images/{uuid.uuid4()}/headphoto',
+            'created_at': created.isoformat() + '+00:00',
+            'updated_at': created.isoformat() + '+00:00',
+            'like_count': rng.randint(0, 300),
+            'text_position_x': 0.5,
+            'text_position_y': 0.3,
+            'image_offset_x': 0.0,
+            'image_offset_y': 0.0,
+            'image_scale': 1.0,
+            'is_public_visible': True
+        })
+    return articles
+
+def timeit(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description='文章列表 JSON 序列化基准')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    default_provider = DefaultJSONProvider(app)
+    app.json = FastJSONProvider(app)
+    fragments = FeedFragmentCache()
+
+    print(f"orjson: {'可用' if orjson is not None else '未安装，使用标准库'}")
+    print(f"{'篇数':>6} {'jsonify(us)':>12} {'fast(us)':>10} {'片段拼接(us)':>14} {'默认字节':>10} {'快速字节':>10}")
+    with app.app_context():
+        for count in (10, 50, 200):
+            articles = make_articles(count)
+            payload = {'articles': articles}
+            default_us = timeit(lambda: default_provider.dumps(payload, separators=(',', ':')).encode('utf-8'), args.repeat)
+            fast_us = timeit(lambda: app.json.dumps_bytes(payload), args.repeat)
+            fragment_us = timeit(lambda: fragments.render('articles', articles), args.repeat)
+            default_size = len(default_provider.dumps(payload, separators=(',', ':')).encode('utf-8'))
+            fast_size = len(fragments.render('articles', articles))
+            print(f"{count:>6} {default_us:>12.1f} {fast_us:>10.1f} {fragment_us:>14.1f} {default_size:>10} {fast_size:>10}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+全文检索基准
+
+用合成诗词构建 SearchIndex，报告：
+- 建索引耗时与倒排表内存（tracemalloc 统计的峰值与常驻增量）
+- 单字、二元组、多词、拉丁单词查询的 p50/p95 延迟
+- 增量更新（updated 事件）耗时
+
+用法:
+    python bench_search.py [--count 100000] [--queries 500]
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+import uuid
+
+from utils.search_index import SearchIndex
+
+POEM_CHARS = '床前明月光疑是地上霜举头望山低思故乡春眠不觉晓处闻啼鸟夜来风雨声花落知多少白日依尽黄河入海流欲穷千里目更上一层楼'
+TAGS = ['唐诗', '宋词', '月亮', '思乡', '春天', '离别', 'haiku', 'love']
+
+def make_articles(count, seed=0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        lines = [''.join(rng.choice(POEM_CHARS) for _ in range(7)) for _ in range(rng.randint(4, 16))]
+        yield {
+            'id': str(uuid.UUID(int=rng.getrandbits(128))),
+            'title': ''.join(rng.choice(POEM_CHARS) for _ in range(4)),
+            'content': '，\n'.join(lines) + '。',
+            'tags': rng.sample(TAGS, rng.randint(0, 3)),
+            'is_public_visible': True
+        }
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+def main():
+    parser = argparse.ArgumentParser(description='全文检索基准')
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+
+    index = SearchIndex()
+    tracemalloc.start()
+    start = time.perf_counter()
+    ids = []
+    for article in make_articles(args.count):
+        index.add(article)
+        ids.append(article['id'])
+    build_seconds = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = index.stats()
+    print(f"文档数: {stats['documents']}  词项: {stats['terms']}  倒排项: {stats['postings']}")
+    print(f"建索引: {build_seconds:.2f}s ({args.count / build_seconds:,.0f} 篇/s)")
+    print(f"内存: 常驻 {current / 2**20:.1f} MiB，峰值 {peak / 2**20:.1f} MiB，倒排数组 {stats['posting_bytes'] / 2**20:.1f} MiB")
+
+    rng = random.Random(1)
+    kinds = {
+        '单字': lambda: rng.choice(POEM_CHARS),
+        '二元组': lambda: ''.join(rng.choice(POEM_CHARS) for _ in range(2)),
+        '短语': lambda: ''.join(rng.choice(POEM_CHARS) for _ in range(4)),
+        '多词': lambda: f"{rng.choice(TAGS)} {''.join(rng.choice(POEM_CHARS) for _ in range(2))}",
+        '拉丁': lambda: rng.choice(['haiku', 'love'])
+    }
+    print(f"{'查询':>6} {'p50(ms)':>10} {'p95(ms)':>10} {'平均命中':>10}")
+    for kind, make_query in kinds.items():
+        latencies, hits = [], 0
+        for _ in range(args.queries):
+            query = make_query()
+            start = time.perf_counter()
+            _, total = index.search(query, limit=20)
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += total
+        print(f"{kind:>6} {percentile(latencies, 0.5):>10.2f} {percentile(latencies, 0.95):>10.2f} {hits / args.queries:>10.0f}")
+
+    updates = min(1000, len(ids))
+    start = time.perf_counter()
+    for article_id, article in zip(rng.sample(ids, updates), make_articles(updates, seed=2)):
+        index.add({**article, 'id': article_id})
+    print(f"增量更新: {(time.perf_counter() - start) / updates * 1e6:.0f} us/篇")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+检查应用冷启动的导入耗时（基于 python -X importtime）
+
+用法:
+    python check_startup.py                 # 默认预算 STARTUP_IMPORT_BUDGET_MS 或 400ms
+    python check_startup.py --budget-ms 300 --top 15
+
+超出预算时返回非零退出码，可以放进 build.sh 或 CI 中作为回归检查。
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+DEFAULT_BUDGET_MS = int(os.environ.get('STARTUP_IMPORT_BUDGET_MS', 400))
+
+def measure_imports(module='app'):
+    """在干净的子进程中导入模块，返回 (总耗时微秒, [(累计微秒, 自身微秒, 模块名)])"""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{proc.stderr[-2000:]}")
+
+    entries = []
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        # 没有缩进的条目是顶层导入，其累计耗时之和即整体导入耗时
+        if not name.startswith('  '):
+            total_us += int(cumulative_us)
+        entries.append((int(cumulative_us), int(self_us), name.strip()))
+    return total_us, entries
+
+def main():
+    parser = argparse.ArgumentParser(description='检查应用导入耗时预算')
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--budget-ms', type=int, default=DEFAULT_BUDGET_MS)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    total_us, entries = measure_imports(args.module)
+    print(f"import {args.module}: {total_us / 1000:.1f}ms (预算 {args.budget_ms}ms)")
+    for cumulative_us, self_us, name in sorted(entries, reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f}ms  {self_us / 1000:7.1f}ms  {name}")
+
+    if total_us > args.budget_ms * 1000:
+        print("超出启动导入预算")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # 加载环境变量
@@ -17,6 +18,21 @@ class Config:
     EMAIL_PASSWORD = os.environ.get('EMAIL_PASSWORD')
     EMAIL_SERVER = 'smtp.gmail.com'
     EMAIL_PORT = 587
+    # 登录前必须 STARTTLS（服务器未声明 STARTTLS 时直接报错，不以明文发送密码）；只有本地测试 SMTP 服务才关闭
+    EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'true').lower() in ('1', 'true', 'yes')
+    
+    # 多个 gunicorn worker 共享的本地状态目录（邮件发件箱等）
+    SHARED_STATE_DIR = os.environ.get('SHARED_STATE_DIR') or os.path.join(tempfile.gettempdir(), 'poemverse')
+    
+    # 邮件发件箱：请求只入队，后台线程复用 SMTP 连接投递
+    MAIL_OUTBOX_PATH = os.environ.get('MAIL_OUTBOX_PATH') or os.path.join(SHARED_STATE_DIR, 'mail_outbox.sqlite3')
+    MAIL_BATCH_SIZE = int(os.environ.get('MAIL_BATCH_SIZE', 20))
+    MAIL_MAX_ATTEMPTS = int(os.environ.get('MAIL_MAX_ATTEMPTS', 6))
+    MAIL_RETRY_BASE_SECONDS = float(os.environ.get('MAIL_RETRY_BASE_SECONDS', 30))
+    MAIL_SEND_RATE_PER_MINUTE = int(os.environ.get('MAIL_SEND_RATE_PER_MINUTE', 20))
+    MAIL_SMTP_IDLE_SECONDS = float(os.environ.get('MAIL_SMTP_IDLE_SECONDS', 120))
+    # 额度用尽、策略拒绝或认证失败时整个队列暂停，暂停时间从 MAIL_RETRY_BASE_SECONDS 起加倍，最长为此值
+    MAIL_PAUSE_MAX_SECONDS = float(os.environ.get('MAIL_PAUSE_MAX_SECONDS', 3600))
     
     # 文件上传配置
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
@@ -26,5 +42,133 @@ class Config:
     IMAGE_WIDTH = 800
     IMAGE_HEIGHT = 1200 
     
+    # 文章列表 JSON 片段缓存条目数
+    FEED_FRAGMENT_CACHE_SIZE = int(os.environ.get('FEED_FRAGMENT_CACHE_SIZE', 5000))
+    
+    # 读接口 HTTP 缓存与压缩
+    HTTP_CACHE_MAX_AGE = int(os.environ.get('HTTP_CACHE_MAX_AGE', 0))  # 秒，0 表示每次都需用 ETag 重新验证
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))  # 字节，小于该值不压缩
+    COMPRESS_CACHE_BYTES = int(os.environ.get('COMPRESS_CACHE_BYTES', 8 * 1024 * 1024))
+    
+    # 请求内并发查询 Supabase 的线程数，以及同一请求内所有查询共享的截止时间（秒）
+    SUPABASE_FAN_OUT_WORKERS = int(os.environ.get('SUPABASE_FAN_OUT_WORKERS', 8))
+    SUPABASE_REQUEST_DEADLINE = float(os.environ.get('SUPABASE_REQUEST_DEADLINE', 10))
+    # 按ID查询的合并窗口（毫秒，0 表示只合并同一请求内的批量读取；同步 worker 上只有请求内并发查询才等待）与单次 in 查询的最大ID数
+    LOADER_BATCH_WINDOW_MS = float(os.environ.get('LOADER_BATCH_WINDOW_MS', 2))
+    LOADER_MAX_BATCH = int(os.environ.get('LOADER_MAX_BATCH', 100))
+    # 热点读取缓存：单篇文章、文章列表与点赞统计的新鲜时间（秒，0 表示只合并并发查询不缓存），
+    # 过期后仍可返回旧值并后台刷新的时间，以及最多缓存的条目数
+    READ_CACHE_ARTICLE_TTL = float(os.environ.get('READ_CACHE_ARTICLE_TTL', 10))
+    READ_CACHE_FEED_TTL = float(os.environ.get('READ_CACHE_FEED_TTL', 5))
+    READ_CACHE_LIKE_STATS_TTL = float(os.environ.get('READ_CACHE_LIKE_STATS_TTL', 30))
+    READ_CACHE_STALE_SECONDS = float(os.environ.get('READ_CACHE_STALE_SECONDS', 60))
+    READ_CACHE_MAX_ENTRIES = int(os.environ.get('READ_CACHE_MAX_ENTRIES', 2000))
+    # 缓存满时按近期访问频率准入（TinyLFU），并钉住访问最多的 HOT_ARTICLES_PIN 篇文章不被淘汰；
+    # HOT_ARTICLES_CAPACITY 为 Space-Saving 追踪的文章数
+    READ_CACHE_ADMISSION = os.environ.get('READ_CACHE_ADMISSION', 'true').lower() in ('1', 'true', 'yes')
+    HOT_ARTICLES_CAPACITY = int(os.environ.get('HOT_ARTICLES_CAPACITY', 1000))
+    HOT_ARTICLES_PIN = int(os.environ.get('HOT_ARTICLES_PIN', 50))
+    
+    # Supabase 故障保护：HTTP 客户端超时（秒）、各类读操作的超时（如 "article=2,feed=3,likes=2,lookup=2"），
+    # 以及熔断器在窗口内错误率（含慢调用）达到阈值后打开、经过 BREAKER_OPEN_SECONDS 再探测恢复
+    SUPABASE_HTTP_TIMEOUT = float(os.environ.get('SUPABASE_HTTP_TIMEOUT', 10))
+    SUPABASE_OPERATION_TIMEOUTS = {
+        name.strip(): float(seconds)
+        for name, _, seconds in (item.partition('=') for item in os.environ.get('SUPABASE_OPERATION_TIMEOUTS', '').split(','))
+        if name.strip() and seconds
+    }
+    BREAKER_FAILURE_RATE = float(os.environ.get('BREAKER_FAILURE_RATE', 0.5))
+    BREAKER_MIN_CALLS = int(os.environ.get('BREAKER_MIN_CALLS', 10))
+    BREAKER_WINDOW_SECONDS = float(os.environ.get('BREAKER_WINDOW_SECONDS', 30))
+    BREAKER_SLOW_CALL_SECONDS = float(os.environ.get('BREAKER_SLOW_CALL_SECONDS', 2))
+    BREAKER_OPEN_SECONDS = float(os.environ.get('BREAKER_OPEN_SECONDS', 15))
+    
+    # 内存索引（搜索等）：启动时流式扫描 articles 表构建
+    ARTICLE_INDEX_BOOTSTRAP = os.environ.get('ARTICLE_INDEX_BOOTSTRAP', 'true').lower() in ('1', 'true', 'yes')
+    ARTICLE_INDEX_BATCH_SIZE = int(os.environ.get('ARTICLE_INDEX_BATCH_SIZE', 500))
+    
+    # 热门排行：点赞热度按半衰期衰减，得分快照定期写入 SHARED_STATE_DIR
+    TRENDING_HALF_LIFE_HOURS = float(os.environ.get('TRENDING_HALF_LIFE_HOURS', 24))
+    TRENDING_PERSIST_SECONDS = float(os.environ.get('TRENDING_PERSIST_SECONDS', 60))
+    TRENDING_PATH = os.environ.get('TRENDING_PATH') or os.path.join(SHARED_STATE_DIR, 'trending.sqlite3')
+    
+    # 文章表的本地只读副本（SQLite，worker 间共享）：同步间隔、允许的最大延迟（超过后退回 Supabase）、
+    # 删除与点赞数的全量核对间隔（秒），以及读连接的 mmap 大小
+    REPLICA_ENABLED = os.environ.get('REPLICA_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    REPLICA_PATH = os.environ.get('REPLICA_PATH') or os.path.join(SHARED_STATE_DIR, 'articles_replica.sqlite3')
+    REPLICA_SYNC_SECONDS = float(os.environ.get('REPLICA_SYNC_SECONDS', 5))
+    REPLICA_MAX_STALENESS = float(os.environ.get('REPLICA_MAX_STALENESS', 30))
+    REPLICA_RECONCILE_SECONDS = float(os.environ.get('REPLICA_RECONCILE_SECONDS', 300))
+    REPLICA_MMAP_BYTES = int(os.environ.get('REPLICA_MMAP_BYTES', 256 * 1024 * 1024))
+    
+    # 数据库变更订阅（Supabase Realtime）：默认根据 SUPABASE_URL 推导地址，本地调试可指向 realtime_stub.py；
+    # 重连后从最后处理的提交时间往前 CHANGE_FEED_CATCHUP_MARGIN 秒开始补读
+    CHANGE_FEED_ENABLED = os.environ.get('CHANGE_FEED_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    CHANGE_FEED_URL = os.environ.get('CHANGE_FEED_URL')
+    CHANGE_FEED_HEARTBEAT_SECONDS = float(os.environ.get('CHANGE_FEED_HEARTBEAT_SECONDS', 25))
+    CHANGE_FEED_CATCHUP_MARGIN = float(os.environ.get('CHANGE_FEED_CATCHUP_MARGIN', 30))
+    
+    # 客户端增量同步：删除墓碑保留天数（更早的水位返回 reset 并全量同步）、
+    # 水位回退的重叠秒数（容忍各服务器写入 updated_at 时的时钟偏差）与单页最大条数
+    SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', 90))
+    SYNC_OVERLAP_SECONDS = float(os.environ.get('SYNC_OVERLAP_SECONDS', 5))
+    SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', 500))
+    
+    # 热缓存快照：定期把全部文章、匿名列表缓存与热点计数写入 SHARED_STATE_DIR，新 worker 从快照恢复后
+    # 按水位补读变更（需要 create_article_sync.sql）；补读超过 WARM_SNAPSHOT_MAX_PAGES 页（每页 SYNC_PAGE_SIZE 条）时改为全量扫描。
+    # Render 上需把 SHARED_STATE_DIR 或 WARM_SNAPSHOT_PATH 放在持久磁盘上，重新部署后才能读到快照
+    WARM_SNAPSHOT_ENABLED = os.environ.get('WARM_SNAPSHOT_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    WARM_SNAPSHOT_PATH = os.environ.get('WARM_SNAPSHOT_PATH') or os.path.join(SHARED_STATE_DIR, 'warm_cache.snapshot')
+    WARM_SNAPSHOT_INTERVAL_SECONDS = float(os.environ.get('WARM_SNAPSHOT_INTERVAL_SECONDS', 300))
+    WARM_SNAPSHOT_MAX_PAGES = int(os.environ.get('WARM_SNAPSHOT_MAX_PAGES', 20))
+    
+    # 实时点赞推送（SSE）：每篇文章的合并周期、每个连接的缓冲事件数、每个 worker 的最大连接数、
+    # 心跳间隔，以及同步 worker 下不提供长连接时建议客户端改为轮询批量接口的间隔；
+    # 跨 worker 转发经 SHARED_STATE_DIR 下的 SQLite 频道
+    LIVE_LIKES_PATH = os.environ.get('LIVE_LIKES_PATH') or os.path.join(SHARED_STATE_DIR, 'live_likes.sqlite3')
+    LIVE_LIKES_INTERVAL = float(os.environ.get('LIVE_LIKES_INTERVAL', 1))
+    LIVE_LIKES_BUFFER_SIZE = int(os.environ.get('LIVE_LIKES_BUFFER_SIZE', 64))
+    LIVE_LIKES_MAX_SUBSCRIBERS = int(os.environ.get('LIVE_LIKES_MAX_SUBSCRIBERS', 500))
+    LIVE_LIKES_KEEPALIVE_SECONDS = float(os.environ.get('LIVE_LIKES_KEEPALIVE_SECONDS', 15))
+    LIVE_LIKES_POLL_SECONDS = int(os.environ.get('LIVE_LIKES_POLL_SECONDS', 15))
+    
+    # 点赞统计：小时桶的保留天数（决定按小时趋势最多可查询的范围，与 create_like_buckets.sql 中的清理任务一致）
+    LIKE_STATS_HOURLY_RETENTION_DAYS = int(os.environ.get('LIKE_STATS_HOURLY_RETENTION_DAYS', 7))
+    
+    # 点赞刷量防护：滑动窗口内每个 IP、每个登录用户（匿名请求按 IP）、每个 (IP, 文章) 的点赞请求上限，
+    # 计数保存在 SHARED_STATE_DIR 下 worker 共享的 Count-Min Sketch 文件中（宽度 × 深度个计数器）
+    LIKE_GUARD_ENABLED = os.environ.get('LIKE_GUARD_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    LIKE_GUARD_PATH = os.environ.get('LIKE_GUARD_PATH') or os.path.join(SHARED_STATE_DIR, 'like_guard.sketch')
+    LIKE_GUARD_WINDOW_SECONDS = float(os.environ.get('LIKE_GUARD_WINDOW_SECONDS', 60))
+    LIKE_GUARD_IP_LIMIT = int(os.environ.get('LIKE_GUARD_IP_LIMIT', 120))
+    LIKE_GUARD_DEVICE_LIMIT = int(os.environ.get('LIKE_GUARD_DEVICE_LIMIT', 60))
+    LIKE_GUARD_IP_ARTICLE_LIMIT = int(os.environ.get('LIKE_GUARD_IP_ARTICLE_LIMIT', 10))
+    LIKE_GUARD_SKETCH_WIDTH = int(os.environ.get('LIKE_GUARD_SKETCH_WIDTH', 4096))
+    LIKE_GUARD_SKETCH_DEPTH = int(os.environ.get('LIKE_GUARD_SKETCH_DEPTH', 4))
+    
+    # 令牌桶限流："<蓝图或端点>=<次数>/<秒数>[:<突发>]"，端点规则优先于蓝图规则；
+    # 令牌桶保存在 SHARED_STATE_DIR 下 worker 共享的 SQLite 中，高频规则每次预取 RATE_LIMIT_LEASE_SECONDS 秒的令牌
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    RATE_LIMITS = os.environ.get(
+        'RATE_LIMITS', 'generate=10/60,upload=30/60,auth.login=10/60,auth.forgot_password=3/300'
+    )
+    RATE_LIMIT_PATH = os.environ.get('RATE_LIMIT_PATH') or os.path.join(SHARED_STATE_DIR, 'rate_limits.sqlite3')
+    RATE_LIMIT_LEASE_SECONDS = float(os.environ.get('RATE_LIMIT_LEASE_SECONDS', 1))
+    
+    # 应用前面的反向代理层数（Render 负载均衡为 1 层，前面再加 Cloudflare 等时相应增加；直接对外时设为 0）。
+    # 只信任 X-Forwarded-For 最右侧这么多个由代理追加的地址，request.remote_addr 即为真实客户端 IP，
+    # 客户端自己填写的 X-Forwarded-For 不会影响限流与点赞防刷
+    TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', 1))
+    
+    # 运维接口（/api/admin/*）的访问令牌，未设置时接口关闭
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+    
+    # 相关诗词推荐：每篇文章保留的邻居数
+    RELATED_TOP_K = int(os.environ.get('RELATED_TOP_K', 10))
+    
+    # 近似重复检测：off 不检查，flag 允许发布但在响应中标记，reject 返回 409
+    DUPLICATE_POLICY = os.environ.get('DUPLICATE_POLICY', 'flag').lower()
+    DUPLICATE_THRESHOLD = float(os.environ.get('DUPLICATE_THRESHOLD', 0.8))
+    
     # Universal Links 配置
     BASE_URL = os.environ.get('BASE_URL')  # 例如: https://your-domain.com 
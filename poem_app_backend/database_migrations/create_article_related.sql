@@ -0,0 +1,10 @@
+-- 相关诗词推荐：每篇文章的前 k 个相似文章（由 build_related.py 离线计算，新发布的文章由后端增量写入）
+
+CREATE TABLE IF NOT EXISTS article_related (
+    article_id UUID PRIMARY KEY,
+    related_ids UUID[] NOT NULL DEFAULT '{}',   -- 按相似度从高到低
+    scores REAL[] NOT NULL DEFAULT '{}',        -- 与 related_ids 一一对应的余弦相似度
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+
+    CONSTRAINT fk_article_related_article FOREIGN KEY (article_id) REFERENCES articles(id) ON DELETE CASCADE
+);
@@ -0,0 +1,16 @@
+-- 近似重复检测：每篇文章正文的 MinHash 签名（128 个 uint32，base64 编码）
+-- 由后端在发布/修改时写入，存量文章由 backfill_minhash.py 回填
+
+CREATE TABLE IF NOT EXISTS article_signatures (
+    article_id UUID PRIMARY KEY,
+    signature TEXT NOT NULL,
+    duplicate_of UUID DEFAULT NULL,     -- 检测到的最相似的已有文章（未重复为 NULL）
+    similarity REAL DEFAULT NULL,       -- 与 duplicate_of 的估计 Jaccard 相似度
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+
+    CONSTRAINT fk_article_signatures_article FOREIGN KEY (article_id) REFERENCES articles(id) ON DELETE CASCADE,
+    CONSTRAINT fk_article_signatures_duplicate FOREIGN KEY (duplicate_of) REFERENCES articles(id) ON DELETE SET NULL
+);
+
+-- 便于审核被标记为重复的文章
+CREATE INDEX IF NOT EXISTS idx_article_signatures_duplicate_of ON article_signatures(duplicate_of) WHERE duplicate_of IS NOT NULL;
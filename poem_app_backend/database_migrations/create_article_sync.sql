@@ -0,0 +1,58 @@
+-- 客户端增量同步（GET /api/sync?since=...）所需的索引、点赞计数时间戳与删除墓碑
+-- 需先执行 create_likes_tables.sql（like_count 字段与点赞触发器）
+
+-- 按 updated_at 增量读取变更的文章
+CREATE INDEX IF NOT EXISTS idx_articles_updated_at ON articles(updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_articles_user_updated_at ON articles(user_id, updated_at);
+
+-- 点赞触发器只修改 like_count，不刷新 updated_at（文章内容没有变化，片段缓存等以 updated_at 为版本），
+-- 另记一个计数变化时间供同步接口返回变化的点赞数
+ALTER TABLE articles ADD COLUMN IF NOT EXISTS like_count_updated_at TIMESTAMP WITH TIME ZONE DEFAULT NULL;
+CREATE INDEX IF NOT EXISTS idx_articles_like_count_updated_at ON articles(like_count_updated_at)
+    WHERE like_count_updated_at IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION touch_article_like_count()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.like_count IS DISTINCT FROM OLD.like_count THEN
+        NEW.like_count_updated_at = NOW();
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_touch_article_like_count ON articles;
+CREATE TRIGGER trigger_touch_article_like_count
+    BEFORE UPDATE OF like_count ON articles
+    FOR EACH ROW EXECUTE FUNCTION touch_article_like_count();
+
+-- 删除墓碑：文章被删除后保留 ID、作者与删除时间，客户端据此从本地缓存中移除
+CREATE TABLE IF NOT EXISTS article_tombstones (
+    article_id UUID PRIMARY KEY,
+    user_id UUID,
+    was_public BOOLEAN,
+    deleted_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_article_tombstones_deleted_at ON article_tombstones(deleted_at);
+CREATE INDEX IF NOT EXISTS idx_article_tombstones_user_deleted_at ON article_tombstones(user_id, deleted_at);
+
+CREATE OR REPLACE FUNCTION record_article_tombstone()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO article_tombstones (article_id, user_id, was_public, deleted_at)
+    VALUES (OLD.id, OLD.user_id, OLD.is_public_visible, NOW())
+    ON CONFLICT (article_id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+DROP TRIGGER IF EXISTS trigger_record_article_tombstone ON articles;
+CREATE TRIGGER trigger_record_article_tombstone
+    AFTER DELETE ON articles
+    FOR EACH ROW EXECUTE FUNCTION record_article_tombstone();
+
+-- 墓碑只需保留到所有客户端都同步过为止；水位早于保留期的客户端会收到 reset 并全量重新同步。
+-- 可用 pg_cron 定期清理（保留天数与 SYNC_TOMBSTONE_RETENTION_DAYS 保持一致）：
+-- SELECT cron.schedule('purge-article-tombstones', '0 4 * * *',
+--     $$DELETE FROM article_tombstones WHERE deleted_at < NOW() - INTERVAL '90 days'$$);
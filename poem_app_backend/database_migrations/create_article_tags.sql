@@ -0,0 +1,81 @@
+-- 标签索引：把 articles.tags 数组规范化为 article_tags 表，并维护每个标签的文章数
+-- 只收录公开可见的文章；标签统一去掉首尾空白并转为小写
+
+CREATE TABLE IF NOT EXISTS article_tags (
+    tag TEXT NOT NULL,
+    article_id UUID NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL,  -- 冗余文章创建时间，用于按时间倒序分页
+
+    PRIMARY KEY (tag, article_id),
+    CONSTRAINT fk_article_tags_article FOREIGN KEY (article_id) REFERENCES articles(id) ON DELETE CASCADE
+);
+
+-- 标签页分页：WHERE tag = ? AND (created_at, article_id) < (?, ?) ORDER BY created_at DESC, article_id DESC
+CREATE INDEX IF NOT EXISTS idx_article_tags_tag_created ON article_tags(tag, created_at DESC, article_id DESC);
+CREATE INDEX IF NOT EXISTS idx_article_tags_article_id ON article_tags(article_id);
+
+-- 每个标签的文章数（热门标签、自动补全排序）
+CREATE TABLE IF NOT EXISTS tag_counts (
+    tag TEXT PRIMARY KEY,
+    article_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_tag_counts_count ON tag_counts(article_count DESC);
+CREATE INDEX IF NOT EXISTS idx_tag_counts_prefix ON tag_counts(tag text_pattern_ops);
+
+-- 触发器函数：文章新增/修改标签/修改可见性时重建该文章的标签行
+CREATE OR REPLACE FUNCTION sync_article_tags()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND NEW.tags IS NOT DISTINCT FROM OLD.tags
+       AND NEW.is_public_visible IS NOT DISTINCT FROM OLD.is_public_visible THEN
+        RETURN NEW;
+    END IF;
+
+    DELETE FROM article_tags WHERE article_id = NEW.id;
+
+    IF COALESCE(NEW.is_public_visible, true) AND NEW.tags IS NOT NULL THEN
+        INSERT INTO article_tags (tag, article_id, created_at)
+        SELECT DISTINCT lower(btrim(t)), NEW.id, COALESCE(NEW.created_at, NOW())
+        FROM unnest(NEW.tags) AS t
+        WHERE btrim(t) <> ''
+        ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_sync_article_tags ON articles;
+CREATE TRIGGER trigger_sync_article_tags
+    AFTER INSERT OR UPDATE OF tags, is_public_visible ON articles
+    FOR EACH ROW EXECUTE FUNCTION sync_article_tags();
+
+-- 触发器函数：article_tags 增删时维护 tag_counts（文章删除时由外键级联触发）
+CREATE OR REPLACE FUNCTION update_tag_counts()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO tag_counts (tag, article_count) VALUES (NEW.tag, 1)
+        ON CONFLICT (tag) DO UPDATE SET article_count = tag_counts.article_count + 1;
+        RETURN NEW;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE tag_counts SET article_count = GREATEST(0, article_count - 1) WHERE tag = OLD.tag;
+        DELETE FROM tag_counts WHERE tag = OLD.tag AND article_count = 0;
+        RETURN OLD;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_update_tag_counts ON article_tags;
+CREATE TRIGGER trigger_update_tag_counts
+    AFTER INSERT OR DELETE ON article_tags
+    FOR EACH ROW EXECUTE FUNCTION update_tag_counts();
+
+-- 初始化现有文章的标签行（可选，用于数据迁移）
+INSERT INTO article_tags (tag, article_id, created_at)
+SELECT DISTINCT lower(btrim(t)), a.id, COALESCE(a.created_at, NOW())
+FROM articles a, unnest(a.tags) AS t
+WHERE COALESCE(a.is_public_visible, true) AND btrim(t) <> ''
+ON CONFLICT DO NOTHING;
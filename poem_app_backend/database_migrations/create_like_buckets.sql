@@ -0,0 +1,159 @@
+-- 点赞统计的预聚合表（GET /api/articles/<id>/likes/stats 只读取这些表，不扫描 article_likes）
+-- 需先执行 create_likes_tables.sql
+--   article_like_buckets: 每篇文章按小时/按天的点赞与取消点赞次数
+--   article_recent_likers: 每篇文章最近点赞的登录用户（每篇最多保留 50 条）
+--   author_like_totals:   每位作者全部文章获得的点赞总数
+
+CREATE TABLE IF NOT EXISTS article_like_buckets (
+    article_id UUID NOT NULL,
+    granularity VARCHAR(8) NOT NULL,        -- 'hour' | 'day'
+    bucket_start TIMESTAMP WITH TIME ZONE NOT NULL,
+    likes INTEGER NOT NULL DEFAULT 0,
+    unlikes INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (article_id, granularity, bucket_start),
+    CONSTRAINT fk_article_like_buckets_article FOREIGN KEY (article_id) REFERENCES articles(id) ON DELETE CASCADE,
+    CONSTRAINT check_article_like_buckets_granularity CHECK (granularity IN ('hour', 'day'))
+);
+
+CREATE TABLE IF NOT EXISTS article_recent_likers (
+    article_id UUID NOT NULL,
+    user_id UUID NOT NULL,
+    liked_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (article_id, user_id),
+    CONSTRAINT fk_article_recent_likers_article FOREIGN KEY (article_id) REFERENCES articles(id) ON DELETE CASCADE,
+    CONSTRAINT fk_article_recent_likers_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_article_recent_likers_article_liked_at ON article_recent_likers(article_id, liked_at DESC);
+
+CREATE TABLE IF NOT EXISTS author_like_totals (
+    user_id UUID PRIMARY KEY,
+    like_count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    CONSTRAINT fk_author_like_totals_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- 创建触发器函数：点赞记录变化时增量更新预聚合表
+CREATE OR REPLACE FUNCTION update_article_like_rollups()
+RETURNS TRIGGER AS $$
+DECLARE
+    target_article UUID;
+    liker UUID;
+    delta INTEGER := 0;
+    author UUID;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        target_article := NEW.article_id;
+        liker := NEW.user_id;
+        IF NEW.is_liked THEN delta := 1; END IF;
+    ELSIF TG_OP = 'DELETE' THEN
+        target_article := OLD.article_id;
+        liker := OLD.user_id;
+        IF OLD.is_liked THEN delta := -1; END IF;
+    ELSIF OLD.is_liked IS DISTINCT FROM NEW.is_liked THEN
+        target_article := NEW.article_id;
+        liker := NEW.user_id;
+        delta := CASE WHEN NEW.is_liked THEN 1 ELSE -1 END;
+    END IF;
+
+    IF delta = 0 THEN
+        RETURN NULL;
+    END IF;
+
+    -- 文章被删除时点赞记录级联删除，文章行已不存在，不再计入（作者总数由 articles 的删除触发器扣除）
+    SELECT user_id INTO author FROM articles WHERE id = target_article;
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO article_like_buckets (article_id, granularity, bucket_start, likes, unlikes)
+    VALUES
+        (target_article, 'hour', date_trunc('hour', NOW()), GREATEST(delta, 0), GREATEST(-delta, 0)),
+        (target_article, 'day', date_trunc('day', NOW()), GREATEST(delta, 0), GREATEST(-delta, 0))
+    ON CONFLICT (article_id, granularity, bucket_start) DO UPDATE SET
+        likes = article_like_buckets.likes + EXCLUDED.likes,
+        unlikes = article_like_buckets.unlikes + EXCLUDED.unlikes;
+
+    IF liker IS NOT NULL THEN
+        IF delta > 0 THEN
+            INSERT INTO article_recent_likers (article_id, user_id, liked_at)
+            VALUES (target_article, liker, NOW())
+            ON CONFLICT (article_id, user_id) DO UPDATE SET liked_at = EXCLUDED.liked_at;
+            -- 每篇文章只保留最近 50 位
+            DELETE FROM article_recent_likers
+            WHERE article_id = target_article
+              AND liked_at < (
+                  SELECT liked_at FROM article_recent_likers
+                  WHERE article_id = target_article
+                  ORDER BY liked_at DESC OFFSET 49 LIMIT 1
+              );
+        ELSE
+            DELETE FROM article_recent_likers WHERE article_id = target_article AND user_id = liker;
+        END IF;
+    END IF;
+
+    IF author IS NOT NULL THEN
+        INSERT INTO author_like_totals (user_id, like_count, updated_at)
+        VALUES (author, GREATEST(delta, 0), NOW())
+        ON CONFLICT (user_id) DO UPDATE SET
+            like_count = GREATEST(0, author_like_totals.like_count + delta),
+            updated_at = EXCLUDED.updated_at;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- 创建触发器
+DROP TRIGGER IF EXISTS trigger_update_article_like_rollups ON article_likes;
+CREATE TRIGGER trigger_update_article_like_rollups
+    AFTER INSERT OR UPDATE OR DELETE ON article_likes
+    FOR EACH ROW EXECUTE FUNCTION update_article_like_rollups();
+
+-- 文章被删除时从作者总数中扣除它的点赞
+CREATE OR REPLACE FUNCTION subtract_author_like_total()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF OLD.user_id IS NOT NULL AND COALESCE(OLD.like_count, 0) > 0 THEN
+        UPDATE author_like_totals
+        SET like_count = GREATEST(0, like_count - OLD.like_count), updated_at = NOW()
+        WHERE user_id = OLD.user_id;
+    END IF;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+DROP TRIGGER IF EXISTS trigger_subtract_author_like_total ON articles;
+CREATE TRIGGER trigger_subtract_author_like_total
+    AFTER DELETE ON articles
+    FOR EACH ROW EXECUTE FUNCTION subtract_author_like_total();
+
+-- 初始化现有数据（一次性，用于数据迁移）：按点赞记录的创建时间回填桶，按 like_count 回填作者总数
+INSERT INTO article_like_buckets (article_id, granularity, bucket_start, likes)
+SELECT article_id, 'hour', date_trunc('hour', created_at), COUNT(*)
+FROM article_likes WHERE is_liked = true AND created_at > NOW() - INTERVAL '7 days'
+GROUP BY article_id, date_trunc('hour', created_at)
+ON CONFLICT (article_id, granularity, bucket_start) DO NOTHING;
+
+INSERT INTO article_like_buckets (article_id, granularity, bucket_start, likes)
+SELECT article_id, 'day', date_trunc('day', created_at), COUNT(*)
+FROM article_likes WHERE is_liked = true
+GROUP BY article_id, date_trunc('day', created_at)
+ON CONFLICT (article_id, granularity, bucket_start) DO NOTHING;
+
+INSERT INTO article_recent_likers (article_id, user_id, liked_at)
+SELECT article_id, user_id, liked_at FROM (
+    SELECT article_id, user_id, updated_at AS liked_at,
+           ROW_NUMBER() OVER (PARTITION BY article_id ORDER BY updated_at DESC) AS position
+    FROM article_likes WHERE is_liked = true AND user_id IS NOT NULL
+) ranked
+WHERE position <= 50
+ON CONFLICT (article_id, user_id) DO NOTHING;
+
+INSERT INTO author_like_totals (user_id, like_count)
+SELECT user_id, SUM(COALESCE(like_count, 0)) FROM articles WHERE user_id IS NOT NULL GROUP BY user_id
+ON CONFLICT (user_id) DO UPDATE SET like_count = EXCLUDED.like_count, updated_at = NOW();
+
+-- 小时桶只用于近期趋势，可用 pg_cron 定期清理（保留天数与 LIKE_STATS_HOURLY_RETENTION_DAYS 保持一致）：
+-- SELECT cron.schedule('purge-hourly-like-buckets', '30 4 * * *',
+--     $$DELETE FROM article_like_buckets WHERE granularity = 'hour' AND bucket_start < NOW() - INTERVAL '7 days'$$);
@@ -0,0 +1,9 @@
+-- 数据库变更订阅：把文章、点赞与用户表加入 Supabase Realtime 的 publication
+-- 后端 utils/change_feed.py 通过 postgres_changes 订阅这三张表（CHANGE_FEED_ENABLED=true 时）
+
+ALTER PUBLICATION supabase_realtime ADD TABLE articles;
+ALTER PUBLICATION supabase_realtime ADD TABLE article_likes;
+ALTER PUBLICATION supabase_realtime ADD TABLE users;
+
+-- DELETE 事件的 old_record 默认只包含主键；article_likes 需要完整旧行才能知道是哪篇文章的点赞被删除
+ALTER TABLE article_likes REPLICA IDENTITY FULL;
@@ -0,0 +1,38 @@
+"""
+gunicorn 配置（Procfile 通过 -c gunicorn.conf.py 加载）
+
+GUNICORN_PRELOAD=1 时启用 --preload：主进程加载应用并调用 warmup_app 预热，
+worker fork 后以写时复制方式共享已导入的模块；Supabase 客户端仍在每个 worker 首次请求时创建。
+
+GUNICORN_WORKER_CLASS=gevent 时使用协程 worker，实时点赞推送（/api/articles/stream）的长连接
+只占用一个协程而不是整个 worker；每个 worker 的并发连接数由 GUNICORN_WORKER_CONNECTIONS 限制。
+默认的同步 worker 下该接口返回 204，客户端改为轮询批量点赞接口。
+
+开启 WARM_SNAPSHOT_ENABLED 时，负责写热缓存快照的 worker 被回收（max_requests）或退出前再写入一次快照。
+"""
+
+import os
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+timeout = 30
+keepalive = 2
+max_requests = 1000
+max_requests_jitter = 100
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '').lower() in ('1', 'true', 'yes')
+
+
+def when_ready(server):
+    """主进程就绪、fork worker 之前执行预热（仅 preload 模式下应用已在主进程中加载）"""
+    if not server.cfg.preload_app:
+        return
+    from app import warmup_app
+    warmup_app(server.app.wsgi())
+
+
+def worker_exit(server, worker):
+    """worker 进程退出前执行（包括 max_requests 回收）"""
+    from utils.warm_snapshot import warm_snapshot
+    warm_snapshot.write_on_exit()
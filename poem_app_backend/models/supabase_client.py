@@ -1,29 +1,344 @@
-from supabase.client import create_client, Client
+import contextvars
 import os
 import uuid
-from datetime import datetime, timedelta
-import bcrypt
-from typing import Optional, Union
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional, Union, TYPE_CHECKING
 import re
 
+from utils.article_events import article_events
+from utils.article_record import compact_article, compact_articles
+from utils.dataloader import BatchLoader
+from utils.heavy_hitters import hot_articles
+from utils.read_cache import ReadCache, SingleFlight
+from utils.replica import article_replica
+from utils.resilience import (CircuitBreaker, UpstreamTimeout, UpstreamUnavailable, add_stale_headers,
+                              is_upstream_failure, note_stale_read)
+from utils.timestamps import from_epoch_micros, to_epoch_micros
+
+if TYPE_CHECKING:
+    from supabase.client import Client
+
 class SupabaseClient:
     def __init__(self):
-        self.supabase: Optional[Client] = None
-        self.service_supabase: Optional[Client] = None  # Service role client for bypassing RLS
+        self._url: Optional[str] = None
+        self._key: Optional[str] = None
+        self._service_key: Optional[str] = None
+        self._supabase: Optional['Client'] = None
+        self._service_supabase: Optional['Client'] = None  # Service role client for bypassing RLS
+        # 创建客户端的进程ID：gunicorn fork 后 HTTP 连接池不能跨进程复用
+        self._owner_pid: Optional[int] = None
+        self._lock = threading.Lock()
+        # 请求内并发查询使用的线程池（同样按进程创建）
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+        # 标记当前线程是否为线程池中的工作线程（嵌套 fan_out 时直接在本线程执行）
+        self._fan_out_local = threading.local()
+        self.fan_out_workers = 8
+        self.request_deadline = 10.0
+        self.fan_out_stats = {'batches': 0, 'calls': 0, 'serial_ms': 0.0, 'wall_ms': 0.0}
+        # 并发请求中的单行按ID查询合并为一次 in 查询
+        is_key_error = lambda error: not isinstance(error, UpstreamUnavailable) and not is_upstream_failure(error)
+        # 请求内并发查询的线程池中，同一请求的其他查询可能同时加载，值得等待合并窗口
+        in_pool = lambda: getattr(self._fan_out_local, 'in_pool', False)
+        self.article_loader = BatchLoader('articles', self._fetch_articles, isolate=is_key_error, may_join=in_pool)
+        self.user_loader = BatchLoader('users', self._fetch_users, isolate=is_key_error, may_join=in_pool)
+        # 热点读取：相同查询并发时只执行一次，文章与列表带 stale-while-revalidate 缓存
+        self.flights = SingleFlight()
+        self.read_cache = ReadCache(self.flights, policy=hot_articles)
+        self.read_cache_ttl = {'article': 10.0, 'feed': 5.0, 'like_stats': 30.0}
+        self.read_cache_stale = 60.0
+        # 上游故障时的熔断与每类读操作的超时（秒）；HTTP 客户端超时是所有调用的硬上限
+        self.breaker = CircuitBreaker('supabase')
+        self.operation_timeouts = {'article': 2.0, 'feed': 3.0, 'likes': 2.0, 'lookup': 2.0}
+        self.http_timeout = 10.0
+        self._guard_executor: Optional[ThreadPoolExecutor] = None
+        self._guard_pid: Optional[int] = None
+        self._guard_local = threading.local()
 
     def init_app(self, app):
-        # 主客户端（使用anon key）
-        self.supabase = create_client(
-            app.config['SUPABASE_URL'],
-            app.config['SUPABASE_KEY']
-        )
-        
-        # 服务端客户端（使用service role key，可以绕过RLS）
-        if app.config.get('SUPABASE_SERVICE_KEY'):
-            self.service_supabase = create_client(
-                app.config['SUPABASE_URL'],
-                app.config['SUPABASE_SERVICE_KEY']
-            )
+        """
+        记录连接配置。
+        supabase 模块与客户端都推迟到每个工作进程第一次访问时才导入/创建，
+        避免拖慢冷启动，也避免 --preload 时在主进程中建立的连接被 fork 到 worker。
+        """
+        self._url = app.config['SUPABASE_URL']
+        self._key = app.config['SUPABASE_KEY']
+        self._service_key = app.config.get('SUPABASE_SERVICE_KEY')
+        self._supabase = None
+        self._service_supabase = None
+        self._owner_pid = None
+        self.fan_out_workers = app.config.get('SUPABASE_FAN_OUT_WORKERS', self.fan_out_workers)
+        self.request_deadline = app.config.get('SUPABASE_REQUEST_DEADLINE', self.request_deadline)
+        for loader in (self.article_loader, self.user_loader):
+            loader.window = app.config.get('LOADER_BATCH_WINDOW_MS', 2) / 1000
+            loader.max_batch = app.config.get('LOADER_MAX_BATCH', loader.max_batch)
+            loader.timeout = self.request_deadline
+        self.read_cache.max_entries = app.config.get('READ_CACHE_MAX_ENTRIES', self.read_cache.max_entries)
+        # 热点文章追踪与缓存准入（TinyLFU），频率表按缓存容量设定
+        hot_articles.init_app(app, self.read_cache.max_entries)
+        self.read_cache_ttl = {
+            'article': app.config.get('READ_CACHE_ARTICLE_TTL', self.read_cache_ttl['article']),
+            'feed': app.config.get('READ_CACHE_FEED_TTL', self.read_cache_ttl['feed']),
+            'like_stats': app.config.get('READ_CACHE_LIKE_STATS_TTL', self.read_cache_ttl['like_stats'])
+        }
+        self.read_cache_stale = app.config.get('READ_CACHE_STALE_SECONDS', self.read_cache_stale)
+        article_events.subscribe(self._invalidate_read_cache)
+        self.http_timeout = app.config.get('SUPABASE_HTTP_TIMEOUT', self.http_timeout)
+        self.operation_timeouts = {**self.operation_timeouts, **app.config.get('SUPABASE_OPERATION_TIMEOUTS', {})}
+        breaker = self.breaker
+        breaker.failure_rate = app.config.get('BREAKER_FAILURE_RATE', breaker.failure_rate)
+        breaker.min_calls = app.config.get('BREAKER_MIN_CALLS', breaker.min_calls)
+        breaker.window = app.config.get('BREAKER_WINDOW_SECONDS', breaker.window)
+        breaker.slow_call = app.config.get('BREAKER_SLOW_CALL_SECONDS', breaker.slow_call)
+        breaker.open_seconds = app.config.get('BREAKER_OPEN_SECONDS', breaker.open_seconds)
+        app.before_request(self._start_request_clock)
+        app.after_request(self._add_server_timing)
+        app.after_request(add_stale_headers)
+
+    def _ensure_clients(self):
+        """在当前进程中按需创建客户端"""
+        pid = os.getpid()
+        if self._owner_pid == pid or not self._url or not self._key:
+            return
+        with self._lock:
+            if self._owner_pid == pid:
+                return
+            from supabase.client import create_client
+            from supabase.lib.client_options import ClientOptions
+
+            # 上游挂起时连接不会无限期占用线程
+            options = lambda: ClientOptions(postgrest_client_timeout=self.http_timeout)
+            # 主客户端（使用anon key）
+            self._supabase = create_client(self._url, self._key, options=options())
+            # 服务端客户端（使用service role key，可以绕过RLS）
+            self._service_supabase = create_client(self._url, self._service_key, options=options()) if self._service_key else None
+            self._owner_pid = pid
+
+    @property
+    def supabase(self) -> Optional['Client']:
+        self._ensure_clients()
+        return self._supabase
+
+    @supabase.setter
+    def supabase(self, client: Optional['Client']):
+        self._supabase = client
+        self._owner_pid = os.getpid()
+
+    @property
+    def service_supabase(self) -> Optional['Client']:
+        self._ensure_clients()
+        return self._service_supabase
+
+    # ==================== 请求内并发查询 ====================
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        pid = os.getpid()
+        if self._executor is None or self._executor_pid != pid:
+            with self._lock:
+                if self._executor is None or self._executor_pid != pid:
+                    self._executor = ThreadPoolExecutor(max_workers=self.fan_out_workers, thread_name_prefix='supabase')
+                    self._executor_pid = pid
+        return self._executor
+
+    @staticmethod
+    def _start_request_clock():
+        from flask import g
+        g.supabase_request_started = time.monotonic()
+
+    def _deadline(self, timeout: Optional[float]) -> Optional[float]:
+        """本次并发查询的截止时间：请求级截止时间与 timeout 取较早者"""
+        from flask import g, has_request_context
+
+        deadlines = []
+        if timeout is not None:
+            deadlines.append(time.monotonic() + timeout)
+        if has_request_context() and 'supabase_request_started' in g:
+            deadlines.append(g.supabase_request_started + self.request_deadline)
+        return min(deadlines) if deadlines else None
+
+    def _timed(self, call: Callable):
+        self._fan_out_local.in_pool = True
+        started = time.perf_counter()
+        result = call()
+        return result, time.perf_counter() - started
+
+    def fan_out(self, *calls: Callable, timeout: Optional[float] = None) -> list:
+        """
+        并发执行互不依赖的查询，按传入顺序返回结果
+
+        Args:
+            calls: 无参函数（通常是 lambda），每个执行一次查询
+            timeout: 本批查询的超时秒数；同一请求内的所有批次还共享 SUPABASE_REQUEST_DEADLINE
+
+        Raises:
+            TimeoutError: 超过截止时间仍未完成
+            其他异常: 任一查询抛出的第一个异常
+        """
+        deadline = self._deadline(timeout)
+        started = time.perf_counter()
+        if getattr(self._fan_out_local, 'in_pool', False):
+            # 已在线程池中（外层 fan_out 的任务内再次 fan_out）：再提交到同一个线程池，
+            # 并发请求多时外层任务占满全部线程，内层任务只能排队到超时，因此在本线程依次执行
+            results = []
+            for call in calls:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError("Supabase 查询超过请求截止时间")
+                results.append(call())
+            self._record_fan_out(len(calls), time.perf_counter() - started, time.perf_counter() - started)
+            return results
+        # 在调用方的上下文副本中执行：工作线程可以读取同一请求的 g（请求内缓存、降级标记等）
+        executor = self._get_executor()
+        futures = [executor.submit(contextvars.copy_context().run, self._timed, call) for call in calls]
+        results, serial = [], 0.0
+        try:
+            for future in futures:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                result, elapsed = future.result(timeout=remaining)
+                results.append(result)
+                serial += elapsed
+        except FuturesTimeoutError:
+            for future in futures:
+                future.cancel()
+            raise TimeoutError("Supabase 查询超过请求截止时间")
+        self._record_fan_out(len(calls), serial, time.perf_counter() - started)
+        return results
+
+    def _record_fan_out(self, calls: int, serial: float, wall: float):
+        """累计串行耗时与实际耗时，两者之差即并发节省的时间"""
+        from flask import g, has_request_context
+
+        stats = self.fan_out_stats
+        stats['batches'] += 1
+        stats['calls'] += calls
+        stats['serial_ms'] += serial * 1000
+        stats['wall_ms'] += wall * 1000
+        if has_request_context():
+            timing = g.setdefault('supabase_fan_out', {'calls': 0, 'serial': 0.0, 'wall': 0.0})
+            timing['calls'] += calls
+            timing['serial'] += serial
+            timing['wall'] += wall
+
+    @staticmethod
+    def _add_server_timing(response):
+        from flask import g
+
+        timing = g.get('supabase_fan_out')
+        if timing:
+            entries = [
+                f'supabase;dur={timing["wall"] * 1000:.1f};desc="{timing["calls"]} concurrent calls"',
+                f'supabase-serial;dur={timing["serial"] * 1000:.1f}',
+                f'supabase-saved;dur={max(timing["serial"] - timing["wall"], 0) * 1000:.1f}'
+            ]
+            existing = response.headers.get('Server-Timing')
+            response.headers['Server-Timing'] = ', '.join(([existing] if existing else []) + entries)
+        return response
+
+    # ==================== 熔断与超时 ====================
+
+    def _get_guard_executor(self) -> ThreadPoolExecutor:
+        pid = os.getpid()
+        if self._guard_executor is None or self._guard_pid != pid:
+            with self._lock:
+                if self._guard_executor is None or self._guard_pid != pid:
+                    self._guard_executor = ThreadPoolExecutor(max_workers=self.fan_out_workers * 2,
+                                                              thread_name_prefix='supabase-guard')
+                    self._guard_pid = pid
+        return self._guard_executor
+
+    def _run_guarded(self, fn: Callable):
+        self._guard_local.active = True
+        try:
+            return fn()
+        finally:
+            self._guard_local.active = False
+
+    def guarded(self, operation: str, fn: Callable):
+        """
+        经熔断器执行一次读操作，超过该类操作的超时时间即放弃等待（连接本身由 HTTP 超时回收）。
+
+        Raises:
+            CircuitOpenError: 熔断打开中
+            UpstreamTimeout: 超过操作超时
+        """
+        if getattr(self._guard_local, 'active', False):
+            # 已在受保护的调用内部（例如缓存加载中的按ID查询），直接执行避免重复计数与线程池嵌套等待
+            return fn()
+        probe = self.breaker.before_call()
+        timeout = self.operation_timeouts.get(operation, self.http_timeout)
+        started = time.perf_counter()
+        future = self._get_guard_executor().submit(contextvars.copy_context().run, self._run_guarded, fn)
+        try:
+            result = future.result(timeout=timeout)
+        except FuturesTimeoutError:
+            error = UpstreamTimeout(f"Supabase {operation} 查询超过 {timeout:.1f}s", self.breaker.open_seconds)
+            self.breaker.record(time.perf_counter() - started, error, probe)
+            raise error
+        except Exception as e:
+            self.breaker.record(time.perf_counter() - started, e, probe)
+            raise
+        self.breaker.record(time.perf_counter() - started, None, probe)
+        return result
+
+    # ==================== 热点读取缓存 ====================
+
+    # 这些类别的缓存值转换为紧凑记录（utils/article_record）
+    COMPACT_KINDS = {'article': compact_article, 'feed': compact_articles}
+
+    def cached_read(self, key: tuple, fetch: Callable):
+        """
+        按类别（key[0]）的 TTL 读取缓存；并发的相同读取合并为一次查询，过期后先返回旧值再后台刷新。
+        上游超时或熔断时返回最后一次成功的数据并标记为降级响应，没有可用数据时抛出 UpstreamUnavailable。
+        返回的对象被多个请求共享，调用方不能修改；文章与列表以 ArticleRecord 紧凑记录缓存。
+        """
+        kind = key[0]
+        compact = self.COMPACT_KINDS.get(kind, lambda value: value)
+        try:
+            return self.read_cache.get(key, lambda: compact(self.guarded(kind, fetch)),
+                                       self.read_cache_ttl.get(kind, 0), self.read_cache_stale)
+        except Exception as e:
+            if not isinstance(e, UpstreamUnavailable) and not is_upstream_failure(e):
+                raise
+            last = self.read_cache.last_good(key)
+            if last is None:
+                if isinstance(e, UpstreamUnavailable):
+                    raise
+                raise UpstreamUnavailable(str(e), self.breaker.retry_after() or 5.0) from e
+            value, age = last
+            note_stale_read(age)
+            return value
+
+    def get_article_cached(self, article_id: str):
+        """读取单篇文章（经热点缓存），写操作内需要最新数据时仍使用 get_article_by_id"""
+        return self.cached_read(('article', article_id), lambda: self.get_article_by_id(article_id))
+
+    def _invalidate_read_cache(self, event: str, article):
+        """
+        本进程内的写操作立即失效缓存：新建/修改/删除会改变列表内容，列表直接丢弃；
+        点赞只改变计数，列表标记为过期后在后台刷新，避免热门文章被频繁点赞时反复击穿。
+        其他 worker 的写入在 TTL 内可见。
+        """
+        if event in ('loaded', 'bootstrapped'):
+            return
+        article_id = (article or {}).get('id')
+        if article_id:
+            self.read_cache.drop(('article', article_id))
+        if event == 'liked':
+            self.read_cache.mark_stale('feed')
+        else:
+            self.read_cache.drop_kind('feed')
+
+    @staticmethod
+    def _replica_ready() -> bool:
+        """本地副本开启且在新鲜度范围内时，热点列表读取直接走副本"""
+        if not article_replica.enabled:
+            return False
+        if article_replica.fresh():
+            return True
+        article_replica.stats['fallbacks'] += 1
+        return False
 
     def get_user_by_email(self, email: str):
         if self.supabase is None:
@@ -32,11 +347,28 @@ class SupabaseClient:
         return result.data[0] if result.data else None
 
     def get_user_by_id(self, user_id: str):
-        """根据ID获取用户"""
+        """根据ID获取用户（经 user_loader 与并发请求中的其他查询合并）"""
         if self.supabase is None:
             raise RuntimeError("Supabase client not initialized. Call init_app() first.")
-        result = self.supabase.table('users').select('*').eq('id', user_id).execute()
-        return result.data[0] if result.data else None
+        return self.user_loader.load(user_id)
+
+    def _fetch_users(self, user_ids: list) -> dict:
+        result = self.guarded('lookup', self.supabase.table('users').select('*').in_('id', user_ids).execute)
+        return {row['id']: row for row in result.data or []}
+
+    def iter_users(self, batch_size: int = 500, columns: str = 'id, email, username'):
+        """分页流式读取全部用户（批量邮件等场景），每次只在内存中保留一页"""
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        client = self.service_supabase or self.supabase
+        start = 0
+        while True:
+            result = client.table('users').select(columns).order('id').range(start, start + batch_size - 1).execute()
+            rows = result.data or []
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            start += batch_size
 
     def _format_image_url(self, url: Optional[str]) -> str:
         """将Cloudflare图片URL统一为自定义域名格式，并确保返回非None值"""
@@ -82,7 +414,10 @@ class SupabaseClient:
         except:
             pass
         result = self.supabase.table('articles').insert(article_data).execute()
-        return result.data[0] if result.data else None
+        article = result.data[0] if result.data else None
+        if article:
+            article_events.publish('created', article)
+        return article
 
     def get_all_articles(self, page: int = 1, per_page: int = 10, current_user_id=None):
         """
@@ -94,6 +429,9 @@ class SupabaseClient:
         if self.supabase is None:
             raise RuntimeError("Supabase client not initialized. Call init_app() first.")
         
+        if self._replica_ready():
+            return article_replica.page_articles(page, per_page, current_user_id)
+
         start_index = (page - 1) * per_page
         end_index = start_index + per_page - 1
         
@@ -107,11 +445,213 @@ class SupabaseClient:
             return result.data
 
     def get_article_by_id(self, article_id: str):
-        """根据ID获取文章"""
+        """根据ID获取文章（经 article_loader 与并发请求中的其他查询合并）"""
         if self.supabase is None:
             raise RuntimeError("Supabase client not initialized. Call init_app() first.")
-        result = self.supabase.table('articles').select('*').eq('id', article_id).execute()
-        return result.data[0] if result.data else None
+        return self.article_loader.load(article_id)
+
+    def get_articles_by_ids(self, article_ids: list):
+        """按ID批量获取文章，按传入顺序返回（不存在的ID被忽略）"""
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        if not article_ids:
+            return []
+        return [article for article in self.article_loader.load_many(article_ids) if article]
+
+    def _fetch_articles(self, article_ids: list) -> dict:
+        result = self.guarded('lookup', self.supabase.table('articles').select('*').in_('id', article_ids).execute)
+        return {row['id']: row for row in result.data or []}
+
+    def iter_articles(self, batch_size: int = 500):
+        """分页流式读取全部文章（供内存索引启动时构建），优先使用 service role 客户端以读取私密文章"""
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        client = self.service_supabase or self.supabase
+        start = 0
+        while True:
+            result = client.table('articles').select('*').order('id').range(start, start + batch_size - 1).execute()
+            rows = result.data or []
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            start += batch_size
+
+    def search_articles(self, query: str, limit: int = 20, offset: int = 0):
+        """数据库模糊搜索（内存索引尚未就绪时的降级方案），只返回公开文章"""
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        # 去掉 PostgREST 过滤语法中的保留字符
+        keyword = re.sub(r'[,()*%\\]', ' ', query).strip()
+        if not keyword:
+            return []
+        result = self.supabase.table('articles').select('*').eq('is_public_visible', True).or_(
+            f'title.ilike.*{keyword}*,content.ilike.*{keyword}*'
+        ).order('created_at', desc=True).range(offset, offset + limit - 1).execute()
+        return result.data
+
+    def get_tag_articles(self, tag: str, limit: int = 20, before: Optional[tuple] = None):
+        """
+        按标签分页获取公开文章（按创建时间倒序）
+
+        Args:
+            tag: 规范化后的标签
+            limit: 每页数量
+            before: 游标 (created_at, article_id)，返回严格排在它之后的文章
+
+        Returns:
+            list: 文章列表
+        """
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+
+        if before:
+            # 游标中的ID会拼进 PostgREST 过滤条件，只接受 UUID（不合法时抛出 ValueError）
+            created_at, article_id = before[0], str(uuid.UUID(str(before[1])))
+
+        try:
+            query = self.supabase.table('article_tags').select('article_id, created_at').eq('tag', tag)
+            if before:
+                query = query.or_(
+                    f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",article_id.lt.{article_id})'
+                )
+            result = query.order('created_at', desc=True).order('article_id', desc=True).limit(limit).execute()
+            return self.get_articles_by_ids([row['article_id'] for row in result.data or []])
+        except Exception as e:
+            # article_tags 迁移尚未执行时退回到数组包含查询
+            print(f"article_tags 查询失败，使用 tags 数组查询: {e}")
+
+        query = self.supabase.table('articles').select('*').eq('is_public_visible', True).contains('tags', [tag])
+        if before:
+            query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{article_id})')
+        result = query.order('created_at', desc=True).order('id', desc=True).limit(limit).execute()
+        return result.data
+
+    def get_popular_tags(self, limit: int = 20):
+        """获取文章数最多的标签（由 tag_counts 表预先计算）"""
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        result = self.supabase.table('tag_counts').select('tag, article_count').gt('article_count', 0).order(
+            'article_count', desc=True
+        ).limit(limit).execute()
+        return result.data
+
+    def autocomplete_tags(self, prefix: str, limit: int = 10):
+        """按前缀匹配标签，按文章数倒序"""
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        prefix = re.sub(r'[,()*%_\\]', '', prefix)
+        if not prefix:
+            return []
+        result = self.supabase.table('tag_counts').select('tag, article_count').like('tag', f'{prefix}*').gt(
+            'article_count', 0
+        ).order('article_count', desc=True).limit(limit).execute()
+        return result.data
+
+    def get_most_liked_articles(self, since: str, limit: int = 20):
+        """获取 since 之后发布的点赞数最多的公开文章（热门排行尚未就绪时的降级方案）"""
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        result = self.supabase.table('articles').select('*').eq('is_public_visible', True).gte(
+            'created_at', since
+        ).order('like_count', desc=True).order('created_at', desc=True).limit(limit).execute()
+        return result.data
+
+    # ==================== 客户端增量同步 ====================
+
+    def _changed_since(self, table: str, columns: str, column: str, since: str, limit: Optional[int],
+                       user_id: Optional[str] = None, exact: bool = False, **filters):
+        """按时间列升序读取 column >= since 的行；exact 时只读取 column == since 的全部行（翻页遇到同一时间戳的大批行时使用）"""
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        query = self.supabase.table(table).select(columns)
+        query = query.eq(column, since) if exact else query.gte(column, since)
+        if user_id:
+            query = query.eq('user_id', user_id)
+        for name, value in filters.items():
+            query = query.eq(name, value)
+        query = query.order(column)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.execute().data or []
+
+    def get_articles_changed_since(self, since: str, limit: Optional[int] = 500, user_id: Optional[str] = None,
+                                   public_only: bool = False, exact: bool = False):
+        """
+        updated_at 不早于 since 的文章，按 updated_at 升序
+
+        默认包括私密文章，由调用方据此通知客户端移除被隐藏的文章；全量同步时只需要公开文章（public_only）
+        """
+        filters = {'is_public_visible': True} if public_only else {}
+        return self._changed_since('articles', '*', 'updated_at', since, limit, user_id, exact, **filters)
+
+    def get_tombstones_since(self, since: str, limit: Optional[int] = 500, user_id: Optional[str] = None,
+                             exact: bool = False):
+        """deleted_at 不早于 since 的删除墓碑（需要 create_article_sync.sql）"""
+        return self._changed_since('article_tombstones', 'article_id, user_id, was_public, deleted_at', 'deleted_at',
+                                   since, limit, user_id, exact)
+
+    def get_like_counts_since(self, since: str, limit: Optional[int] = 500, user_id: Optional[str] = None,
+                              exact: bool = False):
+        """like_count 在 since 之后变化过的文章的 ID 与当前计数（需要 create_article_sync.sql）"""
+        return self._changed_since('articles', 'id, like_count, is_public_visible, like_count_updated_at',
+                                   'like_count_updated_at', since, limit, user_id, exact)
+
+    def fetch_changes(self, fetch: Callable, column: str, since_micros: int, limit: int):
+        """
+        读取一个变更列表的一页（多取一行判断是否截断），fetch(since, limit, exact=False) 为上面的 *_since 方法之一
+
+        Returns:
+            (行列表, 下一页的起始时间（微秒）；未截断时为 None)
+        """
+        since = from_epoch_micros(since_micros)
+        rows = self.guarded('sync', lambda: fetch(since, limit + 1))
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        first, last = to_epoch_micros(rows[0][column]), to_epoch_micros(rows[-1][column])
+        if first == last:
+            # 整页同一时间戳：补读这一时间戳的全部行，下一页从下一微秒开始
+            rows = self.guarded('sync', lambda: fetch(rows[-1][column], None, exact=True))
+            return rows, last + 1
+        return rows, last
+
+    def get_related_articles(self, article_id: str):
+        """读取离线计算的相关文章 [(文章ID, 相似度)]，没有记录时返回 None"""
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        result = self.supabase.table('article_related').select('related_ids, scores').eq('article_id', article_id).execute()
+        if not result.data:
+            return None
+        row = result.data[0]
+        return list(zip(row.get('related_ids') or [], row.get('scores') or []))
+
+    def upsert_related_articles(self, rows):
+        """批量写入相关文章，rows 为 [(文章ID, [(相关文章ID, 相似度)])]"""
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        client = self.service_supabase or self.supabase
+        now = datetime.utcnow().isoformat()
+        payload = [
+            {
+                'article_id': article_id,
+                'related_ids': [related_id for related_id, _ in neighbours],
+                'scores': [score for _, score in neighbours],
+                'updated_at': now
+            }
+            for article_id, neighbours in rows
+        ]
+        if payload:
+            client.table('article_related').upsert(payload).execute()
+
+    def upsert_article_signatures(self, rows: list):
+        """批量写入 MinHash 签名，rows 为 {'article_id', 'signature', 'duplicate_of', 'similarity'} 字典列表"""
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        if not rows:
+            return
+        client = self.service_supabase or self.supabase
+        now = datetime.utcnow().isoformat()
+        client.table('article_signatures').upsert([{**row, 'updated_at': now} for row in rows]).execute()
 
     def get_articles_by_user(self, user_id: str):
         """获取用户的所有文章"""
@@ -125,6 +665,9 @@ class SupabaseClient:
         if self.supabase is None:
             raise RuntimeError("Supabase client not initialized. Call init_app() first.")
         result = self.supabase.table('articles').delete().eq('id', article_id).eq('user_id', user_id).execute()
+        self.article_loader.clear(article_id)
+        for article in result.data or []:
+            article_events.publish('deleted', article)
         return len(result.data) > 0
 
     def update_article_image(self, article_id: str, image_url: Optional[str]):
@@ -133,7 +676,10 @@ class SupabaseClient:
             raise RuntimeError("Supabase client not initialized. Call init_app() first.")
         formatted_url = self._format_image_url(image_url)
         # 执行 update，然后兼容不同版本返回值格式；如 update 不返回行则 fallback 再查询一次
-        resp = self.supabase.table('articles').update({'image_url': formatted_url}).eq('id', article_id).execute()
+        resp = self.supabase.table('articles').update({
+            'image_url': formatted_url,
+            'updated_at': datetime.utcnow().isoformat()
+        }).eq('id', article_id).execute()
         data = None
         if resp is None:
             data = None
@@ -141,9 +687,12 @@ class SupabaseClient:
             data = resp.data
         elif isinstance(resp, dict) and 'data' in resp:
             data = resp.get('data')
-        if data:
-            return data[0] if isinstance(data, list) else data
-        return self.get_article_by_id(article_id)
+        self.article_loader.clear(article_id)
+        article = (data[0] if isinstance(data, list) else data) if data else self.get_article_by_id(article_id)
+        if article:
+            article_events.publish('updated', article)
+            self.article_loader.prime(article_id, article)
+        return article
 
     def update_article_fields(self, article_id: str, user_id: str, update_data: dict):
         """
@@ -155,6 +704,8 @@ class SupabaseClient:
         """
         if self.supabase is None:
             raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        # 内容变更必须刷新 updated_at：列表片段缓存等以它作为版本号
+        update_data = {**update_data, 'updated_at': update_data.get('updated_at') or datetime.utcnow().isoformat()}
         try:
             # 使用 table(...).update(...).eq(...).execute() 是较新/通用的方式
             # 注意：使用 self.supabase（不是 self.client），并避免在 eq() 后再调用 select()
@@ -169,12 +720,13 @@ class SupabaseClient:
             elif isinstance(resp, dict) and 'data' in resp:
                 data = resp.get('data')
 
-            # 有数据且为列表时返回第一项
-            if data:
-                return data[0] if isinstance(data, list) else data
-
-            # 兼容性保底：update 可能不返回行，主动再查询一次并返回
-            return self.get_article_by_id(article_id)
+            # 有数据且为列表时返回第一项；兼容性保底：update 可能不返回行，主动再查询一次并返回
+            self.article_loader.clear(article_id)
+            article = (data[0] if isinstance(data, list) else data) if data else self.get_article_by_id(article_id)
+            if article:
+                article_events.publish('updated', article)
+                self.article_loader.prime(article_id, article)
+            return article
 
         except Exception as e:
             # 记录错误以便在 render/日志中定位（保留原始异常信息）
@@ -197,6 +749,9 @@ class SupabaseClient:
         if self.supabase is None:
             raise RuntimeError("Supabase client not initialized. Call init_app() first.")
         
+        if self._replica_ready():
+            return article_replica.recent_articles(limit, current_user_id)
+        
         if current_user_id is None:
             # 匿名用户：只返回公开文章
             query = self.supabase.table('articles').select('*').eq('is_public_visible', True)
@@ -222,6 +777,8 @@ class SupabaseClient:
         if self.supabase is None:
             raise RuntimeError("Supabase client not initialized. Call init_app() first.")
         
+        if self._replica_ready():
+            return article_replica.latest_per_author(limit, current_user_id)
         return self._get_articles_by_author_count_fallback(limit, current_user_id)
 
     def _get_articles_by_author_count_fallback(self, limit=10, current_user_id=None):
@@ -283,8 +840,11 @@ class SupabaseClient:
             raise RuntimeError("Supabase client not initialized. Call init_app() first.")
         
         # 获取该作者的所有文章
-        result = self.supabase.table('articles').select('*').eq('author', author).order('created_at', desc=True).execute()
-        all_articles = result.data
+        if self._replica_ready():
+            all_articles = article_replica.author_articles(author)
+        else:
+            result = self.supabase.table('articles').select('*').eq('author', author).order('created_at', desc=True).execute()
+            all_articles = result.data
         
         if not all_articles:
             return []
@@ -339,6 +899,7 @@ class SupabaseClient:
                 'password_hash': password_hash,
                 'updated_at': datetime.utcnow().isoformat()
             }).eq('id', user_id).execute()
+            self.user_loader.clear(user_id)
             
             print(f"Password update result: {result.data if hasattr(result, 'data') else 'No data'}")
             return result.data is not None and len(result.data) > 0
@@ -417,6 +978,8 @@ class SupabaseClient:
                     # 当前已点赞，删除记录（取消点赞）
                     self.supabase.table('article_likes').delete().eq('id', like_record['id']).execute()
                     is_liked = False
+                    # 被取消的点赞的时间（重新点赞时更新 updated_at），热门排行据此减去衰减后的权重
+                    liked_at = like_record.get('updated_at') or like_record.get('created_at')
                 else:
                     # 当前未点赞，更新为点赞
                     self.supabase.table('article_likes').update({
@@ -444,9 +1007,16 @@ class SupabaseClient:
                 self.supabase.table('article_likes').insert(like_data).execute()
                 is_liked = True
             
-            # 获取更新后的文章信息（包含最新的like_count）
+            # 获取更新后的文章信息（包含最新的like_count），先丢弃本请求开头读到的旧行
+            self.article_loader.clear(article_id)
+            observed_at = int(time.time() * 1_000_000)
             updated_article = self.get_article_by_id(article_id)
             like_count = updated_article.get('like_count', 0)
+            event = {'id': article_id, 'delta': 1 if is_liked else -1, 'like_count': like_count,
+                     'observed_at': observed_at}
+            if not is_liked:
+                event['liked_at'] = liked_at
+            article_events.publish('liked', event)
             
             return {
                 'success': True,
@@ -473,25 +1043,25 @@ class SupabaseClient:
         if self.supabase is None:
             raise RuntimeError("Supabase client not initialized. Call init_app() first.")
         
-        # 获取文章信息（包含总点赞数）
-        article = self.get_article_by_id(article_id)
-        if not article:
-            raise ValueError("文章不存在")
-        
-        like_count = article.get('like_count', 0)
-        is_liked_by_user = False
-        
-        # 检查当前用户是否已点赞
+        # 文章信息（包含总点赞数）与当前用户的点赞记录互不依赖，并发查询
+        calls = [lambda: self.get_article_cached(article_id)]
         if user_id or device_id:
-            query = self.supabase.table('article_likes').select('*').eq('article_id', article_id).eq('is_liked', True)
+            query = self.supabase.table('article_likes').select('id').eq('article_id', article_id).eq('is_liked', True)
             
             if user_id:
                 query = query.eq('user_id', user_id)
             else:
                 query = query.eq('device_id', device_id)
             
-            like_record = query.execute()
-            is_liked_by_user = len(like_record.data) > 0
+            calls.append(lambda: self.guarded('likes', query.limit(1).execute))
+        
+        article, *like_record = self.fan_out(*calls)
+        if not article:
+            raise ValueError("文章不存在")
+        
+        like_count = article.get('like_count', 0)
+        # 检查当前用户是否已点赞
+        is_liked_by_user = bool(like_record and like_record[0].data)
         
         return {
             'article_id': article_id,
@@ -517,12 +1087,8 @@ class SupabaseClient:
         if not article_ids:
             return {}
         
-        # 获取所有文章的基本信息
-        articles_result = self.supabase.table('articles').select('id, like_count').in_('id', article_ids).execute()
-        articles_data = {article['id']: article for article in articles_result.data}
-        
-        # 获取用户的点赞记录
-        user_likes = {}
+        # 文章的基本信息与用户的点赞记录并发查询
+        calls = [lambda: self.supabase.table('articles').select('id, like_count').in_('id', article_ids).execute()]
         if user_id or device_id:
             query = self.supabase.table('article_likes').select('article_id').in_('article_id', article_ids).eq('is_liked', True)
             
@@ -531,8 +1097,11 @@ class SupabaseClient:
             else:
                 query = query.eq('device_id', device_id)
             
-            likes_result = query.execute()
-            user_likes = {like['article_id']: True for like in likes_result.data}
+            calls.append(query.execute)
+        
+        articles_result, *likes_result = self.fan_out(*calls)
+        articles_data = {article['id']: article for article in articles_result.data}
+        user_likes = {like['article_id']: True for like in likes_result[0].data} if likes_result else {}
         
         # 组装返回数据
         result = {}
@@ -546,6 +1115,123 @@ class SupabaseClient:
         
         return result
     
+    def get_liked_article_ids(self, user_id: Optional[str] = None, device_id: Optional[str] = None,
+                              article_ids: Optional[list] = None, limit: int = 500):
+        """
+        获取调用者点赞过的文章ID
+
+        Args:
+            user_id: 用户ID（登录用户）
+            device_id: 设备ID（匿名用户）
+            article_ids: 只查询这些文章；为 None 时返回最近点赞的 limit 篇
+
+        Returns:
+            (set, bool): 文章ID集合，以及结果是否完整（未给出 article_ids 且达到 limit 时为 False）
+        """
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        if not user_id and not device_id:
+            return set(), True
+
+        query = self.supabase.table('article_likes').select('article_id').eq('is_liked', True)
+        query = query.eq('user_id', user_id) if user_id else query.eq('device_id', device_id)
+        if article_ids is not None:
+            if not article_ids:
+                return set(), True
+            result = query.in_('article_id', list(article_ids)).execute()
+            return {row['article_id'] for row in result.data or []}, True
+
+        result = query.order('created_at', desc=True).limit(limit).execute()
+        rows = result.data or []
+        return {row['article_id'] for row in rows}, len(rows) < limit
+
+    def get_author_stats(self, user_ids: list):
+        """
+        统计作者的公开文章数与获赞总数
+
+        Returns:
+            dict: 以 user_id 为 key 的 {'article_count', 'total_likes'}
+        """
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        user_ids = [user_id for user_id in dict.fromkeys(user_ids) if user_id]
+        if not user_ids:
+            return {}
+        result = self.supabase.table('articles').select('user_id, like_count').in_('user_id', user_ids).eq(
+            'is_public_visible', True
+        ).execute()
+        stats = {user_id: {'article_count': 0, 'total_likes': 0} for user_id in user_ids}
+        for row in result.data or []:
+            author = stats.get(row.get('user_id'))
+            if author is not None:
+                author['article_count'] += 1
+                author['total_likes'] += row.get('like_count') or 0
+        return stats
+
+    def get_like_stats(self, article_id: str, granularity: str = 'day', periods: int = 30, recent_limit: int = 10):
+        """
+        从预聚合表读取文章点赞统计（需要 create_like_buckets.sql），不扫描 article_likes
+
+        Args:
+            granularity: 'hour' 或 'day'
+            periods: 趋势包含的桶数（截至当前小时/当天）
+
+        Returns:
+            dict: {'granularity', 'like_trend': [{'bucket_start', 'likes', 'unlikes', 'net'}]（从早到晚，空桶补 0）,
+                   'recent_likes': [{'user_id', 'username', 'liked_at'}], 'author_total_likes'}
+        """
+        if self.supabase is None:
+            raise RuntimeError("Supabase client not initialized. Call init_app() first.")
+        article = self.get_article_cached(article_id)
+        if not article:
+            raise ValueError("文章不存在")
+        return self.cached_read(
+            ('like_stats', article_id, granularity, periods, recent_limit),
+            lambda: self._fetch_like_stats(article_id, article.get('user_id'), granularity, periods, recent_limit)
+        )
+
+    def _fetch_like_stats(self, article_id: str, author_id: Optional[str], granularity: str, periods: int,
+                          recent_limit: int):
+        step = timedelta(hours=1) if granularity == 'hour' else timedelta(days=1)
+        end = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        if granularity == 'day':
+            end = end.replace(hour=0)
+        start = end - step * (periods - 1)
+
+        calls = [
+            lambda: self.supabase.table('article_like_buckets').select('bucket_start, likes, unlikes').eq(
+                'article_id', article_id).eq('granularity', granularity).gte(
+                'bucket_start', start.isoformat()).order('bucket_start').execute().data or [],
+            lambda: self.supabase.table('article_recent_likers').select('user_id, liked_at').eq(
+                'article_id', article_id).order('liked_at', desc=True).limit(recent_limit).execute().data or []
+        ]
+        if author_id:
+            calls.append(lambda: self.supabase.table('author_like_totals').select('like_count').eq(
+                'user_id', author_id).limit(1).execute().data or [])
+        buckets, likers, *totals = self.fan_out(*calls)
+
+        counts = {to_epoch_micros(row['bucket_start']): row for row in buckets}
+        trend = []
+        for index in range(periods):
+            bucket_start = start + step * index
+            row = counts.get(to_epoch_micros(bucket_start)) or {}
+            likes, unlikes = row.get('likes') or 0, row.get('unlikes') or 0
+            trend.append({'bucket_start': bucket_start.isoformat(), 'likes': likes, 'unlikes': unlikes,
+                          'net': likes - unlikes})
+
+        users = self.user_loader.load_many([row['user_id'] for row in likers])
+        recent_likes = [
+            {'user_id': row['user_id'], 'username': (user or {}).get('username'), 'liked_at': row['liked_at']}
+            for row, user in zip(likers, users)
+        ]
+        author_total = totals[0][0]['like_count'] if totals and totals[0] else 0
+        return {
+            'granularity': granularity,
+            'like_trend': trend,
+            'recent_likes': recent_likes,
+            'author_total_likes': author_total
+        }
+
     def update_article_visibility(self, article_id: str, user_id: str, is_public_visible: bool):
         """
         更新文章的首页可见性
@@ -580,11 +1266,13 @@ class SupabaseClient:
             elif isinstance(resp, dict) and 'data' in resp:
                 data = resp.get('data')
             
-            if data:
-                return data[0] if isinstance(data, list) else data
-            
             # 如果更新没有返回数据，则再查询一次
-            return self.get_article_by_id(article_id)
+            self.article_loader.clear(article_id)
+            article = (data[0] if isinstance(data, list) else data) if data else self.get_article_by_id(article_id)
+            if article:
+                article_events.publish('updated', article)
+                self.article_loader.prime(article_id, article)
+            return article
             
         except Exception as e:
             raise Exception(f"更新文章可见性失败: {str(e)}")
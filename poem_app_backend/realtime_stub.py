@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+本地模拟的 Supabase Realtime 服务端（Phoenix 协议子集），用于调试 utils/change_feed.py
+
+接受 phx_join 与 heartbeat，从标准输入读取变更并推送给所有已加入的连接，每行一条：
+    articles UPDATE {"id": "...", "updated_at": "...", "like_count": 3}
+    articles DELETE {"id": "..."}
+    article_likes INSERT {"article_id": "..."}
+输入 drop 断开全部连接，用于验证重连与补读。
+
+用法:
+    python realtime_stub.py [--port 4000]
+    CHANGE_FEED_ENABLED=true CHANGE_FEED_URL=ws://127.0.0.1:4000/socket python app.py
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime, timezone
+
+import websockets
+
+clients = {}    # 连接 -> 加入的 topic
+
+
+async def handle(socket, path=None):
+    try:
+        async for raw in socket:
+            message = json.loads(raw)
+            reply = {'topic': message['topic'], 'event': 'phx_reply', 'ref': message.get('ref'),
+                     'join_ref': message.get('join_ref'), 'payload': {'status': 'ok', 'response': {}}}
+            if message['event'] == 'phx_join':
+                clients[socket] = message['topic']
+                print(f"已加入 {message['topic']}（共 {len(clients)} 个连接）")
+            await socket.send(json.dumps(reply))
+    finally:
+        clients.pop(socket, None)
+
+
+def change_message(topic: str, line: str) -> str:
+    table, change, payload = line.split(' ', 2)
+    row = json.loads(payload)
+    data = {
+        'schema': 'public', 'table': table, 'type': change,
+        'commit_timestamp': datetime.now(timezone.utc).isoformat(),
+        'record': row if change != 'DELETE' else {},
+        'old_record': row if change != 'INSERT' else {}
+    }
+    return json.dumps({'topic': topic, 'event': 'postgres_changes', 'ref': None, 'payload': {'data': data, 'ids': []}})
+
+
+async def read_commands():
+    loop = asyncio.get_running_loop()
+    while True:
+        line = await loop.run_in_executor(None, sys.stdin.readline)
+        if not line:
+            # 标准输入结束后只保持连接
+            return
+        line = line.strip()
+        if not line:
+            continue
+        if line == 'drop':
+            for socket in list(clients):
+                await socket.close()
+            continue
+        try:
+            for socket, topic in list(clients.items()):
+                await socket.send(change_message(topic, line))
+        except (ValueError, KeyError) as e:
+            print(f"无法解析: {e}")
+
+
+async def main(port: int):
+    async with websockets.serve(handle, '127.0.0.1', port):
+        print(f"Realtime 模拟服务端: ws://127.0.0.1:{port}/socket")
+        await read_commands()
+        await asyncio.Future()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本地模拟的 Supabase Realtime 服务端')
+    parser.add_argument('--port', type=int, default=4000)
+    args = parser.parse_args()
+    asyncio.run(main(args.port))
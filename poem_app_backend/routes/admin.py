@@ -0,0 +1,76 @@
+from flask import Blueprint, request, jsonify, current_app
+from models.supabase_client import supabase_client
+from utils.abuse_guard import like_guard
+from utils.change_feed import change_feed
+from utils.heavy_hitters import hot_articles
+from utils.live_likes import like_stream
+from utils.rate_limit import rate_limiter
+from utils.replica import article_replica
+from utils.trending import trending_index
+from utils.warm_snapshot import warm_snapshot
+from functools import wraps
+import hmac
+import os
+
+admin_bp = Blueprint('admin', __name__)
+
+def admin_required(f):
+    """运维接口验证：请求头 X-Admin-Token 与 ADMIN_TOKEN 一致；未配置 ADMIN_TOKEN 时接口不可用"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        expected = current_app.config.get('ADMIN_TOKEN')
+        if not expected:
+            return jsonify({'error': '运维接口未启用'}), 404
+        provided = request.headers.get('X-Admin-Token', '')
+        if not hmac.compare_digest(provided.encode('utf-8'), expected.encode('utf-8')):
+            return jsonify({'error': '无效的运维令牌'}), 401
+        return f(*args, **kwargs)
+    return decorated
+
+@admin_bp.route('/admin/metrics', methods=['GET'])
+@admin_required
+def get_metrics():
+    """当前 worker 的缓存、熔断、刷量防护等运行指标（刷量拒绝总数为所有 worker 合计）"""
+    response = jsonify({
+        'pid': os.getpid(),
+        'like_guard': like_guard.snapshot(),
+        'rate_limit': rate_limiter.snapshot(),
+        'read_cache': supabase_client.read_cache.snapshot(),
+        'hot_articles': hot_articles.snapshot(),
+        'breaker': supabase_client.breaker.snapshot(),
+        'loaders': {
+            'article': supabase_client.article_loader.stats,
+            'user': supabase_client.user_loader.stats
+        },
+        'replica': article_replica.snapshot(),
+        'change_feed': change_feed.snapshot(),
+        'live_likes': like_stream.snapshot(),
+        'trending': trending_index.stats(),
+        'warm_snapshot': warm_snapshot.snapshot()
+    })
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@admin_bp.route('/admin/hot-articles', methods=['GET'])
+@admin_required
+def get_hot_articles():
+    """
+    当前 worker 访问最多的文章（Space-Saving 估计，count - error 为访问次数下界），用于容量规划
+    
+    Query Parameters:
+    - limit: 返回条数，默认 20，最多 200
+    """
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+    hot = hot_articles.top(limit)
+    try:
+        articles = supabase_client.get_articles_by_ids([item['id'] for item in hot])
+        titles = {article['id']: article.get('title') for article in articles if article}
+    except Exception:
+        # 标题只是辅助信息，数据库不可用时照常返回计数
+        titles = {}
+    for item in hot:
+        item['title'] = titles.get(item['id'])
+        item['pinned'] = hot_articles.pinned(('article', item['id']))
+    response = jsonify({'pid': os.getpid(), 'articles': hot, **hot_articles.snapshot()})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
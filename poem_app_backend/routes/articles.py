@@ -1,6 +1,13 @@
 from flask import Blueprint, request, jsonify, current_app
 from models.supabase_client import supabase_client
-from utils.ai_image_generator import ai_generator
+from utils.json_provider import feed_response
+from utils.http_cache import conditional_response
+from utils.search_index import search_index
+from utils.trending import trending_index
+from utils.related import related_index
+from utils.near_duplicates import near_duplicates
+from utils.includes import fetch_list, fetch_detail, extra_stamp
+from utils.resilience import UpstreamUnavailable, stale_marker, unavailable_response
 import jwt
 from functools import wraps
 from datetime import datetime, timedelta
@@ -57,13 +64,95 @@ def get_current_user_id():
     
     return current_user_id
 
+def list_response(key, fetch_articles, current_user_id=None, private=None, cache_key=None):
+    """
+    文章列表响应：支持 ?include=likes,author_stats，附加数据与文章一起返回
+
+    Args:
+        key: 响应中文章列表的字段名
+        fetch_articles: 无参函数，返回文章列表
+        current_user_id: 当前用户ID（匿名为None）
+        private: 是否为私有响应，默认在登录用户访问时为私有
+        cache_key: 列表查询参数组成的元组，提供时经热点缓存读取（需包含 current_user_id）
+    """
+    if cache_key is not None:
+        fetch_uncached = fetch_articles
+        fetch_articles = lambda: supabase_client.cached_read(('feed',) + cache_key, fetch_uncached)
+    articles, extra, personalized = fetch_list(fetch_articles, current_user_id)
+    extra.update(stale_marker())
+    if private is None:
+        private = current_user_id is not None
+    return conditional_response(
+        articles,
+        lambda: feed_response(key, articles, extra or None),
+        private=private or personalized,
+        extra_stamp=extra_stamp(extra)
+    )
+
 @articles_bp.route('/articles/home', methods=['GET'])
 def get_home_articles():
     """获取首页文章数据"""
     try:
         current_user_id = get_current_user_id()
-        recent_articles = supabase_client.get_recent_articles(limit=10, current_user_id=current_user_id)
-        return jsonify({'recent_articles': recent_articles}), 200
+        return list_response(
+            'recent_articles',
+            lambda: supabase_client.get_recent_articles(limit=10, current_user_id=current_user_id),
+            current_user_id,
+            cache_key=('home', current_user_id)
+        )
+    except UpstreamUnavailable as e:
+        return unavailable_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@articles_bp.route('/articles/search', methods=['GET'])
+def search_articles():
+    """全文搜索公开文章（标题/正文/标签，BM25 排序）"""
+    try:
+        query = (request.args.get('q') or '').strip()
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        if not query:
+            return jsonify({'error': '缺少搜索关键词 q'}), 400
+
+        if search_index.ready:
+            hits, _ = search_index.search(query, limit=limit, offset=offset)
+            articles = supabase_client.get_articles_by_ids([article_id for article_id, _ in hits])
+            # 索引与数据库之间可能有短暂延迟，再按可见性过滤一次
+            # （过滤之后索引的命中总数不再准确，因此响应中不返回总数）
+            articles = [article for article in articles if article.get('is_public_visible') is not False]
+        else:
+            # 索引仍在构建中，降级为数据库模糊搜索
+            articles = supabase_client.search_articles(query, limit=limit, offset=offset)
+
+        return conditional_response(
+            articles,
+            lambda: feed_response('articles', articles, {'query': query})
+        )
+    except UpstreamUnavailable as e:
+        return unavailable_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@articles_bp.route('/articles/trending', methods=['GET'])
+def get_trending_articles():
+    """热门文章：点赞热度随时间衰减，从内存排行读取"""
+    try:
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+        offset = max(request.args.get('offset', 0, type=int), 0)
+
+        if trending_index.ready:
+            ranked = trending_index.top(limit=limit, offset=offset)
+            articles = supabase_client.get_articles_by_ids([article_id for article_id, _ in ranked])
+            articles = [article for article in articles if article.get('is_public_visible') is not False]
+        else:
+            # 排行尚未构建完成，降级为最近一周点赞最多的文章
+            since = (datetime.utcnow() - timedelta(days=7)).isoformat()
+            articles = supabase_client.get_most_liked_articles(since, limit=limit) if offset == 0 else []
+
+        return conditional_response(articles, lambda: feed_response('articles', articles))
+    except UpstreamUnavailable as e:
+        return unavailable_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -74,11 +163,14 @@ def get_articles_by_author_count():
         limit = request.args.get('limit', 10, type=int)
         current_user_id = get_current_user_id()
         
-        articles = supabase_client.get_articles_by_author_count(
-            limit=limit, 
-            current_user_id=current_user_id
+        return list_response(
+            'articles',
+            lambda: supabase_client.get_articles_by_author_count(limit=limit, current_user_id=current_user_id),
+            current_user_id,
+            cache_key=('by-author-count', limit, current_user_id)
         )
-        return jsonify({'articles': articles}), 200
+    except UpstreamUnavailable as e:
+        return unavailable_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -88,11 +180,14 @@ def get_articles_by_author(author):
     try:
         current_user_id = get_current_user_id()
         
-        articles = supabase_client.get_articles_by_author(
-            author, 
-            current_user_id=current_user_id
+        return list_response(
+            'articles',
+            lambda: supabase_client.get_articles_by_author(author, current_user_id=current_user_id),
+            current_user_id,
+            cache_key=('by-author', author, current_user_id)
         )
-        return jsonify({'articles': articles}), 200
+    except UpstreamUnavailable as e:
+        return unavailable_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -103,8 +198,9 @@ def get_user_articles(user_id, current_user_id):
     if user_id != current_user_id:
         return jsonify({'error': '无权限访问'}), 403
     try:
-        articles = supabase_client.get_articles_by_user(user_id)
-        return jsonify({'articles': articles}), 200
+        return list_response('articles', lambda: supabase_client.get_articles_by_user(user_id), current_user_id, private=True)
+    except UpstreamUnavailable as e:
+        return unavailable_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -116,12 +212,14 @@ def get_articles():
         per_page = request.args.get('per_page', 10, type=int)
         current_user_id = get_current_user_id()
         
-        articles = supabase_client.get_all_articles(
-            page=page, 
-            per_page=per_page, 
-            current_user_id=current_user_id
+        return list_response(
+            'articles',
+            lambda: supabase_client.get_all_articles(page=page, per_page=per_page, current_user_id=current_user_id),
+            current_user_id,
+            cache_key=('all', page, per_page, current_user_id)
         )
-        return jsonify({'articles': articles}), 200
+    except UpstreamUnavailable as e:
+        return unavailable_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -146,9 +244,15 @@ def create_article(current_user_id):
         if not title or not content:
             return jsonify({'error': '标题和内容不能为空'}), 400
 
+        # 在生成图片之前检查是否与已有文章近似重复
+        reject, duplicate = near_duplicates.check(content, user_id=current_user_id)
+        if reject:
+            return jsonify({'error': '内容与已有文章高度重复', 'duplicate_of': duplicate}), 409
+
         # If no image is provided, generate one.
         if not preview_image_url:
             try:
+                from utils.ai_image_generator import ai_generator
                 temp_article_for_image = {
                     'id': 'temp', 'title': title, 'content': content, 'author': author, 'tags': tags
                 }
@@ -170,6 +274,8 @@ def create_article(current_user_id):
         if not article:
             return jsonify({'error': '文章创建失败'}), 500
         
+        if duplicate:
+            return jsonify({'article': article, 'duplicate_of': duplicate}), 201
         return jsonify({'article': article}), 201
 
     except Exception as e:
@@ -177,12 +283,41 @@ def create_article(current_user_id):
 
 @articles_bp.route('/articles/<article_id>', methods=['GET'])
 def get_article(article_id):
-    """获取单篇文章"""
+    """获取单篇文章（支持 ?include=likes,author_stats）"""
     try:
-        article = supabase_client.get_article_by_id(article_id)
+        article, extra, personalized = fetch_detail(article_id, get_current_user_id())
         if not article:
             return jsonify({'error': '文章不存在'}), 404
-        return jsonify({'article': article}), 200
+        extra.update(stale_marker())
+        return conditional_response(
+            article,
+            lambda: jsonify({'article': article, **extra}),
+            private='Authorization' in request.headers or personalized,
+            extra_stamp=extra_stamp(extra)
+        )
+    except UpstreamUnavailable as e:
+        return unavailable_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@articles_bp.route('/articles/<article_id>/related', methods=['GET'])
+def get_related_articles(article_id):
+    """相关诗词：优先读取预先计算的邻居列表，只需一次查询"""
+    try:
+        limit = min(max(request.args.get('limit', 6, type=int), 1), related_index.top_k)
+        neighbours = related_index.get(article_id)
+        if neighbours is None:
+            neighbours = supabase_client.get_related_articles(article_id)
+            if neighbours is not None:
+                related_index.remember(article_id, neighbours)
+            else:
+                neighbours = related_index.compute(article_id) or []
+
+        articles = supabase_client.get_articles_by_ids([related_id for related_id, _ in neighbours[:limit]])
+        articles = [article for article in articles if article.get('is_public_visible') is not False]
+        return conditional_response(articles, lambda: feed_response('articles', articles))
+    except UpstreamUnavailable as e:
+        return unavailable_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -226,11 +361,20 @@ def update_article(article_id, current_user_id):
         if not update_data:
             return jsonify({'message': 'No data provided to update'}), 200
 
+        duplicate = None
+        if update_data.get('content'):
+            reject, duplicate = near_duplicates.check(update_data['content'], exclude_id=article_id,
+                                                      user_id=current_user_id)
+            if reject:
+                return jsonify({'error': '内容与已有文章高度重复', 'duplicate_of': duplicate}), 409
+
         updated_article = supabase_client.update_article_fields(article_id, current_user_id, update_data)
         
         if not updated_article:
             return jsonify({'error': '文章更新失败'}), 500
 
+        if duplicate:
+            return jsonify({'article': updated_article, 'duplicate_of': duplicate}), 200
         return jsonify({'article': updated_article}), 200
 
     except Exception as e:
@@ -1,10 +1,8 @@
 from flask import Blueprint, request, jsonify, current_app, render_template
 from urllib.parse import quote
 from models.supabase_client import supabase_client
-import bcrypt
 import jwt
 from datetime import datetime, timedelta
-from utils.mail import send_email
 from builtins import str, getattr, Exception
 
 auth_bp = Blueprint('auth', __name__)
@@ -69,17 +67,21 @@ def login():
         if not email or not password:
             return jsonify({'error': '邮箱和密码不能为空'}), 400
 
-        # 用Supabase Auth校验邮箱和密码
-        auth_result = supabase_client.supabase.auth.sign_in_with_password({
-            "email": email,
-            "password": password
-        })
+        # 用Supabase Auth校验邮箱和密码，同时从自建users表按邮箱查更多信息
+        auth_result, user_info = supabase_client.fan_out(
+            lambda: supabase_client.supabase.auth.sign_in_with_password({
+                "email": email,
+                "password": password
+            }),
+            lambda: supabase_client.get_user_by_email(email)
+        )
         if not auth_result or not getattr(auth_result, 'user', None):
             return jsonify({'error': '邮箱或密码错误'}), 401
         user_id = auth_result.user.id
         user_email = auth_result.user.email
-        # 从自建users表查更多信息
-        user_info = supabase_client.get_user_by_id(user_id)
+        if user_info and user_info.get('id') != user_id:
+            # 邮箱对应的记录与认证用户不一致时以认证返回的ID为准
+            user_info = supabase_client.get_user_by_id(user_id)
         # 生成token
         token = generate_token(user_id)
         return jsonify({
@@ -131,74 +133,10 @@ def forgot_password():
         # 发送重置邮件 - 使用Universal Links格式，对token进行URL编码
         encoded_token = quote(reset_token, safe='')
         reset_url = f"{base_url}/reset-password?token={encoded_token}"
-        subject = "诗篇 - 密码重置"
         
-        # HTML邮件模板
-        html_body = f"""
-        <!DOCTYPE html>
-        <html>
-        <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-            <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 40px; text-align: center; color: white; border-radius: 10px 10px 0 0;">
-                <h1 style="margin: 0; font-size: 28px;">📝 诗篇</h1>
-                <h2 style="margin: 10px 0 0; font-weight: normal;">重置密码</h2>
-            </div>
-            
-            <div style="padding: 40px 20px; border: 1px solid #e1e5e9; border-top: none; border-radius: 0 0 10px 10px;">
-                <p>您好，</p>
-                <p>我们收到了您的密码重置请求。点击下面的按钮重置您的密码：</p>
-                
-                <div style="text-align: center; margin: 30px 0;">
-                    <a href="{reset_url}" 
-                       style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
-                              color: white; 
-                              padding: 15px 30px; 
-                              text-decoration: none; 
-                              border-radius: 25px; 
-                              font-weight: bold; 
-                              font-size: 16px;
-                              display: inline-block;">
-                        🔑 重置密码
-                    </a>
-                </div>
-                
-                <p style="font-size: 14px; color: #666;">如果按钮无法点击，请复制以下链接到浏览器：<br>
-                <code style="background: #f8f9fa; padding: 5px; border-radius: 3px; font-size: 12px; word-break: break-all;">{reset_url}</code></p>
-                
-                <p style="font-size: 12px; color: #999; margin-top: 20px;">此链接将在1小时后失效。如果您没有申请密码重置，请忽略此邮件。</p>
-                
-                <hr style="border: none; border-top: 1px solid #eee; margin: 30px 0;">
-                
-                <div style="text-align: center;">
-                    <p style="font-size: 12px; color: #666;">下载诗篇应用获得更好体验：</p>
-                    <a href="https://apps.apple.com/app/poemverse" style="margin: 0 10px; color: #667eea; font-size: 12px;">App Store</a>
-                    <a href="https://play.google.com/store/apps/details?id=com.owensha.poemverse" style="margin: 0 10px; color: #667eea; font-size: 12px;">Google Play</a>
-                </div>
-            </div>
-            
-            <div style="text-align: center; padding: 20px; font-size: 11px; color: #999;">
-                © 2024 诗篇 PoemVerse. All rights reserved.
-            </div>
-        </body>
-        </html>
-        """
-        
-        # 纯文本备用版本
-        text_body = f"""
-        您好，
-
-        您请求重置密码。请访问以下链接重置密码：
-
-        {reset_url}
-
-        此链接将在1小时后失效。
-
-        如果这不是您的操作，请忽略此邮件。
-
-        诗篇团队
-        """
-
-        # 发送HTML邮件
-        send_email(email, subject, text_body, html_body)
+        # 预编译模板只替换重置链接，邮件写入发件箱后由后台线程投递（邮件模块首次使用时才导入）
+        from utils.mail import send_password_reset_email
+        send_password_reset_email(email, reset_url)
 
         return jsonify({'message': '重置密码邮件已发送'}), 200
 
@@ -1,5 +1,4 @@
 from flask import Blueprint, jsonify, request
-from utils.cloudflare_client import cloudflare_client
 import re
 
 cloudflare_bp = Blueprint('cloudflare', __name__)
@@ -7,6 +6,7 @@ cloudflare_bp = Blueprint('cloudflare', __name__)
 @cloudflare_bp.route('/api/cloudflare/status', methods=['GET'])
 def cloudflare_status():
     """检查 Cloudflare Images 状态"""
+    from utils.cloudflare_client import cloudflare_client
     try:
         is_available = cloudflare_client.is_available()
         return jsonify({
@@ -23,6 +23,7 @@ def cloudflare_status():
 @cloudflare_bp.route('/api/cloudflare/list', methods=['GET'])
 def cloudflare_list():
     """列出 Cloudflare Images 中的文件"""
+    from utils.cloudflare_client import cloudflare_client
     try:
         if not cloudflare_client.is_available():
             return jsonify({'error': 'Cloudflare Images 不可用'}), 500
@@ -40,6 +41,7 @@ def cloudflare_list():
 @cloudflare_bp.route('/api/cloudflare/upload', methods=['POST'])
 def cloudflare_upload():
     """测试 Cloudflare Images 上传"""
+    from utils.cloudflare_client import cloudflare_client
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'No file part'}), 400
@@ -1,6 +1,5 @@
 from flask import Blueprint, request, jsonify, current_app
 from models.supabase_client import supabase_client
-from utils.ai_image_generator import ai_generator
 import jwt
 from functools import wraps
 import uuid
@@ -58,7 +57,8 @@ def generate_image(current_user_id):
         if article['user_id'] != current_user_id:
             return jsonify({'error': '无权限生成此文章的图片'}), 403
         
-        # 生成AI图片
+        # 生成AI图片（生成器依赖较重，首次使用时才导入）
+        from utils.ai_image_generator import ai_generator
         image_url = ai_generator.generate_poem_image(article)
         
         if not image_url:
@@ -106,6 +106,7 @@ def generate_preview(current_user_id):
         }
         
         # 使用AI图片生成预览
+        from utils.ai_image_generator import ai_generator
         image_url = ai_generator.generate_poem_image(temp_article)
         
         if not image_url:
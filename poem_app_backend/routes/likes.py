@@ -1,5 +1,10 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app
 from models.supabase_client import supabase_client
+from utils.abuse_guard import like_guard
+from utils.http_cache import conditional_response
+from utils.live_likes import like_stream, cooperative_worker
+from utils.resilience import UpstreamUnavailable, stale_marker, unavailable_response
+import json
 import jwt
 from functools import wraps
 
@@ -32,11 +37,8 @@ def get_client_info():
     data = request.get_json() or {}
     device_id = data.get('device_id') or request.headers.get('X-Device-ID')
     
-    # 获取IP地址，处理代理转发的多个IP情况
-    ip_address = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR'))
-    if ip_address and ',' in ip_address:
-        # 如果有多个IP，取第一个（客户端真实IP）
-        ip_address = ip_address.split(',')[0].strip()
+    # 客户端IP：ProxyFix 已按可信代理层数从 X-Forwarded-For 中取出，客户端无法自行指定
+    ip_address = request.remote_addr
     
     return device_id, ip_address
 
@@ -62,6 +64,13 @@ def toggle_article_like(article_id):
                 'error': '需要提供用户身份信息（登录或设备ID）'
             }), 400
         
+        # 刷量防护：超过频率阈值的请求不访问数据库
+        rejected = like_guard.check(article_id, ip_address, user_id)
+        if rejected:
+            response = jsonify({'error': '操作过于频繁，请稍后再试'})
+            response.headers['Retry-After'] = str(max(int(rejected[1]), 1))
+            return response, 429
+        
         # 执行点赞切换
         result = supabase_client.toggle_article_like(
             article_id=article_id,
@@ -96,11 +105,18 @@ def get_article_likes(article_id):
             user_id=user_id,
             device_id=device_id
         )
+        result = {**result, **stale_marker()}
         
-        return jsonify(result), 200
+        return conditional_response(
+            result,
+            lambda: jsonify(result),
+            private=bool(user_id or device_id)
+        )
         
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
+    except UpstreamUnavailable as e:
+        return unavailable_response(e)
     except Exception as e:
         return jsonify({'error': f'获取点赞信息失败: {str(e)}'}), 500
 
@@ -137,37 +153,126 @@ def get_batch_article_likes():
         
         return jsonify(result), 200
         
+    except UpstreamUnavailable as e:
+        return unavailable_response(e)
     except Exception as e:
         return jsonify({'error': f'批量获取点赞信息失败: {str(e)}'}), 500
 
-# 统计相关接口（可选）
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+@likes_bp.route('/articles/stream', methods=['GET'])
+def stream_article_likes():
+    """
+    实时推送文章点赞数（Server-Sent Events）
+    
+    Query Parameters:
+    - ids: 逗号分隔的文章ID，最多 100 个
+    
+    连接建立后先推送一次当前计数，之后每篇文章每个合并周期最多推送一次 likes 事件；
+    客户端读取过慢导致事件被丢弃时推送 overflow 事件，客户端应调用批量接口重新拉取。
+    同步 worker 下返回 204，客户端按 X-Poll-Interval 秒轮询批量接口。
+    """
+    article_ids = list(dict.fromkeys(i.strip() for i in request.args.get('ids', '').split(',') if i.strip()))
+    if not article_ids:
+        return jsonify({'error': '缺少ids参数'}), 400
+    if len(article_ids) > 100:
+        return jsonify({'error': '一次最多订阅100篇文章'}), 400
+
+    # 同步 worker 下一个长连接会占住整个 worker，不建立连接，改为提示客户端轮询
+    if not cooperative_worker():
+        return Response(status=204, headers={
+            'X-Poll-Interval': str(like_stream.poll_seconds),
+            'Cache-Control': 'no-store'
+        })
+
+    subscription = like_stream.subscribe(article_ids)
+    if subscription is None:
+        response = jsonify({'error': '实时连接数已满，请稍后重试'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+
+    try:
+        initial = [{'id': article['id'], 'like_count': article.get('like_count') or 0}
+                   for article in supabase_client.get_articles_by_ids(article_ids)]
+    except Exception:
+        # 当前计数拿不到时只推送后续变化
+        initial = []
+
+    keepalive = like_stream.keepalive_seconds
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            for event in initial:
+                yield sse_event('likes', event)
+            while True:
+                events, dropped = subscription.next_batch(keepalive)
+                if dropped:
+                    yield sse_event('overflow', {'dropped': dropped})
+                for event in events:
+                    yield sse_event('likes', event)
+                if not events and not dropped:
+                    yield ': keepalive\n\n'
+        finally:
+            like_stream.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# 统计相关接口
 @likes_bp.route('/articles/<article_id>/likes/stats', methods=['GET'])
 def get_article_like_stats(article_id):
-    """获取文章点赞统计详情"""
+    """
+    获取文章点赞统计详情（趋势、最近点赞的用户、作者获赞总数均来自预聚合表）
+    
+    Query Parameters:
+    - granularity: day（默认）| hour
+    - periods: 趋势的桶数，按天默认 30（最多 365），按小时默认 48（最多为小时桶的保留时长）
+    - device_id: 设备ID（匿名用户）
+    """
     try:
         # 基本点赞信息
         user_id = get_user_from_token()
         device_id = request.args.get('device_id')
         
-        like_info = supabase_client.get_article_like_info(
-            article_id=article_id,
-            user_id=user_id,
-            device_id=device_id
-        )
+        granularity = request.args.get('granularity', 'day')
+        if granularity not in ('day', 'hour'):
+            return jsonify({'error': 'granularity 只能是 day 或 hour'}), 400
+        if granularity == 'hour':
+            default_periods, max_periods = 48, current_app.config['LIKE_STATS_HOURLY_RETENTION_DAYS'] * 24
+        else:
+            default_periods, max_periods = 30, 365
+        periods = min(max(request.args.get('periods', default_periods, type=int), 1), max_periods)
         
-        # 可以扩展更多统计信息
-        # 比如：最近点赞的用户、点赞趋势等
+        like_info, stats = supabase_client.fan_out(
+            lambda: supabase_client.get_article_like_info(
+                article_id=article_id,
+                user_id=user_id,
+                device_id=device_id
+            ),
+            lambda: supabase_client.get_like_stats(article_id, granularity=granularity, periods=periods)
+        )
         
-        return jsonify({
+        result = {
             **like_info,
             'stats': {
                 'total_likes': like_info['like_count'],
-                # 'recent_likes': recent_likes,  # 可选扩展
-                # 'like_trend': like_trend      # 可选扩展
-            }
-        }), 200
+                **stats
+            },
+            **stale_marker()
+        }
+        return conditional_response(
+            result,
+            lambda: jsonify(result),
+            private=bool(user_id or device_id)
+        )
         
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
+    except UpstreamUnavailable as e:
+        return unavailable_response(e)
     except Exception as e:
-        return jsonify({'error': f'获取点赞统计失败: {str(e)}'}), 500
\ No newline at end of file
+        return jsonify({'error': f'获取点赞统计失败: {str(e)}'}), 500
@@ -0,0 +1,115 @@
+"""
+客户端增量同步
+
+GET /api/sync?since=<watermark> 只返回水位之后新建、修改、删除（墓碑）或改变可见性的文章，以及变化的点赞数。
+客户端保存响应中的 watermark，下次同步时原样带回；has_more 为 true 时立即用新水位继续拉取。
+
+水位语义：
+- 完整响应的水位是本次请求开始时间减去 SYNC_OVERLAP_SECONDS，下次同步会重复读到这几秒内的变更，
+  用于容忍应用服务器与数据库之间的时钟偏差以及请求期间提交的事务（重复的 upsert 对客户端无害）；
+- 任一列表被截断时，水位是各截断列表最后一行时间中的最小值，保证不会跳过未返回的行；
+  整页都是同一时间戳（批量更新同一事务内的 NOW()）时，补读该时间戳的全部行后从下一微秒继续，保证翻页前进；
+- 没有 since、无法解析，或早于墓碑保留期（SYNC_TOMBSTONE_RETENTION_DAYS）时返回 reset=true，
+  客户端应清空本地缓存后按全量结果重建。
+"""
+
+import time
+
+from flask import Blueprint, current_app, jsonify, request
+
+from models.supabase_client import supabase_client
+from routes.articles import get_current_user_id
+from utils.json_provider import feed_response
+from utils.resilience import UpstreamUnavailable, unavailable_response
+from utils.timestamps import from_epoch_micros, to_epoch_micros
+
+sync_bp = Blueprint('sync', __name__)
+
+
+@sync_bp.route('/sync', methods=['GET'])
+def sync_articles():
+    """
+    增量同步文章
+
+    参数:
+        since: 上次响应中的 watermark；省略时全量同步
+        scope: public（默认，公开文章）或 mine（当前用户的全部文章，需要登录）
+        limit: 每个变更列表的最大条数，默认 SYNC_PAGE_SIZE，最多 1000
+    """
+    try:
+        config = current_app.config
+        started = int(time.time() * 1_000_000)
+
+        scope = request.args.get('scope', 'public')
+        if scope not in ('public', 'mine'):
+            return jsonify({'error': 'scope 只能是 public 或 mine'}), 400
+        user_id = None
+        if scope == 'mine':
+            user_id = get_current_user_id()
+            if not user_id:
+                return jsonify({'error': '同步个人文章需要登录'}), 401
+        limit = min(max(request.args.get('limit', config['SYNC_PAGE_SIZE'], type=int), 1), 1000)
+
+        since = request.args.get('since')
+        since_micros = to_epoch_micros(since) if since else None
+        if since and since_micros is None:
+            return jsonify({'error': '无效的同步水位'}), 400
+        retention = config['SYNC_TOMBSTONE_RETENTION_DAYS'] * 86400 * 1_000_000
+        reset = since_micros is None or since_micros < started - retention
+
+        public_only = scope == 'public'
+        if reset:
+            # 全量同步：客户端清空本地缓存，不需要墓碑与点赞变化（文章自带 like_count）
+            (changed, next_changed), = supabase_client.fan_out(
+                lambda: supabase_client.fetch_changes(
+                    lambda at, n, exact=False: supabase_client.get_articles_changed_since(
+                        at, n, user_id, public_only=public_only, exact=exact),
+                    'updated_at', 0, limit)
+            )
+            tombstones, next_tombstones, likes, next_likes = [], None, [], None
+        else:
+            (changed, next_changed), (tombstones, next_tombstones), (likes, next_likes) = supabase_client.fan_out(
+                lambda: supabase_client.fetch_changes(
+                    lambda at, n, exact=False: supabase_client.get_articles_changed_since(at, n, user_id, exact=exact),
+                    'updated_at', since_micros, limit),
+                lambda: supabase_client.fetch_changes(
+                    lambda at, n, exact=False: supabase_client.get_tombstones_since(at, n, user_id, exact=exact),
+                    'deleted_at', since_micros, limit),
+                lambda: supabase_client.fetch_changes(
+                    lambda at, n, exact=False: supabase_client.get_like_counts_since(at, n, user_id, exact=exact),
+                    'like_count_updated_at', since_micros, limit)
+            )
+
+        upserted, removed = [], []
+        for article in changed:
+            if public_only and not article.get('is_public_visible'):
+                removed.append({'id': article['id'], 'reason': 'hidden'})
+            else:
+                upserted.append(article)
+        for tombstone in tombstones:
+            # 删除前就不公开的文章不在公开客户端的缓存里
+            if not public_only or tombstone.get('was_public') is not False:
+                removed.append({'id': tombstone['article_id'], 'reason': 'deleted'})
+        upserted_ids = {article['id'] for article in upserted}
+        like_counts = [
+            {'id': row['id'], 'like_count': row.get('like_count') or 0}
+            for row in likes
+            if row['id'] not in upserted_ids and (not public_only or row.get('is_public_visible'))
+        ]
+
+        cursors = [cursor for cursor in (next_changed, next_tombstones, next_likes) if cursor is not None]
+        watermark = min(cursors) if cursors else started - int(config['SYNC_OVERLAP_SECONDS'] * 1_000_000)
+
+        response = feed_response('articles', upserted, {
+            'removed': removed,
+            'likes': like_counts,
+            'watermark': from_epoch_micros(watermark),
+            'has_more': bool(cursors),
+            'reset': reset
+        })
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    except UpstreamUnavailable as e:
+        return unavailable_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
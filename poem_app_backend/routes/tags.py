@@ -0,0 +1,128 @@
+import uuid
+from datetime import datetime, timezone
+
+from flask import Blueprint, request, jsonify
+from models.supabase_client import supabase_client
+from utils.json_provider import feed_response
+from utils.http_cache import conditional_response
+from utils.resilience import UpstreamUnavailable, unavailable_response
+from utils.tag_index import tag_index, normalize_tag
+from utils.timestamps import to_epoch_micros, from_epoch_micros
+from routes.articles import get_current_user_id
+
+tags_bp = Blueprint('tags', __name__)
+
+def encode_cursor(created_at_micros, article_id):
+    """分页游标：<created_at 微秒>.<文章ID>"""
+    return f'{created_at_micros}.{article_id}'
+
+# 游标中的时间范围：1970-01-01 至 9999-12-31（超出时 from_epoch_micros 会溢出）
+MAX_CURSOR_MICROS = int((datetime(9999, 12, 31, tzinfo=timezone.utc)
+                         - datetime(1970, 1, 1, tzinfo=timezone.utc)).total_seconds()) * 1_000_000
+
+def decode_cursor(cursor):
+    """
+    解析分页游标，格式错误时抛出 ValueError。
+    文章ID必须是 UUID（规范化为小写标准格式），数据库降级查询会把它拼进 PostgREST 过滤条件，
+    不能让游标带入其他过滤语法。
+    """
+    micros, _, article_id = cursor.partition('.')
+    if not article_id or not micros.isdigit():
+        raise ValueError('无效的分页游标')
+    micros = int(micros)
+    if micros > MAX_CURSOR_MICROS:
+        raise ValueError('无效的分页游标')
+    return micros, str(uuid.UUID(article_id))
+
+def get_limit(default, maximum):
+    return min(max(request.args.get('limit', default, type=int), 1), maximum)
+
+def visible_page(tag, limit, before, current_user_id):
+    """
+    从标签索引取一页文章并按可见性过滤
+
+    索引只收到本 worker 的文章事件，其他 worker 上设为私密的文章可能仍在索引中，
+    因此按数据库中的 is_public_visible 再过滤一次（作者本人仍可看到自己的文章），
+    被过滤掉的位置从索引中继续补齐，保证每页数量与下一页游标正确。
+    """
+    articles, key = [], before
+    while True:
+        article_ids, next_key = tag_index.page(tag, limit=limit - len(articles), before=key)
+        articles.extend(
+            article for article in supabase_client.get_articles_by_ids(article_ids)
+            if article.get('is_public_visible') is not False
+            or (current_user_id and article.get('user_id') == current_user_id)
+        )
+        if len(articles) >= limit or next_key is None:
+            return articles, next_key
+        key = next_key
+
+@tags_bp.route('/tags/<tag>/articles', methods=['GET'])
+def get_tag_articles(tag):
+    """按标签浏览公开文章，按创建时间倒序，使用 cursor 参数翻页"""
+    try:
+        tag = normalize_tag(tag)
+        limit = get_limit(20, 50)
+        cursor = request.args.get('cursor')
+        try:
+            before = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            return jsonify({'error': '无效的分页游标'}), 400
+
+        private = False
+        if tag_index.ready:
+            current_user_id = get_current_user_id()
+            articles, next_key = visible_page(tag, limit, before, current_user_id)
+            private = any(article.get('is_public_visible') is False for article in articles)
+            next_cursor = encode_cursor(*next_key) if next_key else None
+            total = tag_index.count(tag)
+        else:
+            db_before = (from_epoch_micros(before[0]), before[1]) if before else None
+            articles = supabase_client.get_tag_articles(tag, limit=limit, before=db_before)
+            last = articles[-1] if len(articles) == limit else None
+            next_cursor = encode_cursor(to_epoch_micros(last.get('created_at')) or 0, last['id']) if last else None
+            total = None
+
+        return conditional_response(
+            articles,
+            lambda: feed_response('articles', articles, {'tag': tag, 'next_cursor': next_cursor, 'total': total}),
+            private=private,
+            extra_stamp=next_cursor
+        )
+    except UpstreamUnavailable as e:
+        return unavailable_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@tags_bp.route('/tags/popular', methods=['GET'])
+def get_popular_tags():
+    """热门标签（按公开文章数排序）"""
+    try:
+        limit = get_limit(20, 100)
+        if tag_index.ready:
+            tags = [{'tag': tag, 'article_count': count} for tag, count in tag_index.popular(limit)]
+        else:
+            tags = supabase_client.get_popular_tags(limit)
+        return conditional_response(tags, lambda: jsonify({'tags': tags}))
+    except UpstreamUnavailable as e:
+        return unavailable_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@tags_bp.route('/tags/autocomplete', methods=['GET'])
+def autocomplete_tags():
+    """标签前缀补全：/api/tags/autocomplete?prefix=春"""
+    try:
+        prefix = normalize_tag(request.args.get('prefix') or request.args.get('q'))
+        if not prefix:
+            return jsonify({'tags': []}), 200
+        limit = get_limit(10, 50)
+        if tag_index.ready:
+            tags = [{'tag': tag, 'article_count': count} for tag, count in tag_index.autocomplete(prefix, limit)]
+        else:
+            tags = supabase_client.autocomplete_tags(prefix, limit)
+        return conditional_response(tags, lambda: jsonify({'tags': tags}))
+    except UpstreamUnavailable as e:
+        return unavailable_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,6 +1,5 @@
 from flask import Blueprint, request, jsonify
 from models.supabase_client import supabase_client
-from utils.cloudflare_client import cloudflare_client  # 导入 Cloudflare 客户端
 import os # 导入 os 模块
 import re
 
@@ -20,6 +19,9 @@ def upload_image():
     
     file_data = file.read()
     
+    # Cloudflare 客户端首次上传时才导入
+    from utils.cloudflare_client import cloudflare_client
+
     # 优先使用 Cloudflare Images
     if cloudflare_client.is_available():
         content_type = file.content_type or 'application/octet-stream'
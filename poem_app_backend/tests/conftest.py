@@ -0,0 +1,8 @@
+import os
+import sys
+
+# 本地 aiosmtpd 测试服务不支持 STARTTLS
+os.environ['EMAIL_USE_TLS'] = 'false'
+
+# 测试以后端目录为根导入 utils、models 等模块（与 gunicorn 启动时相同）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
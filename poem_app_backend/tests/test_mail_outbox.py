@@ -0,0 +1,310 @@
+"""
+邮件发件箱测试：本地 aiosmtpd SMTP 服务代替真实邮件服务器
+
+覆盖入队到投递、4xx 临时错误的退避重试、5xx 永久失败、多进程只有一个发送者、租约领取、优先级与发送速率限制。
+"""
+
+import multiprocessing
+import socket
+import sqlite3
+import time
+from collections import deque
+
+import pytest
+from flask import Flask
+
+pytest.importorskip('aiosmtpd')
+from aiosmtpd.controller import Controller
+
+from config import Config
+from utils.mail_outbox import MailOutbox
+
+SENDER = 'noreply@poemverse.test'
+
+
+def make_message(to_addr: str) -> bytes:
+    return f'From: {SENDER}\r\nTo: {to_addr}\r\nSubject: test\r\n\r\nhello\r\n'.encode('utf-8')
+
+
+class StubHandler:
+    """记录收到的邮件；replies 中排队的响应依次代替 250 返回给 DATA 命令"""
+
+    def __init__(self):
+        self.messages = []
+        self.received_at = []
+        self.replies = deque()
+        self.on_message = None
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.replies:
+            return self.replies.popleft()
+        self.messages.append(envelope)
+        self.received_at.append(time.monotonic())
+        if self.on_message is not None:
+            self.on_message(envelope)
+        return '250 Message accepted for delivery'
+
+    def recipients(self):
+        return [envelope.rcpt_tos[0] for envelope in self.messages]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_stub():
+    handler = StubHandler()
+    controller = Controller(handler, hostname='127.0.0.1', port=free_port())
+    controller.start()
+    handler.port = controller.port
+    yield handler
+    controller.stop()
+
+
+def make_outbox(path, port, **config) -> MailOutbox:
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.update({
+        'MAIL_OUTBOX_PATH': str(path), 'EMAIL_SERVER': '127.0.0.1', 'EMAIL_PORT': port,
+        'EMAIL_USERNAME': SENDER, 'EMAIL_PASSWORD': None, 'MAIL_SEND_RATE_PER_MINUTE': 0,
+        'MAIL_RETRY_BASE_SECONDS': 30, 'MAIL_MAX_ATTEMPTS': 3, **config
+    })
+    outbox = MailOutbox()
+    outbox.init_app(app)
+    return outbox
+
+
+@pytest.fixture
+def outbox(tmp_path, smtp_stub):
+    """不启动后台线程的发件箱，测试中直接调用 _drain()"""
+    box = make_outbox(tmp_path / 'outbox.sqlite3', smtp_stub.port)
+    box.ensure_sender = lambda: None
+    yield box
+    box._close_smtp()
+
+
+def rows(box: MailOutbox):
+    conn = sqlite3.connect(box.path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return [dict(row) for row in conn.execute('SELECT * FROM mail_outbox ORDER BY id')]
+    finally:
+        conn.close()
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+def test_enqueue_is_delivered_by_background_sender(tmp_path, smtp_stub):
+    box = make_outbox(tmp_path / 'outbox.sqlite3', smtp_stub.port)
+    try:
+        box.enqueue('reader@example.com', make_message('reader@example.com'))
+        assert wait_until(lambda: smtp_stub.messages)
+        assert wait_until(lambda: not rows(box))
+        envelope = smtp_stub.messages[0]
+        assert envelope.mail_from == SENDER
+        assert envelope.rcpt_tos == ['reader@example.com']
+        assert b'Subject: test' in envelope.content
+    finally:
+        box._close_smtp()
+
+
+def test_smtp_connection_is_reused_across_messages(outbox, smtp_stub):
+    outbox.enqueue_many((f'user{i}@example.com', make_message(f'user{i}@example.com')) for i in range(3))
+    outbox._drain()
+    assert len(smtp_stub.messages) == 3
+    assert len({envelope.mail_from for envelope in smtp_stub.messages}) == 1
+    assert outbox._smtp is not None
+
+
+def test_temporary_failure_is_retried_with_backoff(outbox, smtp_stub):
+    smtp_stub.replies.append('451 4.3.0 Try again later')
+    outbox.enqueue('reader@example.com', make_message('reader@example.com'))
+
+    before = time.time()
+    outbox._drain()
+    (row,) = rows(outbox)
+    assert smtp_stub.messages == []
+    assert row['status'] == 'pending'
+    assert row['attempts'] == 1
+    assert '451' in row['last_error']
+    # 第一次重试等待 MAIL_RETRY_BASE_SECONDS（±20% 抖动）
+    assert before + 30 * 0.8 - 1 <= row['next_attempt_at'] <= time.time() + 30 * 1.2
+
+    # 未到重试时间不会再次发送
+    outbox._drain()
+    assert smtp_stub.messages == []
+
+    conn = sqlite3.connect(outbox.path)
+    conn.execute('UPDATE mail_outbox SET next_attempt_at = 0')
+    conn.commit()
+    conn.close()
+    outbox._drain()
+    assert smtp_stub.recipients() == ['reader@example.com']
+    assert rows(outbox) == []
+
+
+def test_backoff_doubles_and_gives_up_after_max_attempts(outbox, smtp_stub):
+    smtp_stub.replies.extend(['451 4.3.0 Try again later'] * 3)
+    outbox.enqueue('reader@example.com', make_message('reader@example.com'))
+    delays = []
+    for _ in range(3):
+        conn = sqlite3.connect(outbox.path)
+        conn.execute('UPDATE mail_outbox SET next_attempt_at = 0')
+        conn.commit()
+        conn.close()
+        started = time.time()
+        outbox._drain()
+        delays.append(rows(outbox)[0]['next_attempt_at'] - started)
+
+    (row,) = rows(outbox)
+    assert row['status'] == 'failed'
+    assert row['attempts'] == 3
+    assert 30 * 0.8 - 1 <= delays[0] <= 30 * 1.2
+    assert 60 * 0.8 - 1 <= delays[1] <= 60 * 1.2
+
+
+def test_permanent_failure_is_not_retried(outbox, smtp_stub):
+    smtp_stub.replies.append('550 5.1.1 Mailbox unavailable')
+    outbox.enqueue('missing@example.com', make_message('missing@example.com'))
+    outbox._drain()
+    (row,) = rows(outbox)
+    assert row['status'] == 'failed'
+    assert row['attempts'] == 1
+    assert '550' in row['last_error']
+
+
+def _try_leadership(path, port, results):
+    box = make_outbox(path, port)
+    results.put(box._acquire_leadership())
+
+
+def test_only_one_process_sends(outbox, smtp_stub):
+    assert outbox._acquire_leadership()
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    process = context.Process(target=_try_leadership, args=(outbox.path, smtp_stub.port, results))
+    process.start()
+    process.join(10)
+    assert results.get(timeout=1) is False
+
+
+def test_claimed_messages_are_leased_until_expiry(tmp_path, outbox, smtp_stub):
+    other = make_outbox(outbox.path, smtp_stub.port)
+    other.ensure_sender = lambda: None
+    outbox.enqueue('reader@example.com', make_message('reader@example.com'))
+
+    conn = outbox._connect()
+    try:
+        claimed = outbox._claim_batch(conn)
+    finally:
+        conn.close()
+    assert [row[1] for row in claimed] == ['reader@example.com']
+
+    # 另一个进程在租约期内领取不到正在发送的邮件
+    other._drain()
+    assert smtp_stub.messages == []
+
+    # 第一个发送者崩溃、租约过期后由其他进程接管，只投递一次
+    conn = sqlite3.connect(outbox.path)
+    conn.execute('UPDATE mail_outbox SET locked_until = ?', (time.time() - 1,))
+    conn.commit()
+    conn.close()
+    other._drain()
+    other._close_smtp()
+    assert smtp_stub.recipients() == ['reader@example.com']
+    assert rows(outbox) == []
+
+
+def test_send_rate_is_limited(outbox, smtp_stub):
+    outbox.rate_per_minute = 600   # 每 0.1 秒一封
+    outbox.enqueue_many((f'user{i}@example.com', make_message(f'user{i}@example.com')) for i in range(5))
+    outbox._drain()
+    times = smtp_stub.received_at
+    assert len(times) == 5
+    gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+    assert min(gaps) >= 0.08
+    assert times[-1] - times[0] >= 0.38
+
+
+def test_transactional_mail_jumps_ahead_of_bulk(outbox, smtp_stub):
+    outbox.enqueue_many((f'fan{i}@example.com', make_message(f'fan{i}@example.com')) for i in range(10))
+
+    def reset_arrives(envelope):
+        if envelope.rcpt_tos == ['fan1@example.com']:
+            outbox.enqueue('reset@example.com', make_message('reset@example.com'))
+
+    smtp_stub.on_message = reset_arrives
+    outbox._drain()
+    recipients = smtp_stub.recipients()
+    assert len(recipients) == 11
+    # 公告发送到一半时入队的重置密码邮件紧接着发出
+    assert recipients.index('reset@example.com') == 2
+    assert rows(outbox) == []
+
+
+def test_refuses_to_log_in_without_starttls(tmp_path, smtp_stub):
+    # 服务器没有声明 STARTTLS（例如被中间人去掉）时不登录、不发送
+    box = make_outbox(tmp_path / 'outbox.sqlite3', smtp_stub.port, EMAIL_USE_TLS=True, EMAIL_PASSWORD='secret')
+    box.ensure_sender = lambda: None
+    box.enqueue('reader@example.com', make_message('reader@example.com'))
+    box._drain()
+    (row,) = rows(box)
+    assert smtp_stub.messages == []
+    assert row['status'] == 'pending'
+    assert 'STARTTLS' in row['last_error']
+
+
+def test_quota_error_pauses_queue_without_failing_messages(outbox, smtp_stub):
+    # Gmail 发送额度用尽：550 5.4.5，所有积压邮件保留，整个队列暂停
+    smtp_stub.replies.append('550 5.4.5 Daily user sending limit exceeded')
+    for i in range(3):
+        outbox.enqueue(f'user{i}@example.com', make_message(f'user{i}@example.com'))
+    before = time.time()
+    outbox._drain()
+
+    assert smtp_stub.messages == []
+    assert [(row['status'], row['attempts']) for row in rows(outbox)] == [('pending', 0)] * 3
+    assert outbox.paused_until >= before + 30 * 0.99
+    assert '5.4.5' in outbox.pause_reason
+
+    # 暂停期间不发送；暂停结束后全部发出，退避复位
+    outbox._drain()
+    assert smtp_stub.messages == []
+    outbox.paused_until = 0
+    outbox._drain()
+    assert len(smtp_stub.messages) == 3
+    assert outbox._pauses == 0
+
+
+def test_repeated_service_errors_double_the_pause(outbox, smtp_stub):
+    smtp_stub.replies.extend(['530 5.7.0 Authentication Required'] * 2)
+    outbox.enqueue('reader@example.com', make_message('reader@example.com'))
+    pauses = []
+    for _ in range(2):
+        outbox.paused_until = 0
+        started = time.time()
+        outbox._drain()
+        pauses.append(outbox.paused_until - started)
+    assert 29 <= pauses[0] <= 31
+    assert 59 <= pauses[1] <= 61
+    assert rows(outbox)[0]['attempts'] == 0
+
+
+def test_other_5xx_errors_are_retried_per_message(outbox, smtp_stub):
+    smtp_stub.replies.append('552 5.2.2 Mailbox full')
+    outbox.enqueue('full@example.com', make_message('full@example.com'))
+    outbox._drain()
+    (row,) = rows(outbox)
+    assert row['status'] == 'pending'
+    assert row['attempts'] == 1
+    assert outbox.paused_until == 0
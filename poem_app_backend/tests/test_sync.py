@@ -0,0 +1,230 @@
+"""
+增量同步测试：内存中的假 Supabase 客户端代替 PostgREST
+
+覆盖 fetch_changes 的截断与同一时间戳整页、/api/sync 多个列表同时截断时的水位与翻页、全量同步（reset）路径。
+"""
+
+import uuid
+
+import pytest
+from flask import Flask
+
+from config import Config
+from models.supabase_client import supabase_client
+from routes.sync import sync_bp
+from utils.timestamps import from_epoch_micros, to_epoch_micros
+
+# 2026-01-01T00:00:00Z 之后的秒数 -> 微秒时间戳
+BASE = 1767225600 * 1_000_000
+
+
+def at(seconds: float) -> int:
+    return BASE + int(seconds * 1_000_000)
+
+
+def stamp(seconds: float) -> str:
+    return from_epoch_micros(at(seconds))
+
+
+class FakeQuery:
+    """支持 _changed_since 用到的 select / eq / gte / order / limit / execute"""
+
+    def __init__(self, rows, log):
+        self.rows = list(rows)
+        self.log = log
+        self.limit_count = None
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        if column.endswith('_at'):
+            self.rows = [row for row in self.rows if to_epoch_micros(row.get(column)) == to_epoch_micros(value)]
+        else:
+            self.rows = [row for row in self.rows if row.get(column) == value]
+        return self
+
+    def gte(self, column, value):
+        since = to_epoch_micros(value)
+        self.rows = [row for row in self.rows if (to_epoch_micros(row.get(column)) or 0) >= since]
+        return self
+
+    def order(self, column):
+        # 同一时间戳的行保持插入顺序；数据库不保证这一点，断言里同一时间戳的行只按集合比较
+        self.rows.sort(key=lambda row: to_epoch_micros(row.get(column)) or 0)
+        return self
+
+    def limit(self, count):
+        self.limit_count = count
+        return self
+
+    def execute(self):
+        rows = self.rows if self.limit_count is None else self.rows[:self.limit_count]
+        self.log.append(len(rows))
+        return type('Response', (), {'data': [dict(row) for row in rows]})()
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.tables = {'articles': [], 'article_tombstones': []}
+        self.log = []
+
+    def table(self, name):
+        return FakeQuery(self.tables[name], self.log)
+
+    def article(self, updated: float, public: bool = True, likes_at: float = None, **fields) -> dict:
+        row = {
+            'id': str(uuid.uuid4()), 'title': 't', 'content': 'c', 'user_id': 'u1',
+            'is_public_visible': public, 'like_count': 0,
+            'created_at': stamp(0), 'updated_at': stamp(updated),
+            'like_count_updated_at': stamp(likes_at if likes_at is not None else updated), **fields
+        }
+        self.tables['articles'].append(row)
+        return row
+
+    def tombstone(self, deleted: float, was_public: bool = True) -> dict:
+        row = {'article_id': str(uuid.uuid4()), 'user_id': 'u1', 'was_public': was_public, 'deleted_at': stamp(deleted)}
+        self.tables['article_tombstones'].append(row)
+        return row
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeSupabase()
+    monkeypatch.setattr(supabase_client, 'supabase', fake)
+    return fake
+
+
+@pytest.fixture
+def client(fake, monkeypatch):
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.update({'SYNC_OVERLAP_SECONDS': 5, 'SYNC_TOMBSTONE_RETENTION_DAYS': 90})
+    app.register_blueprint(sync_bp, url_prefix='/api')
+    # 水位在 BASE 之后一小时内，且都在墓碑保留期内
+    monkeypatch.setattr('routes.sync.time.time', lambda: BASE / 1_000_000 + 3600)
+    return app.test_client()
+
+
+def articles_since(since, limit, exact=False):
+    return supabase_client.get_articles_changed_since(since, limit, exact=exact)
+
+
+# ==================== fetch_changes ====================
+
+def test_fetch_changes_untruncated_page_has_no_cursor(fake):
+    for second in (1, 2, 3):
+        fake.article(second)
+    rows, cursor = supabase_client.fetch_changes(articles_since, 'updated_at', at(0), 5)
+    assert len(rows) == 3
+    assert cursor is None
+
+
+def test_fetch_changes_truncated_page_resumes_at_last_timestamp(fake):
+    for second in (1, 2, 3, 4, 5):
+        fake.article(second)
+    rows, cursor = supabase_client.fetch_changes(articles_since, 'updated_at', at(0), 3)
+    assert [row['updated_at'] for row in rows] == [stamp(1), stamp(2), stamp(3)]
+    # 下一页从最后一行的时间戳（含）开始，同一时间戳的其余行不会被跳过
+    assert cursor == at(3)
+    assert fake.log == [4]
+
+
+def test_fetch_changes_same_timestamp_page_reads_whole_timestamp(fake):
+    same = [fake.article(2) for _ in range(5)]
+    later = fake.article(3)
+    rows, cursor = supabase_client.fetch_changes(articles_since, 'updated_at', at(0), 3)
+    # 整页同一时间戳：补读该时间戳的全部行，超过 limit 也一次返回
+    assert {row['id'] for row in rows} == {row['id'] for row in same}
+    assert cursor == at(2) + 1
+    rows, cursor = supabase_client.fetch_changes(articles_since, 'updated_at', cursor, 3)
+    assert [row['id'] for row in rows] == [later['id']]
+    assert cursor is None
+
+
+# ==================== /api/sync ====================
+
+def sync(client, **params):
+    response = client.get('/api/sync', query_string=params)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json()
+
+
+def test_truncated_lists_use_the_smallest_cursor_and_page_forward(client, fake):
+    articles = [fake.article(second) for second in range(1, 7)]
+    tombstones = [fake.tombstone(second / 2) for second in range(1, 4)]
+    liked = fake.article(-10, likes_at=2.5, like_count=3)
+
+    first = sync(client, since=stamp(0), limit=2)
+    assert first['reset'] is False
+    assert first['has_more'] is True
+    # articles 与 likes 截断在 2s，tombstones 截断在 1s：水位取最小值，1.5s 的墓碑不会被跳过
+    assert first['watermark'] == stamp(1)
+
+    seen_articles, seen_removed, seen_likes = set(), set(), set()
+    page, pages = first, 1
+    while True:
+        seen_articles.update(article['id'] for article in page['articles'])
+        seen_removed.update(item['id'] for item in page['removed'])
+        seen_likes.update(item['id'] for item in page['likes'])
+        if not page['has_more']:
+            break
+        assert to_epoch_micros(page['watermark']) >= to_epoch_micros(first['watermark'])
+        page = sync(client, since=page['watermark'], limit=2)
+        pages += 1
+        assert pages < 20
+
+    assert {article['id'] for article in articles} <= seen_articles
+    assert {tombstone['article_id'] for tombstone in tombstones} == seen_removed
+    assert liked['id'] in seen_likes
+    # 完整页的水位是请求时间减去重叠窗口
+    assert page['watermark'] == from_epoch_micros(at(3600 - 5))
+
+
+def test_same_timestamp_page_advances_past_the_timestamp(client, fake):
+    batch = [fake.article(1) for _ in range(4)]
+    body = sync(client, since=stamp(0), limit=2)
+    assert {article['id'] for article in body['articles']} == {article['id'] for article in batch}
+    assert body['has_more'] is True
+    assert body['watermark'] == from_epoch_micros(at(1) + 1)
+    assert sync(client, since=body['watermark'], limit=2)['has_more'] is False
+
+
+def test_incremental_sync_reports_hidden_and_deleted_articles(client, fake):
+    hidden = fake.article(1, public=False)
+    private_tombstone = fake.tombstone(2, was_public=False)
+    tombstone = fake.tombstone(3)
+    body = sync(client, since=stamp(0))
+    assert body['articles'] == []
+    assert {(item['id'], item['reason']) for item in body['removed']} == {
+        (hidden['id'], 'hidden'), (tombstone['article_id'], 'deleted')
+    }
+    assert private_tombstone['article_id'] not in {item['id'] for item in body['removed']}
+
+
+@pytest.mark.parametrize('params', [{}, {'since': stamp(-91 * 86400)}])
+def test_reset_returns_public_articles_only(client, fake, params):
+    public = fake.article(1)
+    fake.article(2, public=False)
+    fake.tombstone(3)
+    body = sync(client, **params)
+    assert body['reset'] is True
+    assert [article['id'] for article in body['articles']] == [public['id']]
+    assert body['removed'] == []
+    assert body['likes'] == []
+    assert body['has_more'] is False
+
+
+def test_reset_pages_through_truncated_full_sync(client, fake):
+    for second in range(1, 6):
+        fake.article(second)
+    body = sync(client, limit=2)
+    assert body['reset'] is True
+    assert body['has_more'] is True
+    assert body['watermark'] == stamp(2)
+    # 后续页不再是 reset，从水位继续增量读取
+    assert sync(client, since=body['watermark'], limit=2)['reset'] is False
+
+
+def test_invalid_since_is_rejected(client):
+    assert client.get('/api/sync', query_string={'since': 'yesterday'}).status_code == 400
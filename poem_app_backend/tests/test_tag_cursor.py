@@ -0,0 +1,32 @@
+"""标签页分页游标的解析：非法游标在访问数据库之前被拒绝"""
+
+import uuid
+
+import pytest
+
+from routes.tags import decode_cursor, encode_cursor
+
+ARTICLE_ID = str(uuid.uuid4())
+
+
+def test_round_trip():
+    assert decode_cursor(encode_cursor(1700000000000000, ARTICLE_ID)) == (1700000000000000, ARTICLE_ID)
+
+
+def test_article_id_is_normalized():
+    assert decode_cursor(f'0.{ARTICLE_ID.upper()}') == (0, ARTICLE_ID)
+
+
+@pytest.mark.parametrize('cursor', [
+    '1700000000000000',
+    '1700000000000000.',
+    '1700000000000000.not-a-uuid',
+    f'1700000000000000.{ARTICLE_ID}),id.gt.(0',                # 带入 PostgREST 过滤语法
+    f'1700000000000000.{ARTICLE_ID},is_public_visible.eq.false',
+    f'-1.{ARTICLE_ID}',
+    f'1e15.{ARTICLE_ID}',
+    f'{10 ** 20}.{ARTICLE_ID}',                                 # from_epoch_micros 会溢出
+])
+def test_invalid_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
@@ -0,0 +1,195 @@
+"""
+点赞刷量防护（滑动窗口 Count-Min Sketch）
+
+按 IP、用户（登录用户为用户ID，匿名请求为 IP）、(IP, 文章) 三类键统计最近 LIKE_GUARD_WINDOW_SECONDS 秒内的点赞请求数，
+任一类超过阈值即在访问 Supabase 之前拒绝（429）。IP 为 ProxyFix 按可信代理层数解析出的 request.remote_addr；
+匿名请求的设备ID由客户端自行填写，随意更换即可绕过，因此不参与计数。
+
+- 计数存放在固定大小的 Count-Min Sketch 中，内存占用与 IP/设备数量无关；
+  采用保守更新（只增加等于当前最小值的计数器），降低哈希冲突带来的高估；
+- 滑动窗口：两个 sketch 分别记录当前窗口与上一个窗口，
+  估计值 = 当前窗口计数 + 上一个窗口计数 × 上一个窗口仍落在滑动窗口内的比例；
+- 所有 gunicorn worker 通过 mmap 共享 SHARED_STATE_DIR 下的同一个文件，更新时持有文件锁；
+  文件头同时记录各类拒绝次数，供 /api/admin/metrics 汇总。
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows 开发环境没有 fcntl，单进程运行时只用线程锁
+    fcntl = None
+
+KINDS = ('ip', 'device', 'ip_article')
+# 文件头：两个窗口槽位各自的窗口编号，以及各类键的累计拒绝次数
+HEADER = struct.Struct('<2q3q')
+
+
+class SlidingCountMinSketch:
+    def __init__(self, path: str, width: int = 4096, depth: int = 4, window: float = 60.0):
+        self.path = path
+        self.width = width
+        self.depth = depth
+        self.window = window
+        self._slot_size = width * depth
+        self._size = HEADER.size + 2 * self._slot_size * 4
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._file = None
+        self._map = None
+        self._counters = None
+
+    def _open(self):
+        """每个进程单独打开文件：fork 继承的描述符共享同一把 flock，无法在父子进程间互斥"""
+        if self._pid == os.getpid():
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handle = open(self.path, 'a+b')
+        if os.fstat(handle.fileno()).st_size != self._size:
+            # 新文件或尺寸配置变化：在锁内重建
+            with self._file_lock(handle):
+                if os.fstat(handle.fileno()).st_size != self._size:
+                    handle.truncate(0)
+                    handle.truncate(self._size)
+        self._file = handle
+        self._map = mmap.mmap(handle.fileno(), self._size)
+        self._counters = memoryview(self._map)[HEADER.size:].cast('I')
+        self._pid = os.getpid()
+
+    @staticmethod
+    @contextmanager
+    def _file_lock(handle):
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+    def _indexes(self, key: str):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=4 * self.depth).digest()
+        for row, (value,) in enumerate(struct.iter_unpack('<I', digest)):
+            yield row * self.width + value % self.width
+
+    def _rotate(self, now: float) -> Tuple[int, int, float]:
+        """返回 (当前槽位, 上一窗口槽位, 上一窗口的权重)，进入新窗口时清零过期槽位（需持有锁）"""
+        epoch = int(now // self.window)
+        slot = epoch % 2
+        header = HEADER.unpack_from(self._map, 0)
+        epochs = list(header[:2])
+        if epochs[slot] != epoch:
+            start = HEADER.size + slot * self._slot_size * 4
+            self._map[start:start + self._slot_size * 4] = bytes(self._slot_size * 4)
+            epochs[slot] = epoch
+            struct.pack_into('<q', self._map, slot * 8, epoch)
+        previous = 1 - slot
+        weight = 1.0 - (now % self.window) / self.window if epochs[previous] == epoch - 1 else 0.0
+        return slot, previous, weight
+
+    def add(self, keys, now: Optional[float] = None) -> Dict[str, float]:
+        """为每个键计数一次，返回各键在滑动窗口内的估计值（包含本次）"""
+        now = time.time() if now is None else now
+        estimates = {}
+        with self._lock:
+            self._open()
+            with self._file_lock(self._file):
+                slot, previous, weight = self._rotate(now)
+                current_base, previous_base = slot * self._slot_size, previous * self._slot_size
+                counters = self._counters
+                for key in keys:
+                    indexes = list(self._indexes(key))
+                    current = min(counters[current_base + index] for index in indexes) + 1
+                    for index in indexes:
+                        # 保守更新
+                        if counters[current_base + index] < current:
+                            counters[current_base + index] = current
+                    earlier = min(counters[previous_base + index] for index in indexes) if weight else 0
+                    estimates[key] = current + earlier * weight
+        return estimates
+
+    def record_rejection(self, kind: str):
+        offset = 16 + KINDS.index(kind) * 8
+        with self._lock:
+            self._open()
+            with self._file_lock(self._file):
+                (count,) = struct.unpack_from('<q', self._map, offset)
+                struct.pack_into('<q', self._map, offset, count + 1)
+
+    def rejections(self) -> Dict[str, int]:
+        with self._lock:
+            self._open()
+            header = HEADER.unpack_from(self._map, 0)
+        return dict(zip(KINDS, header[2:]))
+
+
+class LikeAbuseGuard:
+    def __init__(self):
+        self.enabled = True
+        self.limits = {'ip': 120, 'device': 60, 'ip_article': 10}
+        self.sketch: Optional[SlidingCountMinSketch] = None
+        self.stats = {'checked': 0, 'rejected': 0}
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get('LIKE_GUARD_ENABLED', True)
+        self.limits = {
+            'ip': config.get('LIKE_GUARD_IP_LIMIT', self.limits['ip']),
+            'device': config.get('LIKE_GUARD_DEVICE_LIMIT', self.limits['device']),
+            'ip_article': config.get('LIKE_GUARD_IP_ARTICLE_LIMIT', self.limits['ip_article'])
+        }
+        self.sketch = SlidingCountMinSketch(
+            config['LIKE_GUARD_PATH'],
+            width=config.get('LIKE_GUARD_SKETCH_WIDTH', 4096),
+            depth=config.get('LIKE_GUARD_SKETCH_DEPTH', 4),
+            window=config.get('LIKE_GUARD_WINDOW_SECONDS', 60.0)
+        )
+
+    def check(self, article_id: str, ip_address: Optional[str],
+              user_id: Optional[str] = None) -> Optional[Tuple[str, float]]:
+        """
+        记录一次点赞请求并判断是否超限
+
+        Returns:
+            超限时返回 (超限的键类别, 建议的重试等待秒数)，否则 None
+        """
+        if not self.enabled or self.sketch is None:
+            return None
+        keys = {}
+        if ip_address:
+            keys[f'ip:{ip_address}'] = 'ip'
+            keys[f'ip_article:{ip_address}:{article_id}'] = 'ip_article'
+        # 登录用户按用户ID计数；匿名用户不信任设备ID，按 IP 套用同样的上限
+        actor = f'user:{user_id}' if user_id else (f'anon:{ip_address}' if ip_address else None)
+        if actor:
+            keys[actor] = 'device'
+        if not keys:
+            return None
+
+        self.stats['checked'] += 1
+        estimates = self.sketch.add(keys)
+        for key, kind in keys.items():
+            if estimates[key] > self.limits[kind]:
+                self.stats['rejected'] += 1
+                self.sketch.record_rejection(kind)
+                return kind, self.sketch.window - time.time() % self.sketch.window
+        return None
+
+    def snapshot(self) -> dict:
+        snapshot = {**self.stats, 'enabled': self.enabled, 'limits': self.limits}
+        if self.sketch is not None:
+            snapshot['rejected_total'] = self.sketch.rejections()
+        return snapshot
+
+
+like_guard = LikeAbuseGuard()
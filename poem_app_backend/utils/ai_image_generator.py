@@ -1,17 +1,14 @@
 import os
-import requests
-import json
-from PIL import Image
 from io import BytesIO
 import uuid
 from flask import current_app
 from models.supabase_client import supabase_client
-from supabase.client import create_client
 from utils.cloudflare_client import cloudflare_client
-import imghdr
 import re
 from typing import Optional
 
+# requests / supabase 在首次生成图片时才导入，避免拖慢应用冷启动
+
 class AIImageGenerator:
     def __init__(self):
         self.api_url = "https://api.stability.ai/v1/generation/stable-diffusion-xl-1024-v1-0/text-to-image"
@@ -78,6 +75,7 @@ class AIImageGenerator:
             "samples": 1,
             "steps": 30,
         }
+        import requests
         try:
             response = requests.post(self.api_url, headers=headers, json=data, timeout=30)
             if response.status_code == 200:
@@ -98,6 +96,7 @@ class AIImageGenerator:
             "Content-Type": "application/json"
         }
         data = {"inputs": f"{prompt}, {negative_prompt}"}
+        import requests
         try:
             response = requests.post(self.hf_api_url, headers=headers, json=data, timeout=60)
             if response.status_code == 200:
@@ -112,6 +111,7 @@ class AIImageGenerator:
                 supabase_url = os.environ.get('SUPABASE_URL')
                 supabase_key = os.environ.get('SUPABASE_KEY')
                 if supabase_url and supabase_key:
+                    from supabase.client import create_client
                     supabase_client.supabase = create_client(supabase_url, supabase_key)
                     return True
                 return False
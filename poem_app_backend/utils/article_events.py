@@ -0,0 +1,110 @@
+"""
+文章变更事件中心
+
+SupabaseClient 的写方法成功后在这里发布事件，进程内的索引与缓存订阅事件做增量更新；
+开启 CHANGE_FEED_ENABLED 时，其他 worker 与绕过本服务的写入也经 utils/change_feed 转为事件。
+启动时 bootstrap() 分页流式扫描 articles 表一次，把每一行以 loaded 事件交给所有订阅者，
+这样多个内存索引共享同一次扫描；开启热缓存快照（utils/warm_snapshot）时改为从快照恢复并补读水位之后的变更。
+watermark 记录启动数据对应的数据库时间（微秒），之后的变更只能由事件得知。
+
+事件类型:
+- loaded:       启动扫描中的一行文章
+- bootstrapped: 启动扫描完成（payload 为 None）
+- created:      新建文章，payload 为完整文章行
+- updated:      文章内容/图片/可见性变更，payload 为更新后的完整文章行
+- deleted:      文章被删除，payload 为被删除的文章行（至少包含 id）
+- liked:        点赞状态切换，payload 为 {'id', 'delta': 1 | -1, 'like_count', 'observed_at'}；
+                observed_at 为读到该计数的时间（微秒），乱序到达时据此丢弃较旧的计数；
+                由数据库变更订阅转来时带 'source': 'change_feed'，delta 为计数差值，observed_at 为提交时间
+
+由 utils/change_feed 转来的事件（其他 worker 或绕过本服务的写入）以 remote=True 发布，
+分发期间 article_events.remote 为 True；只应由写入方执行一次的副作用（如回写数据库）据此跳过。
+"""
+
+import os
+import threading
+import time
+import traceback
+from typing import Callable, List, Optional
+
+
+class ArticleEventHub:
+    def __init__(self):
+        self._handlers: List[Callable] = []
+        self.enabled = True
+        self.batch_size = 500
+        self.bootstrapped = False
+        self.watermark: Optional[int] = None
+        self._bootstrap_pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('ARTICLE_INDEX_BOOTSTRAP', True)
+        self.batch_size = app.config.get('ARTICLE_INDEX_BATCH_SIZE', self.batch_size)
+        # 每个 worker 的第一个请求在后台启动扫描；--preload 时主进程已在 warmup_app 中同步完成
+        app.before_request(self.ensure_bootstrapped)
+
+    def subscribe(self, handler: Callable):
+        """注册事件处理函数 handler(event, payload)"""
+        if handler not in self._handlers:
+            self._handlers.append(handler)
+        return handler
+
+    def publish(self, event: str, payload, remote: bool = False):
+        self._local.remote = remote
+        try:
+            for handler in list(self._handlers):
+                try:
+                    handler(event, payload)
+                except Exception:
+                    # 单个索引出错不能影响写请求本身
+                    traceback.print_exc()
+        finally:
+            self._local.remote = False
+
+    @property
+    def remote(self) -> bool:
+        """当前线程正在分发的事件是否来自数据库变更订阅"""
+        return getattr(self._local, 'remote', False)
+
+    def ensure_bootstrapped(self):
+        """在当前进程中确保启动扫描已完成或正在后台进行"""
+        if not self.enabled or self.bootstrapped or self._bootstrap_pid == os.getpid():
+            return
+        with self._lock:
+            if self.bootstrapped or self._bootstrap_pid == os.getpid():
+                return
+            self._bootstrap_pid = os.getpid()
+            threading.Thread(target=self.bootstrap, name='article-index-bootstrap', daemon=True).start()
+
+    def bootstrap(self):
+        """流式扫描全部文章（或从热缓存快照恢复）并发布 loaded 事件，完成后发布 bootstrapped"""
+        from models.supabase_client import supabase_client
+        from utils.warm_snapshot import warm_snapshot
+
+        self._bootstrap_pid = os.getpid()
+        started = time.time()
+        count = 0
+        try:
+            restored = warm_snapshot.restore(self.publish)
+            if restored is not None:
+                count, self.watermark = restored
+            else:
+                # 扫描开始之前的提交都会被读到，水位取扫描开始时间（再留出时钟偏差的余量）
+                self.watermark = int((started - warm_snapshot.overlap_seconds) * 1_000_000)
+                for article in supabase_client.iter_articles(batch_size=self.batch_size):
+                    self.publish('loaded', article)
+                    count += 1
+        except Exception as e:
+            print(f"Article index bootstrap failed after {count} rows: {e}")
+            # 允许下一次请求重新尝试
+            self._bootstrap_pid = None
+            return
+        self.bootstrapped = True
+        self.publish('bootstrapped', None)
+        print(f"Article index bootstrap: {count} rows in {time.time() - started:.1f}s"
+              f"{' (warm snapshot)' if restored is not None else ''}")
+
+
+article_events = ArticleEventHub()
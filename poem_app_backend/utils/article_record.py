@@ -0,0 +1,214 @@
+"""
+紧凑的文章记录（进程内缓存与索引使用）
+
+supabase-py 返回的每行文章是一个普通 dict：约 20 个键的哈希表本身就要 1 KB 左右，
+作者名、标签等重复字符串在每一行里各有一份，同一篇文章出现在首页、分页、作者列表等多个缓存条目时，
+正文也会被复制多份。ArticleRecord 用 __slots__ 保存同样的数据：
+- id / user_id 存为 128 位整数（无法解析为标准 UUID 时保留原字符串）；
+- created_at / updated_at 存为微秒级 Unix 时间戳（读取时转换回 ISO 8601 UTC 字符串，格式会被规范化）；
+- 作者名与标签经 sys.intern 驻留，全进程共享一份；
+- 同一篇文章的记录按 ID 登记在弱引用表中：内容没有变化时直接复用已有记录，
+  只有点赞数等字段变化时新记录沿用旧记录的标题与正文字符串，正文只保存一份。
+
+ArticleRecord 实现只读的 Mapping 接口（record['title']、record.get('tags')、dict(record) 均可用），
+to_dict() 返回与数据库行结构相同的字典；JSON 提供者遇到记录时自动调用 to_dict()。
+记录被多个缓存共享，不能修改。
+"""
+
+import sys
+import threading
+import uuid
+import weakref
+from collections.abc import Mapping
+from typing import Iterable, List, Optional
+
+from utils.timestamps import from_epoch_micros, to_epoch_micros
+
+# 固定字段（articles 表的常用列），其余列放在 extra 字典中
+FIELDS = (
+    'id', 'user_id', 'title', 'content', 'tags', 'author', 'image_url', 'created_at', 'updated_at',
+    'like_count', 'is_public_visible', 'text_position_x', 'text_position_y', 'image_offset_x',
+    'image_offset_y', 'image_scale'
+)
+_FIELD_SET = frozenset(FIELDS)
+
+# 行中没有该列（与值为 None 区分）
+_MISSING = type('Missing', (), {'__repr__': lambda self: '<missing>', '__slots__': ()})()
+
+
+def _pack_uuid(value):
+    if isinstance(value, str) and len(value) == 36:
+        try:
+            packed = uuid.UUID(value).int
+        except ValueError:
+            return value
+        # 只有能原样还原的小写标准格式才压缩
+        if _unpack_uuid(packed) == value:
+            return packed
+    return value
+
+
+def _unpack_uuid(value):
+    if type(value) is not int:
+        return value
+    text = '%032x' % value
+    return f'{text[:8]}-{text[8:12]}-{text[12:16]}-{text[16:20]}-{text[20:]}'
+
+
+def _pack_timestamp(value):
+    if isinstance(value, str):
+        micros = to_epoch_micros(value)
+        return value if micros is None else micros
+    return value
+
+
+def _unpack_timestamp(value):
+    return from_epoch_micros(value) if type(value) is int else value
+
+
+def _pack_tags(value):
+    if isinstance(value, list) and all(isinstance(tag, str) for tag in value):
+        return tuple(sys.intern(tag) for tag in value)
+    return value
+
+
+def _unpack_tags(value):
+    return list(value) if type(value) is tuple else value
+
+
+def _pack_author(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+_PACK = {
+    'id': _pack_uuid, 'user_id': _pack_uuid, 'created_at': _pack_timestamp, 'updated_at': _pack_timestamp,
+    'tags': _pack_tags, 'author': _pack_author
+}
+_UNPACK = {
+    'id': _unpack_uuid, 'user_id': _unpack_uuid, 'created_at': _unpack_timestamp,
+    'updated_at': _unpack_timestamp, 'tags': _unpack_tags
+}
+_LAYOUT = tuple((name, _UNPACK.get(name)) for name in FIELDS)
+
+
+class ArticleRecord(Mapping):
+    __slots__ = FIELDS + ('extra', '__weakref__')
+
+    @classmethod
+    def from_row(cls, row) -> 'ArticleRecord':
+        """由数据库行构造记录；同一篇文章内容未变化时返回已登记的记录"""
+        if isinstance(row, cls):
+            return row
+        record = cls.__new__(cls)
+        for name in FIELDS:
+            value = row.get(name, _MISSING)
+            pack = _PACK.get(name)
+            setattr(record, name, pack(value) if pack is not None and value is not _MISSING else value)
+        extra = {key: value for key, value in row.items() if key not in _FIELD_SET}
+        record.extra = extra or None
+        return record._register()
+
+    @classmethod
+    def from_state(cls, state: tuple) -> 'ArticleRecord':
+        """由 to_state() 的结果还原记录（不经过字符串解析），与 from_row 一样登记与复用"""
+        record = cls.__new__(cls)
+        for name, value in zip(FIELDS, state):
+            setattr(record, name, _MISSING if value is ... else value)
+        record.extra = state[len(FIELDS)] or None
+        return record._register()
+
+    def _register(self) -> 'ArticleRecord':
+        # 以压缩后的 ID 登记，不让行字典里的 ID 字符串常驻
+        key = self.id
+        if key is None or key is _MISSING:
+            return self
+        with _registry_lock:
+            previous = _registry.get(key)
+            if previous is not None:
+                if previous._state() == self._state():
+                    return previous
+                # 只有计数等字段变化：沿用旧记录的标题与正文对象
+                if previous.content == self.content:
+                    self.content = previous.content
+                if previous.title == self.title:
+                    self.title = previous.title
+            _registry[key] = self
+        return self
+
+    def _state(self) -> tuple:
+        return tuple(getattr(self, name) for name in FIELDS) + (self.extra,)
+
+    def to_state(self) -> tuple:
+        """压缩后的字段元组（缺失的列为 Ellipsis），可用 marshal 编码，供热缓存快照写入文件"""
+        return tuple(... if value is _MISSING else value for value in self._state())
+
+    def version_key(self) -> Optional[tuple]:
+        """片段缓存的版本键：直接使用压缩后的字段，不做格式转换"""
+        if self.id is _MISSING or self.id is None:
+            return None
+        return (ArticleRecord, self.id, self.updated_at, self.like_count, self.is_public_visible, self.image_url)
+
+    # ==================== Mapping 接口 ====================
+
+    def __getitem__(self, key):
+        if key in _FIELD_SET:
+            value = getattr(self, key)
+            if value is _MISSING:
+                raise KeyError(key)
+            unpack = _UNPACK.get(key)
+            return unpack(value) if unpack is not None else value
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        for name in FIELDS:
+            if getattr(self, name) is not _MISSING:
+                yield name
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return sum(1 for name in FIELDS if getattr(self, name) is not _MISSING) + len(self.extra or ())
+
+    def __contains__(self, key):
+        if key in _FIELD_SET:
+            return getattr(self, key) is not _MISSING
+        return self.extra is not None and key in self.extra
+
+    def to_dict(self) -> dict:
+        """转换为与数据库行结构相同的新字典"""
+        result = {}
+        for name, unpack in _LAYOUT:
+            value = getattr(self, name)
+            if value is not _MISSING:
+                result[name] = value if unpack is None else unpack(value)
+        if self.extra:
+            result.update(self.extra)
+        return result
+
+    def __repr__(self):
+        return f'ArticleRecord({self.to_dict()!r})'
+
+
+_registry: 'weakref.WeakValueDictionary[object, ArticleRecord]' = weakref.WeakValueDictionary()
+_registry_lock = threading.Lock()
+
+
+def record_key(article_id):
+    """文章ID -> 记录的登记键（压缩后的 ID），进程内按文章保存记录的字典使用同样的键"""
+    return _pack_uuid(article_id)
+
+
+def compact_article(row) -> Optional[ArticleRecord]:
+    """单篇文章行 -> 记录；None 与非字典值原样返回"""
+    if isinstance(row, dict):
+        return ArticleRecord.from_row(row)
+    return row
+
+
+def compact_articles(rows: Optional[Iterable]) -> Optional[List]:
+    """文章列表 -> 记录列表"""
+    if rows is None:
+        return None
+    return [compact_article(row) for row in rows]
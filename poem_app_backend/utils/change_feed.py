@@ -0,0 +1,274 @@
+"""
+数据库变更订阅（Supabase Realtime postgres_changes）
+
+并不是所有写入都经过本服务：点赞触发器修改 articles.like_count，管理员也会在后台直接改表。
+每个 worker 的后台线程通过 Realtime WebSocket（Phoenix 协议）订阅 articles、article_likes、users
+三张表的行变更，翻译为 article_events 事件与定向的缓存失效：
+- articles INSERT / UPDATE / DELETE -> created / updated / deleted；
+  只有 like_count 变化（updated_at 未变）的 UPDATE -> liked（source='change_feed'）；
+- article_likes -> 丢弃对应文章的热点缓存（计数变化随后以 articles UPDATE 到达）；
+- users -> 列表缓存标记为过期（作者信息可能变化）。
+
+去重：订阅全部本地事件，记录每篇文章最后见到的 (updated_at, like_count)，
+本进程自己的写入经 Realtime 回来时版本相同，直接跳过。
+
+断线重连：指数退避重连；重连成功后从最后处理的 commit_timestamp（减去 CHANGE_FEED_CATCHUP_MARGIN）
+起按 updated_at 补读断线期间的文章变更，并清空热点缓存（点赞与删除无法按时间补读）。
+
+需要先执行 database_migrations/enable_realtime.sql 把三张表加入 supabase_realtime publication。
+本地调试可以用 realtime_stub.py 启动一个模拟服务端（CHANGE_FEED_URL=ws://127.0.0.1:4000/socket）。
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from utils.article_events import article_events
+from utils.timestamps import from_epoch_micros, to_epoch_micros
+
+TABLES = ('articles', 'article_likes', 'users')
+
+
+class ChangeFeed:
+    def __init__(self):
+        self.enabled = False
+        self.url: Optional[str] = None
+        self.heartbeat_seconds = 25.0
+        self.max_backoff = 60.0
+        self.catchup_margin = 30.0
+        self.batch_size = 500
+        self.connected = False
+        self.position: Optional[int] = None           # 最后处理的 commit_timestamp（微秒）
+        self.stats = {'events': 0, 'skipped_own': 0, 'reconnects': 0, 'catchup_rows': 0}
+
+        self._lock = threading.Lock()
+        self._versions: Dict[str, Tuple[Optional[int], int]] = {}
+        self._worker_pid: Optional[int] = None
+        self._refs = itertools.count(1)
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get('CHANGE_FEED_ENABLED', False)
+        if not self.enabled:
+            return
+        self.url = config.get('CHANGE_FEED_URL') or self.realtime_url(
+            config['SUPABASE_URL'], config.get('SUPABASE_SERVICE_KEY') or config['SUPABASE_KEY']
+        )
+        self.heartbeat_seconds = config.get('CHANGE_FEED_HEARTBEAT_SECONDS', self.heartbeat_seconds)
+        self.catchup_margin = config.get('CHANGE_FEED_CATCHUP_MARGIN', self.catchup_margin)
+        self.batch_size = config.get('ARTICLE_INDEX_BATCH_SIZE', self.batch_size)
+        article_events.subscribe(self.remember)
+        app.before_request(self.ensure_worker)
+
+    @staticmethod
+    def realtime_url(supabase_url: str, key: str) -> str:
+        """https://<ref>.supabase.co -> wss://<ref>.supabase.co/realtime/v1/websocket?apikey=...&vsn=1.0.0"""
+        parsed = urlparse(supabase_url)
+        scheme = 'wss' if parsed.scheme == 'https' else 'ws'
+        return f'{scheme}://{parsed.netloc}/realtime/v1/websocket?apikey={key}&vsn=1.0.0'
+
+    # ==================== 版本记录（去重） ====================
+
+    @staticmethod
+    def _version(article: dict) -> Tuple[Optional[int], int]:
+        return to_epoch_micros(article.get('updated_at')), article.get('like_count') or 0
+
+    def remember(self, event: str, article):
+        """记录本进程已经知道的文章版本（包括启动扫描与本地写入）"""
+        if not article or not article.get('id'):
+            return
+        article_id = article['id']
+        with self._lock:
+            if event == 'deleted':
+                self._versions.pop(article_id, None)
+            elif event == 'liked':
+                updated_at = self._versions.get(article_id, (None, 0))[0]
+                self._versions[article_id] = (updated_at, article.get('like_count') or 0)
+            elif event in ('loaded', 'created', 'updated'):
+                self._versions[article_id] = self._version(article)
+
+    # ==================== 事件翻译 ====================
+
+    def handle_change(self, data: dict):
+        """处理一条 postgres_changes 负载"""
+        table = data.get('table')
+        change = data.get('type') or data.get('eventType')
+        record = data.get('record') or {}
+        old_record = data.get('old_record') or {}
+        committed = to_epoch_micros(data.get('commit_timestamp'))
+        with self._lock:
+            if committed is not None:
+                self.position = max(self.position or 0, committed)
+        self._count('events')
+
+        if table == 'articles':
+            self._handle_article(change, record, old_record, committed)
+        elif table == 'article_likes':
+            article_id = record.get('article_id') or old_record.get('article_id')
+            if article_id:
+                self._read_cache().drop(('article', article_id))
+        elif table == 'users':
+            self._read_cache().mark_stale('feed')
+
+    def _handle_article(self, change: str, record: dict, old_record: dict, committed: Optional[int] = None):
+        if change == 'DELETE':
+            article_id = old_record.get('id')
+            with self._lock:
+                known = article_id in self._versions
+            if not article_id or not known:
+                self._count('skipped_own')
+                return
+            article_events.publish('deleted', {**old_record, 'id': article_id}, remote=True)
+            return
+
+        article_id = record.get('id')
+        if not article_id:
+            return
+        updated_at, like_count = self._version(record)
+        with self._lock:
+            known = self._versions.get(article_id)
+        if known == (updated_at, like_count):
+            self._count('skipped_own')
+        elif known is None:
+            article_events.publish('created' if change == 'INSERT' else 'updated', record, remote=True)
+        elif known[0] == updated_at:
+            # 只有计数变化：点赞触发器或其他 worker 处理的点赞
+            article_events.publish('liked', {
+                'id': article_id, 'delta': like_count - known[1], 'like_count': like_count,
+                'observed_at': committed, 'source': 'change_feed'
+            }, remote=True)
+        else:
+            article_events.publish('updated', record, remote=True)
+
+    def _count(self, name: str, amount: int = 1):
+        # 接收循环与补读线程同时计数
+        with self._lock:
+            self.stats[name] += amount
+
+    @staticmethod
+    def _read_cache():
+        from models.supabase_client import supabase_client
+
+        return supabase_client.read_cache
+
+    def catch_up(self, position: Optional[int] = None):
+        """重连后补读断线期间 updated_at 变化的文章（position 为订阅建立时的位置，默认取当前位置）"""
+        position = position or self.position
+        if position is None:
+            return
+        from models.supabase_client import supabase_client
+
+        since = from_epoch_micros(position - int(self.catchup_margin * 1_000_000))
+        client = supabase_client.service_supabase or supabase_client.supabase
+        start = 0
+        while True:
+            rows = (client.table('articles').select('*').gte('updated_at', since)
+                    .order('updated_at').order('id').range(start, start + self.batch_size - 1).execute().data or [])
+            for row in rows:
+                self._handle_article('UPDATE', row, {})
+            self._count('catchup_rows', len(rows))
+            if len(rows) < self.batch_size:
+                break
+            start += self.batch_size
+        # 断线期间的点赞与删除无法按时间补读，热点缓存全部重新加载
+        self._read_cache().clear()
+
+    # ==================== 连接 ====================
+
+    def ensure_worker(self):
+        """确保当前进程中运行着订阅线程（fork 之后需要重新启动）"""
+        if not self.enabled or self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker_pid == os.getpid():
+                return
+            self._worker_pid = os.getpid()
+            # 第一次连接也从进程启动时刻补读，覆盖启动扫描与订阅建立之间的写入
+            self.position = self.position or int(time.time() * 1_000_000)
+        threading.Thread(target=self._run, name='change-feed', daemon=True).start()
+
+    def _run(self):
+        backoff = 1.0
+        while True:
+            started = time.time()
+            try:
+                asyncio.run(self._consume())
+            except Exception as e:
+                print(f"Change feed disconnected: {e}")
+            self.connected = False
+            self._count('reconnects')
+            # 连接维持过一段时间说明服务端正常，退避从头开始
+            if time.time() - started > 60:
+                backoff = 1.0
+            time.sleep(backoff * (0.5 + random.random() / 2))
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _message(self, topic: str, event: str, payload: dict, join_ref: Optional[str] = None) -> str:
+        return json.dumps({'topic': topic, 'event': event, 'payload': payload,
+                           'ref': str(next(self._refs)), 'join_ref': join_ref})
+
+    async def _consume(self):
+        import websockets
+
+        topic = 'realtime:poemverse-changes'
+        async with websockets.connect(self.url, ping_interval=None, max_size=8 * 1024 * 1024) as socket:
+            join_ref = str(next(self._refs))
+            await socket.send(json.dumps({
+                'topic': topic, 'event': 'phx_join', 'ref': join_ref, 'join_ref': join_ref,
+                'payload': {'config': {'postgres_changes': [
+                    {'event': '*', 'schema': 'public', 'table': table} for table in TABLES
+                ]}}
+            }))
+            heartbeat = asyncio.ensure_future(self._heartbeat(socket))
+            catchup = None
+            try:
+                async for raw in socket:
+                    message = json.loads(raw)
+                    event = message.get('event')
+                    if event == 'phx_reply' and message.get('ref') == join_ref:
+                        if message.get('payload', {}).get('status') != 'ok':
+                            raise ConnectionError(f"订阅失败: {message.get('payload')}")
+                        self.connected = True
+                        # 补读作为独立任务在线程池中执行，接收循环不等待它，
+                        # 期间到达的变更照常处理（版本去重保证重复投递无害）
+                        catchup = asyncio.ensure_future(self._catch_up(socket))
+                    elif event == 'postgres_changes':
+                        self.handle_change(message.get('payload', {}).get('data') or {})
+                    elif event in ('phx_error', 'phx_close'):
+                        raise ConnectionError(f"频道关闭: {event}")
+            finally:
+                heartbeat.cancel()
+                if catchup is not None:
+                    catchup.cancel()
+
+    async def _catch_up(self, socket):
+        # 补读期间实时变更会推进 position；补读失败时退回原位置，重连后重新补读断线区间
+        position = self.position
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.catch_up, position)
+        except Exception as e:
+            print(f"Change feed catch-up failed: {e}")
+            with self._lock:
+                if position is not None:
+                    self.position = min(self.position or position, position)
+            await socket.close()
+
+    async def _heartbeat(self, socket):
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            await socket.send(self._message('phoenix', 'heartbeat', {}))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        return {**stats, 'enabled': self.enabled, 'connected': self.connected,
+                'position': from_epoch_micros(self.position) if self.position else None}
+
+
+change_feed = ChangeFeed()
@@ -1,12 +1,11 @@
 import os
-import requests
 import uuid
 from flask import current_app
 import json
-import imghdr
-from PIL import Image
 from io import BytesIO
 
+# requests / PIL / imghdr 在首次上传时才导入，避免拖慢应用冷启动
+
 class CloudflareClient:
     """Cloudflare Images 客户端"""
     
@@ -42,6 +41,9 @@ class CloudflareClient:
     
     def _process_image_data(self, file_data, filename):
         """处理图片数据，自动检测格式并转换为PNG"""
+        import imghdr
+        from PIL import Image
+
         try:
             # 检测原始图片格式
             image_buffer = BytesIO(file_data)
@@ -103,6 +105,7 @@ class CloudflareClient:
                 'requireSignedURLs': (None, 'false', 'text/plain')
             }
             
+            import requests
             # 上传到 Cloudflare Images - metadata作为multipart字段
             response = requests.post(
                 f'https://api.cloudflare.com/client/v4/accounts/{self.account_id}/images/v1',
@@ -151,6 +154,7 @@ class CloudflareClient:
                 'Authorization': f'Bearer {self.api_token}'
             }
             
+            import requests
             response = requests.delete(
                 f'https://api.cloudflare.com/client/v4/accounts/{self.account_id}/images/v1/{image_id}',
                 headers=headers,
@@ -188,6 +192,7 @@ class CloudflareClient:
                 'Content-Type': 'application/json'
             }
             
+            import requests
             response = requests.get(
                 f'https://api.cloudflare.com/client/v4/accounts/{self.account_id}/images/v1',
                 headers=headers,
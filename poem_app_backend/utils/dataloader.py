@@ -0,0 +1,167 @@
+"""
+按ID批量加载（DataLoader 模式）
+
+并发请求中逐个到达的 load(id) 在一个很短的窗口（LOADER_BATCH_WINDOW_MS）内合并，
+由第一个到达的线程在窗口结束时用一次 .in_('id', [...]) 查询全部取回：
+- 只有可能有其他线程加入批次时才等待窗口：gevent 或多线程 worker（wsgi.multithread），
+  或调用方指明的情况（例如处于请求内并发查询的线程池中）；gunicorn 同步 worker 上直接查询；
+- 同一批次中相同的ID共享一个 Future，不会重复查询；
+- 请求内缓存：同一请求中再次读取同一ID直接返回（写操作后需调用 clear）；
+- 错误隔离：整批查询失败时（例如某个ID不是合法的 UUID）逐个重试，只有出错的ID收到异常。
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, Iterable, List, Optional
+
+
+class BatchLoader:
+    def __init__(self, name: str, batch_fn: Callable[[List[Hashable]], Dict[Hashable, object]],
+                 window: float = 0.002, max_batch: int = 100, timeout: float = 30.0,
+                 isolate: Optional[Callable[[Exception], bool]] = None,
+                 may_join: Optional[Callable[[], bool]] = None):
+        """
+        Args:
+            name: 加载器名称（请求内缓存的命名空间）
+            batch_fn: 批量查询函数，参数为ID列表，返回 {ID: 行}，不存在的ID可以缺省
+            window: 合并窗口（秒），为 0 时只合并同一次 load_many 中的ID
+            max_batch: 单次查询的最大ID数，达到后立即发出
+            isolate: 判断批量失败是否值得逐个重试（上游不可用时逐个重试没有意义），默认总是重试
+            may_join: 判断当前线程之外是否还可能有调用者加入批次（除 wsgi.multithread 之外的情况）
+        """
+        self.name = name
+        self.batch_fn = batch_fn
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.isolate = isolate or (lambda error: True)
+        self.may_join = may_join
+        self.stats = {'loads': 0, 'cache_hits': 0, 'batches': 0, 'keys': 0, 'isolated_errors': 0,
+                      'windows_skipped': 0}
+
+        self._lock = threading.Lock()
+        self._pending: Dict[Hashable, Future] = {}
+        self._collecting = False
+
+    # ==================== 请求内缓存 ====================
+
+    def _request_cache(self) -> Optional[dict]:
+        from flask import g, has_request_context
+
+        if not has_request_context():
+            return None
+        caches = g.setdefault('batch_loader_cache', {})
+        return caches.setdefault(self.name, {})
+
+    def prime(self, key: Hashable, value):
+        """把已知的行放入请求内缓存（例如写操作返回的最新数据）"""
+        cache = self._request_cache()
+        if cache is not None:
+            cache[key] = value
+
+    def clear(self, key: Hashable):
+        """写操作之后清除请求内缓存中的旧数据"""
+        cache = self._request_cache()
+        if cache is not None:
+            cache.pop(key, None)
+
+    # ==================== 加载 ====================
+
+    def load(self, key: Hashable):
+        return self.load_many([key])[0]
+
+    def load_many(self, keys: Iterable[Hashable]) -> list:
+        """按传入顺序返回各ID对应的行（不存在为 None）；某个ID查询出错时抛出该ID的异常"""
+        keys = list(keys)
+        cache = self._request_cache()
+        values = {}
+        wanted = []
+        for key in dict.fromkeys(keys):
+            if cache is not None and key in cache:
+                values[key] = cache[key]
+                self.stats['cache_hits'] += 1
+            else:
+                wanted.append(key)
+        self.stats['loads'] += len(keys)
+
+        if wanted:
+            futures = self._enqueue(wanted)
+            for key, future in futures.items():
+                values[key] = future.result(timeout=self.timeout)
+                if cache is not None:
+                    cache[key] = values[key]
+        return [values[key] for key in keys]
+
+    def _enqueue(self, keys: List[Hashable]) -> Dict[Hashable, Future]:
+        futures = {}
+        full_batch = None
+        with self._lock:
+            for key in keys:
+                future = self._pending.get(key)
+                if future is None:
+                    future = self._pending[key] = Future()
+                futures[key] = future
+            leader = not self._collecting
+            if leader:
+                self._collecting = True
+            if len(self._pending) >= self.max_batch:
+                full_batch = self._take_locked()
+
+        if full_batch:
+            self._dispatch(full_batch)
+        if leader:
+            # 第一个到达的线程等待窗口结束，再把这段时间内收集到的ID一起查询；
+            # 没有其他线程能在窗口内到达时等待只会白白增加延迟
+            if self.window > 0 and not full_batch:
+                if self._concurrent_callers():
+                    time.sleep(self.window)
+                else:
+                    self.stats['windows_skipped'] += 1
+            with self._lock:
+                batch = self._take_locked()
+            if batch:
+                self._dispatch(batch)
+        return futures
+
+    def _concurrent_callers(self) -> bool:
+        """是否可能有其他调用者在窗口内加入批次"""
+        from flask import has_request_context, request
+
+        if self.may_join is not None and self.may_join():
+            return True
+        return has_request_context() and bool(request.environ.get('wsgi.multithread'))
+
+    def _take_locked(self) -> Dict[Hashable, Future]:
+        batch, self._pending = self._pending, {}
+        self._collecting = False
+        return batch
+
+    def _dispatch(self, batch: Dict[Hashable, Future]):
+        keys = list(batch)
+        for start in range(0, len(keys), self.max_batch):
+            chunk = keys[start:start + self.max_batch]
+            self.stats['batches'] += 1
+            self.stats['keys'] += len(chunk)
+            try:
+                rows = self.batch_fn(chunk)
+            except Exception as e:
+                if len(chunk) == 1 or not self.isolate(e):
+                    for key in chunk:
+                        batch[key].set_exception(e)
+                    continue
+                self._dispatch_isolated(chunk, batch)
+                continue
+            for key in chunk:
+                batch[key].set_result(rows.get(key))
+
+    def _dispatch_isolated(self, keys: List[Hashable], batch: Dict[Hashable, Future]):
+        """整批失败时逐个查询，让错误只影响出错的ID"""
+        for key in keys:
+            try:
+                rows = self.batch_fn([key])
+            except Exception as e:
+                self.stats['isolated_errors'] += 1
+                batch[key].set_exception(e)
+            else:
+                batch[key].set_result(rows.get(key))
@@ -0,0 +1,177 @@
+"""
+预编译邮件模板
+
+启动时编译 templates/email 下的 Jinja 模板，并把整封邮件（头部 + multipart/alternative 骨架 + 正文）
+预渲染成字节片段：收件人相关的变量（收件地址、重置链接、用户名等）以占位符形式留空，
+发送时只需把转义后的值与静态片段拼接，不再逐封渲染模板或构造 MIME 对象。
+
+正文使用 8bit 传输编码（UTF-8 原文），投递时由发件箱声明 BODY=8BITMIME。
+模板中的逐收件人变量只能做简单替换（{{ reset_url }}），不能再套过滤器。
+"""
+
+import os
+import re
+import uuid
+from email.header import Header
+from email.utils import formatdate, make_msgid
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from markupsafe import escape
+
+from utils.mail_outbox import mail_outbox
+
+# 模板名 -> (主题, 逐收件人变量)。主题为 None 时由编译时的静态上下文提供 subject
+EMAIL_TEMPLATES = {
+    'password_reset': ('诗篇 - 密码重置', ('reset_url',)),
+    'welcome': ('欢迎加入诗篇', ('username',)),
+    'announcement': (None, ('username',)),
+}
+
+DEFAULT_CONTEXT = {
+    'app_store_url': 'https://apps.apple.com/app/poemverse',
+    'google_play_url': 'https://play.google.com/store/apps/details?id=com.owensha.poemverse',
+}
+
+_SLOT_RE = re.compile('\x00slot:(\\w+):(html|text)\x00')
+_LINE_BREAK_RE = re.compile(r'\r?\n')
+
+
+class CompiledEmail:
+    """一封预渲染好的邮件：静态字节片段与占位符交替排列"""
+
+    def __init__(self, name: str, parts: List[Union[bytes, Tuple[str, bool]]], variables: Tuple[str, ...], msgid_domain: str):
+        self.name = name
+        self.parts = parts
+        self.variables = variables
+        self.msgid_domain = msgid_domain
+
+    def render(self, to: str, **values) -> bytes:
+        """填入收件人和变量，返回可直接投递的邮件字节"""
+        missing = [name for name in self.variables if name not in values]
+        if missing:
+            raise ValueError(f"邮件模板 {self.name} 缺少变量: {', '.join(missing)}")
+
+        # 头部字段去掉换行，防止头注入
+        values['to'] = to.replace('\r', '').replace('\n', '')
+        values['date'] = formatdate()
+        values['message_id'] = make_msgid(domain=self.msgid_domain)
+
+        chunks = []
+        for part in self.parts:
+            if isinstance(part, bytes):
+                chunks.append(part)
+                continue
+            name, is_html = part
+            value = str(values[name])
+            if is_html:
+                value = str(escape(value))
+            chunks.append(value.encode('utf-8'))
+        return b''.join(chunks)
+
+
+class EmailTemplates:
+    """邮件模板注册表：init_app 时编译全部模板"""
+
+    def __init__(self):
+        self.env = None
+        self.from_addr: Optional[str] = None
+        self.msgid_domain = 'poemverse.local'
+        self._compiled: Dict[str, CompiledEmail] = {}
+
+    def init_app(self, app):
+        from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+        self.env = Environment(
+            loader=FileSystemLoader(os.path.join(app.root_path, 'templates', 'email')),
+            autoescape=select_autoescape(['html']),
+            trim_blocks=True,
+            lstrip_blocks=True
+        )
+        self.from_addr = app.config.get('EMAIL_USERNAME') or ''
+        if '@' in self.from_addr:
+            self.msgid_domain = self.from_addr.rsplit('@', 1)[1]
+
+        self._compiled = {
+            name: self.compile(name)
+            for name, (subject, _) in EMAIL_TEMPLATES.items()
+            if subject is not None
+        }
+
+    def compile(self, name: str, **static_context) -> CompiledEmail:
+        """
+        编译并预渲染一封邮件。static_context 为所有收件人共享的内容（如公告的 subject/title/paragraphs），
+        批量发送时每个批次只编译一次。
+        """
+        subject, variables = EMAIL_TEMPLATES[name]
+        subject = static_context.pop('subject', subject)
+        if not subject:
+            raise ValueError(f"邮件模板 {name} 需要提供 subject")
+
+        context = {**DEFAULT_CONTEXT, **static_context}
+        text_body = self._render_with_slots(f'{name}.txt', context, variables, is_html=False)
+        html_body = self._render_with_slots(f'{name}.html', context, variables, is_html=True)
+
+        boundary = f'=_poemverse_{uuid.uuid4().hex}'
+        encoded_subject = Header(subject, 'utf-8').encode(linesep='\r\n')
+        skeleton = (
+            f'From: {self.from_addr}\r\n'
+            f'To: \x00slot:to:text\x00\r\n'
+            f'Subject: {encoded_subject}\r\n'
+            f'Date: \x00slot:date:text\x00\r\n'
+            f'Message-ID: \x00slot:message_id:text\x00\r\n'
+            f'MIME-Version: 1.0\r\n'
+            f'Content-Type: multipart/alternative; boundary="{boundary}"\r\n'
+            f'\r\n'
+            f'--{boundary}\r\n'
+            f'Content-Type: text/plain; charset="utf-8"\r\n'
+            f'Content-Transfer-Encoding: 8bit\r\n'
+            f'\r\n'
+            f'{text_body}\r\n'
+            f'--{boundary}\r\n'
+            f'Content-Type: text/html; charset="utf-8"\r\n'
+            f'Content-Transfer-Encoding: 8bit\r\n'
+            f'\r\n'
+            f'{html_body}\r\n'
+            f'--{boundary}--\r\n'
+        )
+        return CompiledEmail(name, self._split_slots(skeleton), variables, self.msgid_domain)
+
+    def _render_with_slots(self, template_name: str, context: dict, variables: Iterable[str], is_html: bool) -> str:
+        """用占位符代替逐收件人变量渲染模板，并统一为 CRLF 换行"""
+        kind = 'html' if is_html else 'text'
+        slots = {name: f'\x00slot:{name}:{kind}\x00' for name in variables}
+        rendered = self.env.get_template(template_name).render(**context, **slots)
+        return _LINE_BREAK_RE.sub('\r\n', rendered.strip('\n'))
+
+    @staticmethod
+    def _split_slots(skeleton: str) -> List[Union[bytes, Tuple[str, bool]]]:
+        parts: List[Union[bytes, Tuple[str, bool]]] = []
+        position = 0
+        for match in _SLOT_RE.finditer(skeleton):
+            parts.append(skeleton[position:match.start()].encode('utf-8'))
+            parts.append((match.group(1), match.group(2) == 'html'))
+            position = match.end()
+        parts.append(skeleton[position:].encode('utf-8'))
+        return [part for part in parts if part != b'']
+
+    def get(self, name: str) -> CompiledEmail:
+        return self._compiled[name]
+
+    def send(self, name: str, to: str, **values) -> int:
+        """渲染一封模板邮件并写入发件箱，返回队列ID"""
+        return mail_outbox.enqueue(to, self.get(name).render(to, **values), self.from_addr)
+
+    def send_bulk(self, compiled: CompiledEmail, recipients: Iterable[dict], chunk_size: int = 200) -> int:
+        """
+        批量发送（摘要、公告等）。recipients 为 {'to': ..., <变量>: ...} 的可迭代对象（可以是生成器），
+        邮件在写入发件箱时逐封生成，内存中最多只保留一个分段。返回入队数量。
+        """
+        messages = (
+            (recipient['to'], compiled.render(**recipient))
+            for recipient in recipients
+            if recipient.get('to')
+        )
+        return mail_outbox.enqueue_many(messages, chunk_size=chunk_size, from_addr=self.from_addr)
+
+
+email_templates = EmailTemplates()
@@ -0,0 +1,181 @@
+"""
+热点文章识别与缓存准入（Space-Saving + TinyLFU）
+
+热点读取缓存（utils/read_cache.ReadCache）原本是纯 LRU：一波长尾文章的访问会把正在传播的热门诗词挤出缓存。
+HotArticles 作为 ReadCache 的准入与淘汰策略：
+- FrequencySketch：所有缓存键的近似访问频率（4 位饱和计数的 Count-Min Sketch），
+  采样数达到缓存容量的 10 倍后全部减半，使频率反映近期访问；
+- 准入（TinyLFU）：缓存已满时，新键的频率必须高于将被淘汰的键才写入缓存，只被访问一两次的长尾文章不会挤掉热点；
+- SpaceSaving：在固定数量的计数器内追踪访问最多的文章（误差有上界），
+  前 HOT_ARTICLES_PIN 篇作为钉住集合，LRU 淘汰时跳过；同样随频率衰减减半。
+  /api/admin/hot-articles 返回当前热点用于容量规划。
+
+统计只在本进程内进行，每个 worker 按自己的流量独立判断。
+"""
+
+import heapq
+import threading
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+
+# 每个字节存放一个计数器，减半时整表一次 translate
+_HALVE = bytes(value >> 1 for value in range(256))
+
+
+class FrequencySketch:
+    def __init__(self, capacity: int = 2000, depth: int = 4):
+        self.depth = depth
+        self.width = 1
+        while self.width < max(capacity, 16) * 2:
+            self.width <<= 1
+        self.sample_size = 10 * max(capacity, 16)
+        self.samples = 0
+        self.resets = 0
+        self._table = bytearray(self.width * depth)
+
+    def _indexes(self, key: Hashable):
+        mask = self.width - 1
+        return [row * self.width + (hash((row, key)) & mask) for row in range(self.depth)]
+
+    def increment(self, key: Hashable) -> bool:
+        """计数一次；触发了减半时返回 True"""
+        table = self._table
+        for index in self._indexes(key):
+            if table[index] < 15:
+                table[index] += 1
+        self.samples += 1
+        if self.samples >= self.sample_size:
+            self._table = bytearray(self._table.translate(_HALVE))
+            self.samples //= 2
+            self.resets += 1
+            return True
+        return False
+
+    def estimate(self, key: Hashable) -> int:
+        table = self._table
+        return min(table[index] for index in self._indexes(key))
+
+
+class SpaceSaving:
+    """固定 capacity 个计数器的 Top-K 估计：计数 - 误差 是真实次数的下界，计数是上界"""
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self._counts: Dict[Hashable, Tuple[int, int]] = {}   # 键 -> (计数, 误差)
+        self._heap: List[Tuple[int, Hashable]] = []          # (计数, 键)，含过期条目
+
+    def offer(self, key: Hashable, weight: int = 1):
+        counts = self._counts
+        if key in counts:
+            count, error = counts[key]
+            counts[key] = (count + weight, error)
+        elif len(counts) < self.capacity:
+            counts[key] = (weight, 0)
+        else:
+            # 替换当前计数最小的键，新键继承它的计数作为误差
+            while True:
+                count, victim = heapq.heappop(self._heap)
+                if counts.get(victim, (None,))[0] == count:
+                    break
+            del counts[victim]
+            counts[key] = (count + weight, count)
+        heapq.heappush(self._heap, (counts[key][0], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._rebuild()
+
+    def _rebuild(self):
+        self._heap = [(count, key) for key, (count, _) in self._counts.items()]
+        heapq.heapify(self._heap)
+
+    def load(self, items: List[Tuple[Hashable, int, int]]):
+        """载入 top() 格式的计数（如快照），超出容量的部分丢弃"""
+        for key, count, error in items[:self.capacity - len(self._counts)]:
+            self._counts[key] = (count, error)
+        self._rebuild()
+
+    def halve(self):
+        self._counts = {key: (count >> 1, error >> 1) for key, (count, error) in self._counts.items() if count > 1}
+        self._rebuild()
+
+    def top(self, n: int) -> List[Tuple[Hashable, int, int]]:
+        """[(键, 计数, 误差)]，按计数从高到低"""
+        items = heapq.nlargest(n, self._counts.items(), key=lambda item: item[1][0])
+        return [(key, count, error) for key, (count, error) in items]
+
+    def __len__(self):
+        return len(self._counts)
+
+
+class HotArticles:
+    def __init__(self):
+        self.enabled = True
+        self.pin_count = 50
+        self.sketch = FrequencySketch()
+        self.tracker = SpaceSaving()
+        self.stats = {'admitted': 0, 'rejected': 0}
+
+        self._lock = threading.Lock()
+        self._pinned = frozenset()
+        self._pinned_at = 0.0
+
+    def init_app(self, app, cache_capacity: Optional[int] = None):
+        config = app.config
+        self.enabled = config.get('READ_CACHE_ADMISSION', True)
+        self.pin_count = config.get('HOT_ARTICLES_PIN', self.pin_count)
+        self.sketch = FrequencySketch(cache_capacity or config.get('READ_CACHE_MAX_ENTRIES', 2000))
+        self.tracker = SpaceSaving(config.get('HOT_ARTICLES_CAPACITY', 1000))
+
+    # ==================== ReadCache 策略接口 ====================
+
+    def record(self, key: Tuple):
+        """记录一次缓存读取；文章键同时计入 Space-Saving"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self.sketch.increment(key):
+                self.tracker.halve()
+            if key[0] == 'article':
+                self.tracker.offer(key[1])
+            # 钉住集合每秒最多重算一次
+            now = time.monotonic()
+            if now - self._pinned_at >= 1.0:
+                self._pinned = frozenset(key for key, _, _ in self.tracker.top(self.pin_count))
+                self._pinned_at = now
+
+    def admit(self, candidate: Tuple, victim: Tuple) -> bool:
+        """TinyLFU：候选键的近期频率高于将被淘汰的键时才写入缓存"""
+        if not self.enabled:
+            return True
+        with self._lock:
+            admitted = self.sketch.estimate(candidate) > self.sketch.estimate(victim)
+        self.stats['admitted' if admitted else 'rejected'] += 1
+        return admitted
+
+    def pinned(self, key: Tuple) -> bool:
+        return self.enabled and key[0] == 'article' and key[1] in self._pinned
+
+    def restore(self, items: List[Tuple[Hashable, int, int]]):
+        """载入快照中的 [(文章ID, 计数, 误差)]：计数写回 Space-Saving，并计入频率 sketch（最多 15 次）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.tracker.load(items)
+            for article_id, count, _ in items[:self.tracker.capacity]:
+                for _ in range(min(count, 15)):
+                    self.sketch.increment(('article', article_id))
+            self._pinned = frozenset(key for key, _, _ in self.tracker.top(self.pin_count))
+            self._pinned_at = time.monotonic()
+
+    # ==================== 查询 ====================
+
+    def top(self, n: int = 20) -> List[dict]:
+        with self._lock:
+            items = self.tracker.top(n)
+        return [{'id': key, 'count': count, 'error': error} for key, count, error in items]
+
+    def snapshot(self) -> dict:
+        return {**self.stats, 'enabled': self.enabled, 'tracked': len(self.tracker),
+                'pinned': len(self._pinned), 'sketch_resets': self.sketch.resets}
+
+
+hot_articles = HotArticles()
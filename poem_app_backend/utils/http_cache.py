@@ -0,0 +1,174 @@
+"""
+读接口的 HTTP 缓存与压缩
+
+- conditional_response: 由文章的 updated_at / like_count 等版本戳计算弱 ETag（无需先序列化响应体），
+  命中 If-None-Match 时直接返回 304；同时设置 Last-Modified、Cache-Control 与 Vary。
+- ResponseCompressor: after_request 钩子，对超过阈值的 JSON/文本响应做 gzip 压缩
+  （安装了 brotli 且客户端支持时优先使用 br），带 ETag 的热点响应缓存压缩结果。
+"""
+
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Callable, Optional, Union
+
+from flask import current_app, request
+
+from utils.json_provider import feed_fragments
+from utils.timestamps import parse_timestamp
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，缺失时只提供 gzip
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript'}
+
+
+def _stamp(row: dict) -> tuple:
+    """单行数据的版本戳：文章行使用与片段缓存相同的版本键，其余小字典（如点赞信息）使用全部字段"""
+    key = feed_fragments.version_key(row)
+    if key is not None:
+        return key
+    return tuple(sorted((k, repr(v)) for k, v in row.items()))
+
+
+def compute_etag(rows: Union[list, dict, None], private: bool = False) -> str:
+    """根据请求路径与各行版本戳计算弱 ETag 的值（不含 W/ 前缀与引号）"""
+    if rows is None:
+        rows = []
+    elif isinstance(rows, Mapping):
+        rows = [rows]
+    digest = hashlib.blake2b(digest_size=12)
+    digest.update(request.full_path.encode('utf-8'))
+    if private:
+        # 私有响应按身份区分，避免不同用户共享同一个 ETag
+        digest.update(b'\0' + (request.headers.get('Authorization') or '').encode('utf-8'))
+    for row in rows:
+        digest.update(b'\0' + repr(_stamp(row)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _last_modified(rows: Union[list, dict, None]):
+    if isinstance(rows, Mapping):
+        rows = [rows]
+    stamps = [parse_timestamp(row.get('updated_at') or row.get('created_at')) for row in rows or []]
+    stamps = [stamp for stamp in stamps if stamp is not None]
+    return max(stamps) if stamps else None
+
+
+def conditional_response(rows: Union[list, dict, None], build: Callable, private: bool = False,
+                         extra_stamp: Optional[str] = None):
+    """
+    条件 GET 响应
+
+    Args:
+        rows: 响应所依据的数据行（列表或单个字典），用于计算 ETag 与 Last-Modified
+        build: 无参函数，返回真正的响应对象；命中 304 时不会被调用
+        private: 是否为用户相关的私有响应（影响 Cache-Control 与 ETag）
+        extra_stamp: 额外参与 ETag 计算的版本信息
+    """
+    etag = compute_etag(rows, private)
+    if extra_stamp:
+        etag = hashlib.blake2b(f'{etag}:{extra_stamp}'.encode('utf-8'), digest_size=12).hexdigest()
+
+    max_age = current_app.config.get('HTTP_CACHE_MAX_AGE', 0)
+    cache_control = f"{'private' if private else 'public'}, max-age={max_age}, must-revalidate"
+    last_modified = _last_modified(rows)
+
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = build()
+        if isinstance(response, tuple):
+            response = current_app.make_response(response)
+
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = cache_control
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.vary.add('Authorization')
+    return response
+
+
+class ResponseCompressor:
+    """响应压缩（after_request），带 ETag 的响应在 LRU 中缓存压缩结果"""
+
+    def __init__(self, min_size: int = 1024, cache_bytes: int = 8 * 1024 * 1024):
+        self.min_size = min_size
+        self.cache_bytes = cache_bytes
+        self._cache: 'OrderedDict[tuple, bytes]' = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', self.min_size)
+        self.cache_bytes = app.config.get('COMPRESS_CACHE_BYTES', self.cache_bytes)
+        app.after_request(self.compress_response)
+
+    def _choose_encoding(self) -> Optional[str]:
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    @staticmethod
+    def _compress(data: bytes, encoding: str) -> bytes:
+        if encoding == 'br':
+            return brotli.compress(data, quality=5)
+        return gzip.compress(data, compresslevel=6, mtime=0)
+
+    def _cache_get(self, key):
+        with self._lock:
+            body = self._cache.get(key)
+            if body is not None:
+                self._cache.move_to_end(key)
+            return body
+
+    def _cache_put(self, key, body: bytes):
+        if len(body) > self.cache_bytes // 4:
+            return
+        with self._lock:
+            if key in self._cache:
+                return
+            self._cache[key] = body
+            self._cached_bytes += len(body)
+            while self._cached_bytes > self.cache_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_bytes -= len(evicted)
+
+    def compress_response(self, response):
+        if (response.status_code != 200
+                or response.direct_passthrough
+                or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self._choose_encoding()
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        etag, _ = response.get_etag()
+        cache_key = (etag, encoding) if etag else None
+        body = self._cache_get(cache_key) if cache_key else None
+        if body is None:
+            body = self._compress(data, encoding)
+            if cache_key:
+                self._cache_put(cache_key, body)
+
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+response_compressor = ResponseCompressor()
@@ -0,0 +1,113 @@
+"""
+列表/详情接口的 include 参数
+
+客户端在 ?include=likes,author_stats 中声明需要的附加数据，一次请求填满一个页面，
+不必再调用 /api/articles/likes/batch：
+- likes: {文章ID: {'article_id', 'like_count', 'is_liked_by_user'}}，与批量点赞接口的结构一致；
+- author_stats: {作者ID: {'article_count', 'total_likes'}}。
+
+文章查询与调用者的点赞记录查询互不依赖，并发执行后在服务端合并。
+附加数据放在响应的同级字段中，不写入文章字典，文章片段缓存因此不受调用者身份影响。
+"""
+
+from typing import Callable, Optional, Set, Tuple
+
+from flask import request
+
+from models.supabase_client import supabase_client
+
+INCLUDE_OPTIONS = ('likes', 'author_stats')
+
+
+def requested_includes() -> Set[str]:
+    raw = request.args.get('include') or ''
+    return {name.strip() for name in raw.split(',')} & set(INCLUDE_OPTIONS)
+
+
+def caller_device_id() -> Optional[str]:
+    return request.args.get('device_id') or request.headers.get('X-Device-ID')
+
+
+def _likes_map(articles: list, liked: set) -> dict:
+    return {
+        article['id']: {
+            'article_id': article['id'],
+            'like_count': article.get('like_count') or 0,
+            'is_liked_by_user': article['id'] in liked
+        }
+        for article in articles
+    }
+
+
+def _liked_ids(articles: list, prefetched: Tuple[set, bool], user_id: Optional[str], device_id: Optional[str]) -> set:
+    """用预取的最近点赞补全当前页；预取被截断时只为未命中的文章补查一次"""
+    liked, complete = prefetched
+    if complete:
+        return liked
+    missing = [article['id'] for article in articles if article['id'] not in liked]
+    extra, _ = supabase_client.get_liked_article_ids(user_id, device_id, article_ids=missing)
+    return liked | extra
+
+
+def fetch_list(fetch_articles: Callable[[], list], user_id: Optional[str] = None) -> Tuple[list, dict, bool]:
+    """
+    执行文章列表查询并按 include 参数附加数据
+
+    Returns:
+        (articles, extra, personalized): extra 为需要合并进响应的字段，
+        personalized 表示响应包含调用者相关的数据（应作为私有响应缓存）
+    """
+    includes = requested_includes()
+    device_id = caller_device_id()
+    wants_likes = 'likes' in includes
+
+    if wants_likes and (user_id or device_id):
+        # 文章与调用者最近的点赞记录并发查询
+        articles, prefetched = supabase_client.fan_out(
+            fetch_articles,
+            lambda: supabase_client.get_liked_article_ids(user_id, device_id)
+        )
+    else:
+        articles = fetch_articles()
+        prefetched = (set(), True)
+
+    # 第二轮依赖文章列表：作者统计与（预取被截断时的）点赞补查并发执行
+    calls = {}
+    if wants_likes:
+        calls['likes'] = lambda: _likes_map(articles, _liked_ids(articles, prefetched, user_id, device_id))
+    if 'author_stats' in includes:
+        calls['author_stats'] = lambda: supabase_client.get_author_stats([article.get('user_id') for article in articles])
+    extra = dict(zip(calls, supabase_client.fan_out(*calls.values()))) if calls else {}
+    return articles, extra, wants_likes and bool(user_id or device_id)
+
+
+def fetch_detail(article_id: str, user_id: Optional[str] = None) -> Tuple[Optional[dict], dict, bool]:
+    """单篇文章 + include 附加数据，文章与调用者的点赞记录并发查询"""
+    includes = requested_includes()
+    device_id = caller_device_id()
+    wants_likes = 'likes' in includes
+    personalized = wants_likes and bool(user_id or device_id)
+
+    if personalized:
+        article, (liked, _) = supabase_client.fan_out(
+            lambda: supabase_client.get_article_cached(article_id),
+            lambda: supabase_client.get_liked_article_ids(user_id, device_id, [article_id])
+        )
+    else:
+        article, liked = supabase_client.get_article_cached(article_id), set()
+    if not article:
+        return None, {}, personalized
+
+    extra = {}
+    if wants_likes:
+        extra['likes'] = _likes_map([article], liked)
+    if 'author_stats' in includes:
+        extra['author_stats'] = supabase_client.get_author_stats([article.get('user_id')])
+    return article, extra, personalized
+
+
+def extra_stamp(extra: dict) -> Optional[str]:
+    """附加数据参与 ETag 计算的版本信息"""
+    if not extra:
+        return None
+    return repr(sorted((key, sorted(value.items()) if isinstance(value, dict) else value) for key, value in extra.items()))
@@ -0,0 +1,248 @@
+"""
+实时点赞数推送（GET /api/articles/stream 的 SSE 数据源）
+
+- 订阅 article_events 的 liked 事件，按文章合并：每篇文章每个 LIVE_LIKES_INTERVAL 最多推送一次最新计数；
+- 每个连接一个有界缓冲区（LIVE_LIKES_BUFFER_SIZE），客户端读得慢时丢弃最旧的事件并记录丢弃数，
+  连接据此发送 overflow 事件，提示客户端用批量接口重新拉取一次；
+- 多 worker：处理点赞的 worker 把 (文章ID, 计数) 写入共享的 SQLite 频道（WAL，位于 SHARED_STATE_DIR），
+  每个 worker 的后台线程按自增ID增量读取其他进程写入的事件；没有连接时只推进水位，不读取内容。
+  变更订阅（change_feed）转来的点赞每个 worker 都会收到，只在本进程内推送，不写入频道。
+
+SSE 连接会长时间占用处理它的 worker。gunicorn 使用 gevent worker（GUNICORN_WORKER_CLASS=gevent）时
+连接只占用一个协程；同步 worker 每个只能同时处理一个请求，几个长连接就会占满全部 worker，
+因此同步 worker 下不建立长连接，直接返回 204（EventSource 收到 204 不再重连），
+并用 X-Poll-Interval 提示客户端每 LIVE_LIKES_POLL_SECONDS 秒轮询一次批量接口。
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from utils.article_events import article_events
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS live_like_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    article_id TEXT NOT NULL,
+    like_count INTEGER NOT NULL,
+    pid INTEGER NOT NULL,
+    ts REAL NOT NULL
+);
+"""
+
+
+def cooperative_worker() -> bool:
+    """当前进程是否运行在 gevent 协程 worker 中（socket 已被 monkey patch）"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('socket')
+
+
+class Subscription:
+    """一个 SSE 连接关注的文章及其有界事件缓冲区"""
+
+    def __init__(self, article_ids: Iterable[str], buffer_size: int = 64):
+        self.article_ids = frozenset(article_ids)
+        self.dropped = 0
+        self._events = deque(maxlen=buffer_size)
+        self._cond = threading.Condition()
+
+    def push(self, event: dict):
+        with self._cond:
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append(event)
+            self._cond.notify()
+
+    def next_batch(self, timeout: float) -> Tuple[List[dict], int]:
+        """等待最多 timeout 秒，返回 (缓冲的事件, 自上次读取以来丢弃的事件数)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._events or self.dropped, timeout)
+            events = list(self._events)
+            self._events.clear()
+            dropped, self.dropped = self.dropped, 0
+        return events, dropped
+
+
+class LikeStream:
+    def __init__(self):
+        self.path: Optional[str] = None
+        self.interval = 1.0
+        self.buffer_size = 64
+        self.max_subscribers = 500
+        self.keepalive_seconds = 15.0
+        self.poll_seconds = 15
+        self.retention_seconds = 60.0
+        self.stats = {'published': 0, 'received': 0, 'pushed': 0, 'coalesced': 0}
+
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._count = 0
+        self._pending: Dict[str, int] = {}
+        self._watermark = 0
+        self._worker_pid: Optional[int] = None
+        self._last_cleanup = 0.0
+
+    def init_app(self, app):
+        config = app.config
+        self.interval = config.get('LIVE_LIKES_INTERVAL', self.interval)
+        self.buffer_size = config.get('LIVE_LIKES_BUFFER_SIZE', self.buffer_size)
+        self.max_subscribers = config.get('LIVE_LIKES_MAX_SUBSCRIBERS', self.max_subscribers)
+        self.keepalive_seconds = config.get('LIVE_LIKES_KEEPALIVE_SECONDS', self.keepalive_seconds)
+        self.poll_seconds = config.get('LIVE_LIKES_POLL_SECONDS', self.poll_seconds)
+        self.path = config.get('LIVE_LIKES_PATH')
+        if self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = self._connect()
+            try:
+                conn.executescript(SCHEMA)
+            finally:
+                conn.close()
+        article_events.subscribe(self.on_article_event)
+        app.before_request(self.ensure_worker)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    # ==================== 发布 ====================
+
+    def on_article_event(self, event: str, payload):
+        if event == 'liked' and payload.get('like_count') is not None:
+            self.publish(payload['id'], payload['like_count'], shared=payload.get('source') != 'change_feed')
+
+    def publish(self, article_id: str, like_count: int, shared: bool = True):
+        """发布一篇文章的最新点赞数；shared 时同时写入共享频道通知其他 worker"""
+        self.stats['published'] += 1
+        if shared and self.path:
+            conn = self._connect()
+            try:
+                conn.execute(
+                    'INSERT INTO live_like_events (article_id, like_count, pid, ts) VALUES (?, ?, ?, ?)',
+                    (article_id, like_count, os.getpid(), time.time())
+                )
+            finally:
+                conn.close()
+        self._stage(article_id, like_count)
+
+    def _stage(self, article_id: str, like_count: int):
+        # 本进程没有连接关注的文章直接忽略；同一周期内的多次变化只保留最后一次
+        with self._lock:
+            if article_id not in self._subscribers:
+                return
+            if article_id in self._pending:
+                self.stats['coalesced'] += 1
+            self._pending[article_id] = like_count
+
+    def flush(self):
+        """把本周期合并后的计数推送给关注这些文章的连接"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            targets = [(article_id, like_count, list(self._subscribers.get(article_id, ())))
+                       for article_id, like_count in pending.items()]
+        for article_id, like_count, subscriptions in targets:
+            event = {'id': article_id, 'like_count': like_count}
+            for subscription in subscriptions:
+                subscription.push(event)
+                self.stats['pushed'] += 1
+
+    # ==================== 订阅 ====================
+
+    def subscribe(self, article_ids: Iterable[str]) -> Optional[Subscription]:
+        """注册一个连接；本进程的连接数已满时返回 None"""
+        subscription = Subscription(article_ids, self.buffer_size)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                return None
+            self._count += 1
+            for article_id in subscription.article_ids:
+                self._subscribers.setdefault(article_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._count -= 1
+            for article_id in subscription.article_ids:
+                subscriptions = self._subscribers.get(article_id)
+                if subscriptions is not None:
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del self._subscribers[article_id]
+                        self._pending.pop(article_id, None)
+
+    # ==================== 跨 worker 频道 ====================
+
+    def receive(self):
+        """读取其他 worker 写入频道的事件；本进程没有连接时只推进水位"""
+        if not self.path:
+            return
+        conn = self._connect()
+        try:
+            if time.time() - self._last_cleanup > self.retention_seconds:
+                # 频道只用于实时转发，各 worker 顺带清理超过保留时间的事件即可
+                conn.execute('DELETE FROM live_like_events WHERE ts < ?', (time.time() - self.retention_seconds,))
+                self._last_cleanup = time.time()
+            if not self._subscribers:
+                self._skip_to_latest(conn)
+                return
+            rows = conn.execute(
+                'SELECT id, article_id, like_count, pid FROM live_like_events WHERE id > ? ORDER BY id LIMIT 5000',
+                (self._watermark,)
+            ).fetchall()
+        finally:
+            conn.close()
+        pid = os.getpid()
+        for event_id, article_id, like_count, source_pid in rows:
+            self._watermark = event_id
+            if source_pid != pid:
+                self.stats['received'] += 1
+                self._stage(article_id, like_count)
+
+    def _skip_to_latest(self, conn: sqlite3.Connection):
+        row = conn.execute('SELECT MAX(id) FROM live_like_events').fetchone()
+        self._watermark = max(self._watermark, row[0] or 0)
+
+    def ensure_worker(self):
+        """确保当前进程中运行着合并推送线程（fork 之后需要重新启动）"""
+        if self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker_pid == os.getpid():
+                return
+            self._worker_pid = os.getpid()
+            self._pending = {}
+            self._watermark = 0
+        if self.path:
+            # 新进程只转发启动之后的事件
+            conn = self._connect()
+            try:
+                self._skip_to_latest(conn)
+            finally:
+                conn.close()
+        threading.Thread(target=self._run, name='live-likes', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.receive()
+                self.flush()
+            except Exception as e:
+                print(f"Live likes error: {e}")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, 'subscribers': self._count, 'articles': len(self._subscribers),
+                    'watermark': self._watermark}
+
+
+like_stream = LikeStream()
@@ -1,81 +1,83 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from flask import current_app
+from models.supabase_client import supabase_client
+from utils.email_templates import email_templates
+from utils.mail_outbox import mail_outbox
+
+def build_message(to_email: str, subject: str, text_body: str, html_body: str = None) -> bytes:
+    """构造 MIME 邮件（纯文本 + 可选 HTML），返回可直接投递的字节"""
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
+    from email.policy import SMTP
+
+    msg = MIMEMultipart('alternative')
+    msg['From'] = current_app.config['EMAIL_USERNAME']
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    
+    # 添加纯文本版本
+    msg.attach(MIMEText(text_body, 'plain', 'utf-8'))
+    
+    # 如果提供了HTML版本，添加HTML部分
+    if html_body:
+        msg.attach(MIMEText(html_body, 'html', 'utf-8'))
+    
+    # SMTP 策略使用 CRLF 换行：字节形式的邮件不会再被 smtplib 转换行尾
+    return msg.as_bytes(policy=SMTP)
 
 def send_email(to_email: str, subject: str, text_body: str, html_body: str = None):
-    """发送邮件（支持HTML和纯文本）"""
+    """
+    发送邮件（支持HTML和纯文本）
+    邮件写入发件箱后立即返回，由后台线程通过复用的 SMTP 连接投递；
+    未初始化发件箱时（如独立脚本）退回同步发送。
+    """
     try:
-        # 创建邮件对象
-        msg = MIMEMultipart('alternative')
-        msg['From'] = current_app.config['EMAIL_USERNAME']
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        # 添加纯文本版本
-        text_part = MIMEText(text_body, 'plain', 'utf-8')
-        msg.attach(text_part)
-        
-        # 如果提供了HTML版本，添加HTML部分
-        if html_body:
-            html_part = MIMEText(html_body, 'html', 'utf-8')
-            msg.attach(html_part)
-        
-        # 连接SMTP服务器
-        server = smtplib.SMTP(current_app.config['EMAIL_SERVER'], current_app.config['EMAIL_PORT'])
-        server.starttls()
-        
-        # 登录
-        server.login(current_app.config['EMAIL_USERNAME'], current_app.config['EMAIL_PASSWORD'])
-        
-        # 发送邮件
-        text = msg.as_string()
-        server.sendmail(current_app.config['EMAIL_USERNAME'], to_email, text)
-        
-        # 关闭连接
-        server.quit()
-        
+        message = build_message(to_email, subject, text_body, html_body)
+        if mail_outbox.enabled:
+            mail_outbox.enqueue(to_email, message, current_app.config['EMAIL_USERNAME'])
+        else:
+            _send_now(to_email, message)
         return True
-        
     except Exception as e:
         return False
 
+def _send_now(to_email: str, message: bytes):
+    """同步发送（建立连接、STARTTLS、登录、发送、断开）"""
+    import smtplib
+
+    server = smtplib.SMTP(current_app.config['EMAIL_SERVER'], current_app.config['EMAIL_PORT'])
+    try:
+        server.starttls()
+        server.login(current_app.config['EMAIL_USERNAME'], current_app.config['EMAIL_PASSWORD'])
+        server.sendmail(current_app.config['EMAIL_USERNAME'], to_email, message)
+    finally:
+        server.quit()
+
 def send_welcome_email(email: str, username: str):
     """发送欢迎邮件"""
-    subject = "欢迎加入诗篇"
-    body = f"""
-    亲爱的 {username}，
-    
-    欢迎加入诗篇！这是一个让您的诗词创作绽放光彩的地方。
-    
-    在这里，您可以：
-    - 创作和分享您的诗词文章
-    - 享受AI智能排版的美学体验
-    - 与其他创作者交流互动
-    - 下载精美的图文作品
-    
-    开始您的创作之旅吧！
-    
-    诗篇团队
-    """
-    
-    return send_email(email, subject, body)
+    try:
+        email_templates.send('welcome', email, username=username)
+        return True
+    except Exception as e:
+        return False
 
 def send_password_reset_email(email: str, reset_url: str):
     """发送密码重置邮件"""
-    subject = "诗篇 - 密码重置"
-    body = f"""
-    您好，
-    
-    您请求重置密码。请点击以下链接重置密码：
-    
-    {reset_url}
-    
-    此链接将在1小时后失效。
-    
-    如果这不是您的操作，请忽略此邮件。
-    
-    诗篇团队
+    try:
+        email_templates.send('password_reset', email, reset_url=reset_url)
+        return True
+    except Exception as e:
+        return False
+
+def send_announcement(subject: str, title: str, paragraphs: list, batch_size: int = 500):
     """
-    
-    return send_email(email, subject, body) 
\ No newline at end of file
+    向全部用户发送公告/摘要邮件
+    模板按本次公告内容只编译一次；用户分页读取，邮件边生成边写入发件箱，不会一次性构造全部邮件。
+    返回入队数量。
+    """
+    compiled = email_templates.compile('announcement', subject=subject, title=title, paragraphs=paragraphs)
+    recipients = (
+        {'to': user['email'], 'username': user.get('username') or user['email'].split('@')[0]}
+        for user in supabase_client.iter_users(batch_size=batch_size)
+        if user.get('email')
+    )
+    return email_templates.send_bulk(compiled, recipients)
@@ -0,0 +1,436 @@
+"""
+邮件发件箱
+
+请求线程只负责把已经构造好的邮件写入本地持久化队列（SQLite，WAL 模式，所有 gunicorn worker 共享同一文件），
+由后台发送线程异步投递：
+- 同一时刻只有一个进程持有文件锁并负责发送，避免重复投递，也让整个实例只保持一条 SMTP 连接；
+- SMTP 连接在批次之间保持登录状态并复用，空闲超过 MAIL_SMTP_IDLE_SECONDS 后关闭；
+- 失败按指数退避重试，收件人地址错误（550/551/553 且扩展状态码为 5.1.x）或超过最大次数后标记为 failed；
+- 额度用尽（如 Gmail 的 550 5.4.5）、策略拒绝（5.7.x）与认证失败（530/535）不是某封邮件的问题：
+  已领取的邮件放回队列且不计重试次数，整个队列按指数退避暂停（最长 MAIL_PAUSE_MAX_SECONDS），不会把积压的邮件全部标记失败；
+- 按 MAIL_SEND_RATE_PER_MINUTE 限制发送速率；
+- 两个优先级：enqueue 写入的单封邮件（重置密码、欢迎邮件）为事务邮件，enqueue_many 写入的公告、摘要为批量邮件。
+  事务邮件总是先发；发送批量邮件时每封之前检查是否有到期的事务邮件，有则把已领取的批量邮件放回队列，
+  一次公告不会让重置密码邮件排在几千封公告之后。
+"""
+
+import atexit
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from typing import Iterable, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows 开发环境没有 fcntl，单进程运行时直接视为持有锁
+    fcntl = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS mail_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    to_addr TEXT NOT NULL,
+    from_addr TEXT,
+    message BLOB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    locked_until REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_mail_outbox_due ON mail_outbox(status, next_attempt_at);
+"""
+
+# 数值越小越先发送
+PRIORITY_TRANSACTIONAL = 0
+PRIORITY_BULK = 1
+
+
+# 扩展状态码（RFC 3463）：5.1.x 为地址错误，5.7.x 为安全/策略，x.4.5 为系统拥塞（Gmail 用于发送额度）
+_ENHANCED_STATUS_RE = re.compile(rb'^\s*([245])\.(\d{1,3})\.(\d{1,3})')
+
+
+class PermanentMailError(Exception):
+    """不可重试的投递错误（收件人地址被拒绝）"""
+
+
+class MailServiceUnavailable(Exception):
+    """邮件服务暂时拒绝发送任何邮件（额度用尽、策略限制、认证失败），整个队列暂停"""
+
+
+def classify_smtp_error(code: int, message) -> Optional[Exception]:
+    """
+    把 SMTP 错误响应分类：返回 PermanentMailError（收件人错误）、MailServiceUnavailable（暂停整个队列），
+    或 None（只有这一封邮件按退避重试）
+    """
+    if isinstance(message, str):
+        message = message.encode('utf-8', 'replace')
+    message = message or b''
+    text = f"{code} {message.decode('utf-8', 'replace')}"
+    status = _ENHANCED_STATUS_RE.match(message)
+    subject = status.group(2) if status else None
+    if code in (530, 535) or subject == b'7' or (status and status.group(2, 3) == (b'4', b'5')):
+        return MailServiceUnavailable(text)
+    if code in (550, 551, 553) and subject == b'1':
+        return PermanentMailError(text)
+    return None
+
+
+class MailOutbox:
+    """持久化邮件队列 + 后台 SMTP 发送线程"""
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self.server = 'smtp.gmail.com'
+        self.port = 587
+        self.username: Optional[str] = None
+        self.password: Optional[str] = None
+        self.use_tls = True
+        self.batch_size = 20
+        self.max_attempts = 6
+        self.retry_base_seconds = 30.0
+        self.rate_per_minute = 20
+        self.idle_seconds = 120.0
+        self.poll_seconds = 5.0
+        self.lease_seconds = 300.0
+        self.pause_max_seconds = 3600.0
+        self.paused_until = 0.0
+        self.pause_reason: Optional[str] = None
+        self._pauses = 0
+
+        self._sender_pid: Optional[int] = None
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        self._lock_file = None
+        self._smtp = None
+        self._smtp_last_used = 0.0
+        self._last_send_at = 0.0
+
+    # ==================== 配置与队列 ====================
+
+    def init_app(self, app):
+        config = app.config
+        self.path = config['MAIL_OUTBOX_PATH']
+        self.server = config['EMAIL_SERVER']
+        self.port = config['EMAIL_PORT']
+        self.username = config.get('EMAIL_USERNAME')
+        self.password = config.get('EMAIL_PASSWORD')
+        self.use_tls = config.get('EMAIL_USE_TLS', True)
+        self.batch_size = config.get('MAIL_BATCH_SIZE', self.batch_size)
+        self.max_attempts = config.get('MAIL_MAX_ATTEMPTS', self.max_attempts)
+        self.retry_base_seconds = config.get('MAIL_RETRY_BASE_SECONDS', self.retry_base_seconds)
+        self.rate_per_minute = config.get('MAIL_SEND_RATE_PER_MINUTE', self.rate_per_minute)
+        self.idle_seconds = config.get('MAIL_SMTP_IDLE_SECONDS', self.idle_seconds)
+        self.pause_max_seconds = config.get('MAIL_PAUSE_MAX_SECONDS', self.pause_max_seconds)
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.executescript(SCHEMA)
+            # 旧版本创建的队列没有 priority 列，已有邮件都按事务邮件处理
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(mail_outbox)')}
+            if 'priority' not in columns:
+                conn.execute('ALTER TABLE mail_outbox ADD COLUMN priority INTEGER NOT NULL DEFAULT 0')
+        finally:
+            conn.close()
+
+        # 重启后队列中可能还有未发出的邮件：每个 worker 的第一个请求负责拉起发送线程
+        app.before_request(self.ensure_sender)
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def enqueue(self, to_addr: str, message: bytes, from_addr: Optional[str] = None,
+                priority: int = PRIORITY_TRANSACTIONAL) -> int:
+        """写入一封邮件，返回队列ID"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                'INSERT INTO mail_outbox (to_addr, from_addr, message, next_attempt_at, created_at, priority) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (to_addr, from_addr or self.username, message, now, now, priority)
+            )
+            queued_id = cursor.lastrowid
+        finally:
+            conn.close()
+        self._notify()
+        return queued_id
+
+    def enqueue_many(self, messages: Iterable[Tuple[str, bytes]], chunk_size: int = 200,
+                     from_addr: Optional[str] = None, priority: int = PRIORITY_BULK) -> int:
+        """
+        批量写入邮件（如摘要、公告）。messages 可以是生成器：按 chunk_size 分段写入，
+        任何时刻内存中最多只有一段邮件。默认为批量优先级，排在事务邮件之后。返回写入数量。
+        """
+        conn = self._connect()
+        total = 0
+        try:
+            chunk = []
+            for to_addr, message in messages:
+                now = time.time()
+                chunk.append((to_addr, from_addr or self.username, message, now, now, priority))
+                if len(chunk) >= chunk_size:
+                    total += self._insert_chunk(conn, chunk)
+                    chunk = []
+                    self._notify()
+            if chunk:
+                total += self._insert_chunk(conn, chunk)
+        finally:
+            conn.close()
+        self._notify()
+        return total
+
+    @staticmethod
+    def _insert_chunk(conn: sqlite3.Connection, chunk: list) -> int:
+        conn.execute('BEGIN')
+        conn.executemany(
+            'INSERT INTO mail_outbox (to_addr, from_addr, message, next_attempt_at, created_at, priority) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            chunk
+        )
+        conn.execute('COMMIT')
+        return len(chunk)
+
+    def stats(self) -> dict:
+        """各状态的邮件数量"""
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT status, COUNT(*) FROM mail_outbox GROUP BY status').fetchall()
+        finally:
+            conn.close()
+        return dict(rows)
+
+    # ==================== 后台发送 ====================
+
+    def _notify(self):
+        self.ensure_sender()
+        self._wakeup.set()
+
+    def ensure_sender(self):
+        """确保当前进程中运行着发送线程（fork 之后需要重新启动）"""
+        if not self.enabled or self._sender_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._sender_pid == os.getpid():
+                return
+            self._sender_pid = os.getpid()
+            self._wakeup = threading.Event()
+            self._lock_file = None
+            self._smtp = None
+            thread = threading.Thread(target=self._run, name='mail-outbox-sender', daemon=True)
+            thread.start()
+            atexit.register(self._close_smtp)
+
+    def _acquire_leadership(self) -> bool:
+        """非阻塞地获取发送者文件锁；锁随进程退出自动释放，其他进程会在下一轮轮询时接管"""
+        if self._lock_file is not None:
+            return True
+        if fcntl is None:
+            self._lock_file = True
+            return True
+        lock_file = open(self.path + '.lock', 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                if self._acquire_leadership():
+                    self._drain()
+                if self._smtp is not None and time.time() - self._smtp_last_used > self.idle_seconds:
+                    self._close_smtp()
+            except Exception as e:
+                print(f"Mail outbox sender error: {e}")
+            self._wakeup.wait(self.poll_seconds)
+            self._wakeup.clear()
+
+    def _drain(self):
+        """持续发送到期邮件，直到队列中没有可发送的邮件（或邮件服务要求暂停）"""
+        if time.time() < self.paused_until:
+            return
+        conn = self._connect()
+        try:
+            while True:
+                batch = self._claim_batch(conn)
+                if not batch:
+                    return
+                for index, (row_id, to_addr, from_addr, message, attempts, priority) in enumerate(batch):
+                    if priority > PRIORITY_TRANSACTIONAL and self._transactional_due(conn):
+                        # 有事务邮件在等待：放回剩余的批量邮件，重新按优先级领取
+                        self._release(conn, [row[0] for row in batch[index:]])
+                        break
+                    self._respect_rate_limit()
+                    try:
+                        self._deliver(from_addr, to_addr, message)
+                    except MailServiceUnavailable as e:
+                        # 与这封邮件无关：全部放回队列，暂停整个发送
+                        self._close_smtp()
+                        self._release(conn, [row[0] for row in batch[index:]])
+                        self._pause(str(e))
+                        return
+                    except PermanentMailError as e:
+                        self._mark_failed(conn, row_id, attempts, str(e), permanent=True)
+                    except Exception as e:
+                        self._close_smtp()
+                        self._mark_failed(conn, row_id, attempts, str(e))
+                    else:
+                        conn.execute('DELETE FROM mail_outbox WHERE id = ?', (row_id,))
+                        self._pauses = 0
+        finally:
+            conn.close()
+
+    def _claim_batch(self, conn: sqlite3.Connection) -> list:
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # 领取到期的 pending 邮件，以及上一个发送者崩溃后租约过期的 sending 邮件
+            rows = conn.execute(
+                """SELECT id, to_addr, from_addr, message, attempts, priority FROM mail_outbox
+                   WHERE (status = 'pending' AND next_attempt_at <= ?)
+                      OR (status = 'sending' AND locked_until < ?)
+                   ORDER BY priority, id LIMIT ?""",
+                (now, now, self.batch_size)
+            ).fetchall()
+            if rows:
+                conn.executemany(
+                    "UPDATE mail_outbox SET status = 'sending', locked_until = ? WHERE id = ?",
+                    [(now + self.lease_seconds, row[0]) for row in rows]
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return rows
+
+    @staticmethod
+    def _transactional_due(conn: sqlite3.Connection) -> bool:
+        row = conn.execute(
+            "SELECT 1 FROM mail_outbox WHERE status = 'pending' AND next_attempt_at <= ? AND priority = ? LIMIT 1",
+            (time.time(), PRIORITY_TRANSACTIONAL)
+        ).fetchone()
+        return row is not None
+
+    @staticmethod
+    def _release(conn: sqlite3.Connection, row_ids: list):
+        """把已领取但尚未发送的邮件放回队列（不计入重试次数）"""
+        conn.executemany(
+            "UPDATE mail_outbox SET status = 'pending', locked_until = NULL WHERE id = ? AND status = 'sending'",
+            [(row_id,) for row_id in row_ids]
+        )
+
+    def _pause(self, reason: str):
+        """暂停整个队列：从 MAIL_RETRY_BASE_SECONDS 起每次加倍，最长 pause_max_seconds，发送成功后复位"""
+        delay = min(self.retry_base_seconds * (2 ** self._pauses), self.pause_max_seconds)
+        self._pauses += 1
+        self.paused_until = time.time() + delay
+        self.pause_reason = reason[:500]
+        print(f"邮件服务暂时不可用，{delay:.0f} 秒后重试: {reason}")
+
+    def _mark_failed(self, conn: sqlite3.Connection, row_id: int, attempts: int, error: str, permanent: bool = False):
+        attempts += 1
+        if permanent or attempts >= self.max_attempts:
+            conn.execute(
+                "UPDATE mail_outbox SET status = 'failed', attempts = ?, last_error = ?, locked_until = NULL WHERE id = ?",
+                (attempts, error[:500], row_id)
+            )
+            return
+        # 指数退避 + 抖动，上限 6 小时
+        delay = min(self.retry_base_seconds * (2 ** (attempts - 1)), 6 * 3600) * random.uniform(0.8, 1.2)
+        conn.execute(
+            "UPDATE mail_outbox SET status = 'pending', attempts = ?, last_error = ?, next_attempt_at = ?, locked_until = NULL WHERE id = ?",
+            (attempts, error[:500], time.time() + delay, row_id)
+        )
+
+    def _respect_rate_limit(self):
+        if not self.rate_per_minute:
+            return
+        interval = 60.0 / self.rate_per_minute
+        wait = self._last_send_at + interval - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        self._last_send_at = time.time()
+
+    # ==================== SMTP 连接 ====================
+
+    def _get_smtp(self):
+        """返回已登录的 SMTP 连接，空闲过久的连接先用 NOOP 探活"""
+        import smtplib
+
+        if self._smtp is not None:
+            if time.time() - self._smtp_last_used < 30:
+                return self._smtp
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except smtplib.SMTPException:
+                pass
+            except OSError:
+                pass
+            self._close_smtp()
+
+        smtp = smtplib.SMTP(self.server, self.port, timeout=30)
+        smtp.ehlo()
+        if self.use_tls:
+            # 不看 EHLO 中是否声明 STARTTLS：中间人去掉该扩展时 starttls() 报错，而不是明文登录
+            smtp.starttls()
+            smtp.ehlo()
+        if self.username and self.password:
+            smtp.login(self.username, self.password)
+        self._smtp = smtp
+        self._smtp_last_used = time.time()
+        return smtp
+
+    def _deliver(self, from_addr: Optional[str], to_addr: str, message: bytes):
+        import smtplib
+
+        try:
+            smtp = self._get_smtp()
+            mail_options = ('BODY=8BITMIME',) if smtp.has_extn('8bitmime') else ()
+            smtp.sendmail(from_addr or self.username, [to_addr], message, mail_options=mail_options)
+        except smtplib.SMTPRecipientsRefused as e:
+            # 只有一个收件人：按它的响应分类（额度用尽也可能在 RCPT 阶段返回）
+            code, reply = next(iter(e.recipients.values()))
+            error = classify_smtp_error(code, reply)
+            if error is not None:
+                raise error from e
+            raise
+        except smtplib.SMTPResponseException as e:
+            error = classify_smtp_error(e.smtp_code, e.smtp_error)
+            if error is not None:
+                raise error from e
+            raise
+        self._smtp_last_used = time.time()
+
+    def _close_smtp(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is None:
+            return
+        try:
+            smtp.quit()
+        except Exception:
+            try:
+                smtp.close()
+            except Exception:
+                pass
+
+
+mail_outbox = MailOutbox()
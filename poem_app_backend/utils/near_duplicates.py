@@ -0,0 +1,258 @@
+"""
+近似重复诗词检测（MinHash + LSH）
+
+- 签名：正文去掉标点与空白后取字符三元组，crc32 哈希后经 128 个 (a·x + b) mod p 置换取最小值；
+  两篇文章签名中相同位置相等的比例即 Jaccard 相似度的估计。
+- LSH：签名切成 16 段、每段 8 个值，任意一段完全相同即成为候选（命中概率 1-(1-s⁸)¹⁶：
+  相似度 0.8 时约 94.7%，0.9 时 > 99.9%），候选再用完整签名估计相似度，发布时的检查在亚毫秒级完成。
+- 内存索引订阅 article_events 增量维护；签名同时写入 article_signatures 表，
+  存量文章由 backfill_minhash.py 流式回填。
+
+重复处理策略 DUPLICATE_POLICY：off 不检查，flag 允许发布但在响应中标记，reject 返回 409。
+索引包含私密文章（作者修改自己的文章时仍需比对），但返回给发布者的 duplicate_of 只包含公开文章或发布者自己的文章，
+不会泄露其他用户私密文章的ID；可见性以数据库中的最新状态为准（本 worker 的索引可能没有收到其他 worker 的可见性变更）。
+依赖 NumPy（与相关推荐相同的可选依赖），未安装时检查直接跳过。
+"""
+
+import base64
+import importlib.util
+import re
+import threading
+import zlib
+from typing import Dict, List, Optional, Set, Tuple
+
+from utils.article_events import article_events
+
+_STRIP_RE = re.compile(r'[\W_]+', re.UNICODE)
+
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+def normalize_content(text: str) -> str:
+    """去掉标点、空白并转小写，换行或标点不同的同一首诗视为相同"""
+    return _STRIP_RE.sub('', text or '').lower()
+
+
+class NearDuplicateIndex:
+    # 按数据库确认可见性的最多候选数
+    MAX_VERIFIED = 10
+
+    def __init__(self, num_perm: int = 128, bands: int = 16, shingle_size: int = 3, seed: int = 20241219):
+        assert num_perm % bands == 0
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.seed = seed
+        self.policy = 'flag'
+        self.threshold = 0.8
+        self.enabled = True
+
+        self._lock = threading.Lock()
+        self._coefficients = None
+        self._signatures: Dict[str, object] = {}                 # 文章ID -> uint32 签名
+        self._owners: Dict[str, Optional[str]] = {}              # 文章ID -> 作者ID
+        self._private: Set[str] = set()                          # 私密文章ID
+        self._buckets: List[Dict[bytes, Set[str]]] = [{} for _ in range(bands)]
+
+    def init_app(self, app):
+        self.policy = app.config.get('DUPLICATE_POLICY', self.policy)
+        self.threshold = app.config.get('DUPLICATE_THRESHOLD', self.threshold)
+        if self.policy == 'off':
+            self.enabled = False
+            return
+        if importlib.util.find_spec('numpy') is None:
+            print("numpy 未安装，跳过近似重复检测")
+            self.enabled = False
+            return
+        article_events.subscribe(self.on_article_event)
+
+    # ==================== 签名 ====================
+
+    def _permutations(self):
+        if self._coefficients is None:
+            import numpy as np
+
+            rng = np.random.RandomState(self.seed)
+            a = rng.randint(1, MERSENNE_PRIME, size=self.num_perm, dtype=np.uint64)
+            b = rng.randint(0, MERSENNE_PRIME, size=self.num_perm, dtype=np.uint64)
+            self._coefficients = (a, b)
+        return self._coefficients
+
+    def signature(self, content: str):
+        """计算正文的 MinHash 签名，正文过短时返回 None"""
+        import numpy as np
+
+        text = normalize_content(content)
+        size = self.shingle_size
+        if len(text) < size:
+            return None
+        hashes = np.fromiter(
+            {zlib.crc32(text[i:i + size].encode('utf-8')) for i in range(len(text) - size + 1)},
+            dtype=np.uint64
+        ) % MERSENNE_PRIME
+        a, b = self._permutations()
+        # (n_shingles, num_perm) 的置换结果按列取最小值
+        permuted = (hashes[:, None] * a[None, :] + b[None, :]) % MERSENNE_PRIME
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature) -> List[bytes]:
+        rows = self.rows
+        return [signature[i * rows:(i + 1) * rows].tobytes() for i in range(self.bands)]
+
+    @staticmethod
+    def encode(signature) -> str:
+        return base64.b64encode(signature.tobytes()).decode('ascii')
+
+    @staticmethod
+    def decode(value: str):
+        import numpy as np
+
+        return np.frombuffer(base64.b64decode(value), dtype=np.uint32)
+
+    # ==================== 索引维护 ====================
+
+    def add(self, article_id: str, signature, user_id: Optional[str] = None, private: bool = False):
+        with self._lock:
+            self._remove_locked(article_id)
+            if signature is None:
+                return
+            self._signatures[article_id] = signature
+            self._owners[article_id] = user_id
+            if private:
+                self._private.add(article_id)
+            for band, key in zip(self._buckets, self._band_keys(signature)):
+                band.setdefault(key, set()).add(article_id)
+
+    def remove(self, article_id: Optional[str]):
+        if article_id:
+            with self._lock:
+                self._remove_locked(article_id)
+
+    def _remove_locked(self, article_id: str):
+        signature = self._signatures.pop(article_id, None)
+        self._owners.pop(article_id, None)
+        self._private.discard(article_id)
+        if signature is None:
+            return
+        for band, key in zip(self._buckets, self._band_keys(signature)):
+            members = band.get(key)
+            if members is not None:
+                members.discard(article_id)
+                if not members:
+                    del band[key]
+
+    def on_article_event(self, event: str, article):
+        if event in ('loaded', 'created', 'updated'):
+            article_id = article.get('id')
+            if not article_id:
+                return
+            private = article.get('is_public_visible') is False
+            if 'content' not in article:
+                # 只修改了可见性等字段
+                if 'is_public_visible' in article:
+                    with self._lock:
+                        if private and article_id in self._signatures:
+                            self._private.add(article_id)
+                        else:
+                            self._private.discard(article_id)
+                return
+            signature = self.signature(article.get('content'))
+            self.add(article_id, signature, article.get('user_id'), private=private)
+            if event != 'loaded' and signature is not None:
+                self._persist_async(article_id, signature)
+        elif event == 'deleted':
+            self.remove(article.get('id'))
+
+    # ==================== 查询 ====================
+
+    def find(self, content: str, exclude_id: Optional[str] = None, signature=None) -> List[Tuple[str, float, Optional[str]]]:
+        """返回相似度不低于阈值的已有文章 [(文章ID, 估计相似度, 作者ID)]，按相似度从高到低"""
+        if not self.enabled:
+            return []
+        if signature is None:
+            signature = self.signature(content)
+        if signature is None:
+            return []
+        with self._lock:
+            candidates = set()
+            for band, key in zip(self._buckets, self._band_keys(signature)):
+                members = band.get(key)
+                if members:
+                    candidates.update(members)
+            candidates.discard(exclude_id)
+            matches = []
+            for article_id in candidates:
+                similarity = float((self._signatures[article_id] == signature).mean())
+                if similarity >= self.threshold:
+                    matches.append((article_id, round(similarity, 3), self._owners.get(article_id)))
+        matches.sort(key=lambda item: -item[1])
+        return matches
+
+    def check(self, content: str, exclude_id: Optional[str] = None, user_id: Optional[str] = None):
+        """
+        发布/修改前的检查，返回 (是否拒绝, 重复信息)。
+        重复信息为 None 或 {'article_id', 'similarity'}（取发布者可见的最相似的一篇）。
+        其他用户的私密文章不参与比较。
+        """
+        with self._lock:
+            private = set(self._private)
+        matches = [
+            (article_id, similarity, owner) for article_id, similarity, owner in self.find(content, exclude_id=exclude_id)
+            if (user_id and owner == user_id) or article_id not in private
+        ]
+        matches = self._visible_matches(matches, user_id)
+        if not matches:
+            return False, None
+        article_id, similarity, _ = matches[0]
+        duplicate = {'article_id': article_id, 'similarity': similarity}
+        return self.policy == 'reject', duplicate
+
+    def _visible_matches(self, matches: list, user_id: Optional[str]) -> list:
+        """按数据库中的可见性再过滤一次（其他 worker 上改为私密或删除的文章），查询失败时沿用索引中的状态"""
+        if not matches:
+            return matches
+        from models.supabase_client import supabase_client
+
+        matches = matches[:self.MAX_VERIFIED]
+        try:
+            rows = {row['id']: row for row in supabase_client.get_articles_by_ids([match[0] for match in matches])}
+        except Exception as e:
+            print(f"近似重复检查读取文章失败: {e}")
+            return matches
+        return [
+            match for match in matches
+            if match[0] in rows and (rows[match[0]].get('is_public_visible') is not False
+                                     or (user_id and rows[match[0]].get('user_id') == user_id))
+        ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'policy': self.policy,
+                'signatures': len(self._signatures),
+                'private': len(self._private),
+                'buckets': sum(len(band) for band in self._buckets)
+            }
+
+    def _persist_async(self, article_id: str, signature):
+        from models.supabase_client import supabase_client
+
+        duplicates = self.find('', exclude_id=article_id, signature=signature)
+        row = {
+            'article_id': article_id,
+            'signature': self.encode(signature),
+            'duplicate_of': duplicates[0][0] if duplicates else None,
+            'similarity': duplicates[0][1] if duplicates else None
+        }
+
+        def persist():
+            try:
+                supabase_client.upsert_article_signatures([row])
+            except Exception as e:
+                print(f"保存 MinHash 签名失败: {e}")
+
+        threading.Thread(target=persist, name='minhash-persist', daemon=True).start()
+
+
+near_duplicates = NearDuplicateIndex()
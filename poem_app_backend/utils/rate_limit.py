@@ -0,0 +1,211 @@
+"""
+令牌桶限流（生成图片、上传、登录等耗时或消耗第三方额度的接口）
+
+规则来自 RATE_LIMITS（"<蓝图或端点>=<次数>/<秒数>[:<突发>]"，逗号分隔），端点规则（如 auth.login）
+优先于所在蓝图的规则（如 generate）。每个 (端点, 用户) 一个令牌桶：登录用户按 user_id，匿名请求按 IP。
+超限返回 429 与 Retry-After。
+
+跨 worker 的令牌桶保存在 SHARED_STATE_DIR 下的 SQLite 中（WAL，BEGIN IMMEDIATE 串行化扣减）。
+高频规则不必每个请求都访问 SQLite：worker 一次从共享桶中预取约 RATE_LIMIT_LEASE_SECONDS 秒的令牌，
+放进本地 deque，之后的请求直接 popleft（deque 的 append/popleft 在 CPython 中是原子操作，不需要加锁）；
+预取的令牌超过租期未用完即作废，避免被某个 worker 长期占住。低频规则（每秒不到一个令牌）每次都访问共享桶。
+每个桶记录按当前速率回满的时间（full_at），只清理已经回满的桶；闲置时间不能作为依据，
+generate=10/86400 这样的慢规则闲置一小时远未回满，删除等于提前重置。
+"""
+
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+import jwt
+from flask import current_app, jsonify, request
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    full_at REAL NOT NULL DEFAULT 0
+);
+"""
+
+
+def parse_rules(text: str) -> Dict[str, Tuple[float, float]]:
+    """"generate=10/60:5" -> {'generate': (每秒令牌数, 桶容量)}"""
+    rules = {}
+    for item in (text or '').split(','):
+        name, _, spec = item.partition('=')
+        if not name.strip() or not spec:
+            continue
+        rate, _, burst = spec.partition(':')
+        count, _, seconds = rate.partition('/')
+        count = float(count)
+        rules[name.strip()] = (count / float(seconds or 1), float(burst) if burst else count)
+    return rules
+
+
+class RateLimiter:
+    def __init__(self):
+        self.enabled = True
+        self.path: Optional[str] = None
+        self.rules: Dict[str, Tuple[float, float]] = {}
+        self.lease_seconds = 1.0
+        self.stats = {'allowed': 0, 'limited': 0, 'leased': 0, 'shared_calls': 0}
+
+        self._lock = threading.Lock()
+        self._local: Dict[str, Tuple[float, float, float]] = {}   # 未配置共享存储时的进程内桶 (令牌, 更新时间, 回满时间)
+        self._leases: Dict[str, deque] = {}
+        self._last_cleanup = 0.0
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get('RATE_LIMIT_ENABLED', True)
+        self.rules = parse_rules(config.get('RATE_LIMITS', ''))
+        self.lease_seconds = config.get('RATE_LIMIT_LEASE_SECONDS', self.lease_seconds)
+        self.path = config.get('RATE_LIMIT_PATH')
+        if self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = self._connect()
+            try:
+                conn.executescript(SCHEMA)
+                columns = {row[1] for row in conn.execute('PRAGMA table_info(rate_limit_buckets)')}
+                if 'full_at' not in columns:
+                    # 旧行视为已回满，下一次清理时删除（与原来按闲置时间清理的效果相同）
+                    conn.execute('ALTER TABLE rate_limit_buckets ADD COLUMN full_at REAL NOT NULL DEFAULT 0')
+            finally:
+                conn.close()
+        app.before_request(self.check_request)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    # ==================== 请求入口 ====================
+
+    def rule_for(self, endpoint: Optional[str]) -> Optional[Tuple[str, Tuple[float, float]]]:
+        if not endpoint:
+            return None
+        if endpoint in self.rules:
+            return endpoint, self.rules[endpoint]
+        blueprint = endpoint.rpartition('.')[0]
+        if blueprint in self.rules:
+            return blueprint, self.rules[blueprint]
+        return None
+
+    @staticmethod
+    def identity() -> str:
+        """登录用户按 user_id 限流，否则按客户端 IP（经 ProxyFix 按可信代理层数解析，客户端无法自行指定）"""
+        auth_header = request.headers.get('Authorization', '')
+        if ' ' in auth_header:
+            try:
+                payload = jwt.decode(auth_header.split(' ', 1)[1], current_app.config['SECRET_KEY'], algorithms=['HS256'])
+                return f"user:{payload['user_id']}"
+            except (jwt.InvalidTokenError, KeyError):
+                pass
+        return f"ip:{request.remote_addr or ''}"
+
+    def check_request(self):
+        """before_request：命中规则且超限时直接返回 429"""
+        if not self.enabled or request.method == 'OPTIONS':
+            return None
+        matched = self.rule_for(request.endpoint)
+        if matched is None:
+            return None
+        _, (rate, burst) = matched
+        allowed, retry_after = self.acquire(f'{request.endpoint}:{self.identity()}', rate, burst)
+        if allowed:
+            return None
+        response = jsonify({'error': '请求过于频繁，请稍后再试'})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(max(math.ceil(retry_after), 1))
+        return response
+
+    # ==================== 令牌桶 ====================
+
+    def acquire(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        """取一个令牌，返回 (是否允许, 不允许时建议的等待秒数)"""
+        lease = self._leases.get(key)
+        if lease:
+            try:
+                expires_at = lease.popleft()
+            except IndexError:
+                expires_at = 0.0
+            if expires_at > time.monotonic():
+                self.stats['allowed'] += 1
+                return True, 0.0
+
+        # 每次预取一个租期内的令牌量（至少一个）
+        want = max(1, min(int(rate * self.lease_seconds), int(burst)))
+        granted, retry_after = self._take_shared(key, rate, burst, want) if self.path else \
+            self._take_local(key, rate, burst, want)
+        if not granted:
+            self.stats['limited'] += 1
+            return False, retry_after
+        self.stats['allowed'] += 1
+        if granted > 1:
+            expires_at = time.monotonic() + self.lease_seconds
+            if len(self._leases) > 10000:
+                self._leases = {k: v for k, v in self._leases.items() if v and v[-1] > time.monotonic()}
+            self._leases[key] = deque([expires_at] * (granted - 1))
+            self.stats['leased'] += granted - 1
+        return True, 0.0
+
+    @staticmethod
+    def _refill(tokens: float, updated_at: float, now: float, rate: float, burst: float) -> float:
+        return min(burst, tokens + max(now - updated_at, 0.0) * rate)
+
+    @staticmethod
+    def _full_at(tokens: float, now: float, rate: float, burst: float) -> float:
+        """剩余 tokens 个令牌时，桶按 rate 回满的时间；回满之后删除与不存在等价"""
+        return now + max(burst - tokens, 0.0) / rate
+
+    def _take_local(self, key: str, rate: float, burst: float, want: int) -> Tuple[int, float]:
+        now = time.time()
+        with self._lock:
+            tokens, updated_at, _ = self._local.get(key, (burst, now, now))
+            tokens = self._refill(tokens, updated_at, now, rate, burst)
+            granted = min(want, int(tokens))
+            self._local[key] = (tokens - granted, now, self._full_at(tokens - granted, now, rate, burst))
+            if len(self._local) > 10000:
+                self._local = {k: v for k, v in self._local.items() if v[2] > now}
+        return granted, (0.0 if granted else (1 - tokens) / rate)
+
+    def _take_shared(self, key: str, rate: float, burst: float, want: int) -> Tuple[int, float]:
+        self.stats['shared_calls'] += 1
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            # 拿到写锁之后再取时间，否则等锁的进程会把 updated_at 往回写，同一段时间被重复补充令牌
+            now = time.time()
+            row = conn.execute('SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?', (key,)).fetchone()
+            tokens = self._refill(*(row or (burst, now)), now, rate, burst)
+            granted = min(want, int(tokens))
+            conn.execute('INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)',
+                         (key, tokens - granted, now, self._full_at(tokens - granted, now, rate, burst)))
+            if now - self._last_cleanup > 3600:
+                # 只删除已经回满的桶，慢规则的桶保留到真正回满为止
+                conn.execute('DELETE FROM rate_limit_buckets WHERE full_at <= ?', (now,))
+                self._last_cleanup = now
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+        return granted, (0.0 if granted else (1 - tokens) / rate)
+
+    def snapshot(self) -> dict:
+        return {**self.stats, 'enabled': self.enabled, 'rules': {
+            name: {'per_second': rate, 'burst': burst} for name, (rate, burst) in self.rules.items()
+        }}
+
+
+rate_limiter = RateLimiter()
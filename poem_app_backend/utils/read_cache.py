@@ -0,0 +1,218 @@
+"""
+热点读取的合并与缓存
+
+- SingleFlight：同一键的并发读取只执行一次查询，其余调用者等待并共享结果（或异常）；
+- ReadCache：在 SingleFlight 之上的 stale-while-revalidate 缓存。
+  条目在 ttl 内直接返回；过期后的 stale 秒内仍返回旧值，同时在后台刷新（每个键只有一个刷新线程），
+  超过 ttl + stale 才由请求同步加载。热点文章或首页过期时不会出现大量请求同时打到数据库。
+
+写操作通过 article_events 使缓存失效：drop 立即删除，mark_stale 只把条目标记为过期（下次读取触发后台刷新）。
+失效与加载并发时，用代数（generation）丢弃失效之前开始的加载结果，避免旧数据被写回；
+单个键的失效版本只在该键有加载进行中时记录，最后一个加载结束后即删除。
+
+可选的 policy（utils/heavy_hitters.HotArticles）决定缓存满时的准入与淘汰：
+每次读取调用 policy.record(key)；新键只有 policy.admit(新键, 淘汰候选) 为真才写入；
+淘汰时从最久未使用的一端跳过 policy.pinned(key) 为真的条目。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self.stats = {'calls': 0, 'shared': 0}
+
+    def do(self, key: Hashable, fn: Callable, timeout: Optional[float] = None):
+        """执行 fn()，同一时刻相同 key 的调用共享同一次执行的结果"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.stats['calls'] += 1
+            else:
+                self.stats['shared'] += 1
+        if leader:
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+        return future.result(timeout=timeout)
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+class ReadCache:
+    # 淘汰时最多向后查看的条目数，全部被钉住时淘汰最久未使用的一条
+    VICTIM_SCAN = 16
+
+    def __init__(self, flights: Optional[SingleFlight] = None, max_entries: int = 2000, policy=None):
+        self.flights = flights or SingleFlight()
+        self.max_entries = max_entries
+        self.policy = policy
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0, 'not_admitted': 0}
+
+        self._lock = threading.Lock()
+        # 键 -> (值, 获取时间, ttl, stale)；键为元组，第一个元素是类别（'article'、'feed' 等）
+        self._entries: 'OrderedDict[Tuple, Tuple[object, float, float, float]]' = OrderedDict()
+        self._refreshing = set()
+        self._generation = 0
+        # 正在加载的键 -> (进行中的加载数, 失效版本)；没有加载进行时不保留
+        self._loading: Dict[Tuple, List[int]] = {}
+
+    def get(self, key: Tuple, fn: Callable, ttl: float, stale: float = 0.0):
+        """读取缓存，必要时调用 fn() 加载；ttl 为 0 时不缓存，只合并并发读取"""
+        if ttl <= 0:
+            return self.flights.do(key, fn)
+        if self.policy is not None:
+            self.policy.record(key)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, fetched_at, entry_ttl, entry_stale = entry
+            age = time.monotonic() - fetched_at
+            if age < entry_ttl:
+                self.stats['hits'] += 1
+                self._touch(key)
+                return value
+            if age < entry_ttl + entry_stale:
+                self.stats['stale_hits'] += 1
+                self._touch(key)
+                self._refresh_async(key, fn, ttl, stale)
+                return value
+        self.stats['misses'] += 1
+        return self._load(key, fn, ttl, stale)
+
+    def _touch(self, key: Tuple):
+        """命中的条目移到最近使用的一端，淘汰时按最后使用时间而不是写入顺序"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+
+    def _load(self, key: Tuple, fn: Callable, ttl: float, stale: float):
+        with self._lock:
+            loading = self._loading.setdefault(key, [0, 0])
+            loading[0] += 1
+            generation, version = self._generation, loading[1]
+        try:
+            value = self.flights.do(key, fn)
+        except BaseException:
+            with self._lock:
+                self._finish_load_locked(key, loading)
+            raise
+        with self._lock:
+            self._finish_load_locked(key, loading)
+            if generation == self._generation and version == loading[1]:
+                entries = self._entries
+                if key not in entries and len(entries) >= self.max_entries and self.policy is not None:
+                    victim = self._victim_locked()
+                    if victim is not None and not self.policy.admit(key, victim):
+                        self.stats['not_admitted'] += 1
+                        return value
+                entries[key] = (value, time.monotonic(), ttl, stale)
+                entries.move_to_end(key)
+                while len(entries) > self.max_entries:
+                    entries.pop(self._victim_locked())
+        return value
+
+    def _finish_load_locked(self, key: Tuple, loading: List[int]):
+        loading[0] -= 1
+        if loading[0] == 0:
+            del self._loading[key]
+
+    def _victim_locked(self) -> Optional[Tuple]:
+        """从最久未使用的一端选择淘汰的键，跳过被钉住的热点"""
+        oldest = None
+        for index, key in enumerate(self._entries):
+            if oldest is None:
+                oldest = key
+            if self.policy is None or not self.policy.pinned(key):
+                return key
+            if index >= self.VICTIM_SCAN:
+                break
+        return oldest
+
+    def _refresh_async(self, key: Tuple, fn: Callable, ttl: float, stale: float):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        self.stats['refreshes'] += 1
+
+        def refresh():
+            try:
+                self._load(key, fn, ttl, stale)
+            except Exception as e:
+                # 熔断期间的刷新失败是预期的，旧值继续保留
+                if not getattr(e, 'retry_after', None):
+                    print(f"后台刷新缓存失败 {key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name='read-cache-refresh', daemon=True).start()
+
+    def last_good(self, key: Tuple) -> Optional[Tuple[object, float]]:
+        """最后一次成功加载的值及其年龄（秒），不论是否过期；没有时返回 None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return entry[0], time.monotonic() - entry[1]
+
+    def entries(self, kind: str) -> List[Tuple[Tuple, object]]:
+        """某一类别的全部 (键, 值)，按最久未使用到最近使用的顺序"""
+        with self._lock:
+            return [(key, entry[0]) for key, entry in self._entries.items() if key[0] == kind]
+
+    def prime(self, key: Tuple, value, ttl: float, stale: float) -> bool:
+        """
+        放入一个已过期但仍在 stale 窗口内的条目（例如从快照恢复的数据）：
+        第一次读取直接返回它并在后台刷新；键已存在或缓存已满时不放入
+        """
+        with self._lock:
+            if key in self._entries or len(self._entries) >= self.max_entries:
+                return False
+            self._entries[key] = (value, time.monotonic() - ttl, ttl, stale)
+            return True
+
+    # ==================== 失效 ====================
+
+    def drop(self, key: Tuple):
+        with self._lock:
+            self._entries.pop(key, None)
+            loading = self._loading.get(key)
+            if loading is not None:
+                loading[1] += 1
+
+    def drop_kind(self, kind: str):
+        """删除某一类别的全部条目，并让正在进行的加载结果作废"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == kind]:
+                del self._entries[key]
+            self._generation += 1
+
+    def mark_stale(self, kind: str):
+        """把某一类别的条目标记为已过期：下次读取先返回旧值并在后台刷新"""
+        with self._lock:
+            for key, (value, fetched_at, ttl, stale) in list(self._entries.items()):
+                if key[0] == kind:
+                    self._entries[key] = (value, min(fetched_at, time.monotonic() - ttl), ttl, stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def snapshot(self) -> dict:
+        return {**self.stats, 'entries': len(self._entries), 'in_flight': self.flights.in_flight(),
+                'coalesced': self.flights.stats['shared']}
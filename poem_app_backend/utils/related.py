@@ -0,0 +1,340 @@
+"""
+相关诗词推荐
+
+- 向量化：标题与正文按字符二元组、三元组切分，经 crc32 哈希到固定维度（跨进程稳定），
+  词频取 1 + log(tf)，乘以 IDF 后做 L2 归一化；出现在一半以上文档中的 n-gram 视为停用词丢弃。
+- 离线构建（build_related.py）：分块计算 X_block · Xᵀ，每行用 argpartition 取前 k 个邻居，
+  结果写入 article_related 表，详情页的相关推荐只需一次主键查询。
+- 增量插入：新发布/修改的公开文章用当前 IDF 向量化，与内存中的矩阵相乘得到邻居，
+  同时更新已缓存邻居列表中得分更低的项；新向量先放在待合并列表中，攒够一批后并入矩阵，
+  合并时顺带剔除已删除/被替换的旧行。矩阵构建完成前到达的变更按文章暂存，构建后重放。
+- 回写 article_related 只由执行写入的进程完成（变更订阅转来的事件不回写），
+  标题与正文未变化的更新（如只换图片）不重新计算。
+
+NumPy / SciPy 为可选依赖：未安装时不构建内存矩阵，只读取 article_related 表中的离线结果。
+"""
+
+import importlib.util
+import re
+import threading
+import time
+import zlib
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.article_events import article_events
+
+_RUN_RE = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]+|[A-Za-z0-9]+')
+
+Neighbours = List[Tuple[str, float]]
+
+
+def shingles(text: str, sizes: Tuple[int, ...] = (2, 3)) -> Iterable[str]:
+    """字符 n-gram：中日韩文字串按字切分，拉丁单词整体作为一个单元（转小写）"""
+    for match in _RUN_RE.finditer(text or ''):
+        run = match.group()
+        if run.isascii():
+            yield run.lower()
+            continue
+        for size in sizes:
+            for i in range(len(run) - size + 1):
+                yield run[i:i + size]
+
+
+def article_text(article: dict) -> str:
+    return f"{article.get('title') or ''}\n{article.get('content') or ''}"
+
+
+class RelatedIndex:
+    def __init__(self, n_features: int = 1 << 18, top_k: int = 10):
+        self.n_features = n_features
+        self.top_k = top_k
+        self.max_df = 0.5
+        self.merge_threshold = 256
+        self.cache_size = 20000
+        self.enabled = True
+        self.ready = False
+
+        self._lock = threading.Lock()
+        self._reset_pending()
+        self._ids: List[str] = []          # 矩阵行号 -> 文章ID
+        self._rows: Dict[str, int] = {}    # 文章ID -> 矩阵行号
+        self._matrix = None                # 已归一化的 TF-IDF CSR 矩阵
+        self._idf = None
+        self._appended: list = []          # 尚未并入矩阵的增量行
+        self._appended_ids: List[str] = []
+        self._dead_rows = set()            # 已删除/已被新版本替换的矩阵行
+        self._neighbours: Dict[str, Neighbours] = {}
+        self._fingerprints: Dict[str, int] = {}    # 文章ID -> 标题与正文的 crc32，用于跳过未改动内容的更新
+        # 矩阵构建完成前到达的 created/updated/deleted，按文章只保留最后一条，构建后重放
+        self._early_lock = threading.Lock()
+        self._early: Dict[str, Tuple[str, dict, bool]] = {}
+
+    def _reset_pending(self):
+        # 启动扫描中收集的特征，以 CSR 三元组的形式紧凑存放，避免为每篇文章保留一个字典
+        self._pending_ids: List[str] = []
+        self._pending_indices = array('i')
+        self._pending_counts = array('f')
+        self._pending_indptr = array('q', [0])
+
+    def init_app(self, app):
+        self.top_k = app.config.get('RELATED_TOP_K', self.top_k)
+        # 只检查是否安装，真正导入推迟到构建矩阵时，避免拖慢冷启动
+        if importlib.util.find_spec('numpy') is None or importlib.util.find_spec('scipy') is None:
+            print("numpy/scipy 未安装，相关推荐只使用 article_related 表中的离线结果")
+            self.enabled = False
+            return
+        article_events.subscribe(self.on_article_event)
+
+    # ==================== 向量化 ====================
+
+    @staticmethod
+    def fingerprint(article: dict) -> int:
+        return zlib.crc32(article_text(article).encode('utf-8'))
+
+    def features(self, article: dict) -> Dict[int, int]:
+        """哈希后的 n-gram 词频（未乘 IDF）"""
+        counts: Dict[int, int] = {}
+        mask = self.n_features - 1
+        for gram in shingles(article_text(article)):
+            bucket = zlib.crc32(gram.encode('utf-8')) & mask
+            counts[bucket] = counts.get(bucket, 0) + 1
+        return counts
+
+    def collect(self, article_id: str, counts: Dict[int, int]):
+        """追加一篇文章的词频，稍后由 build_collected() 一次性构建矩阵"""
+        self._pending_ids.append(article_id)
+        self._pending_indices.extend(counts.keys())
+        self._pending_counts.extend(counts.values())
+        self._pending_indptr.append(len(self._pending_indices))
+
+    def _vectorize(self, indices, counts, indptr):
+        """CSR 三元组 -> 未加权的稀疏矩阵（1 + log tf）"""
+        import numpy as np
+        from scipy import sparse
+
+        counts = np.frombuffer(counts, dtype=np.float32) if isinstance(counts, array) else np.asarray(counts, dtype=np.float32)
+        matrix = sparse.csr_matrix(
+            (1 + np.log(counts), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(indptr) - 1, self.n_features)
+        )
+        matrix.sort_indices()
+        return matrix
+
+    def _vectorize_one(self, counts: Dict[int, int]):
+        return self._vectorize(list(counts.keys()), list(counts.values()), [0, len(counts)])
+
+    def _weight(self, matrix):
+        """乘以 IDF 并按行 L2 归一化"""
+        import numpy as np
+        from scipy import sparse
+
+        weighted = (matrix @ sparse.diags(self._idf)).tocsr()
+        weighted.eliminate_zeros()
+        norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return (sparse.diags(1 / norms).astype(np.float32) @ weighted).tocsr()
+
+    def build_collected(self):
+        """由 collect() 收集的词频构建 IDF 与归一化矩阵"""
+        import numpy as np
+
+        ids = self._pending_ids
+        raw = self._vectorize(self._pending_indices, self._pending_counts, self._pending_indptr)
+        self._reset_pending()
+        df = np.bincount(raw.indices, minlength=self.n_features)
+        n = max(len(ids), 1)
+        idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+        idf[df > self.max_df * n] = 0
+        with self._lock:
+            self._idf = idf
+            self._matrix = self._weight(raw)
+            self._ids = ids
+            self._rows = {article_id: row for row, article_id in enumerate(ids)}
+            self._appended, self._appended_ids = [], []
+            self._dead_rows = set()
+        # 在 _early_lock 内重放并置 ready，之后到达的事件排在重放之后，不会被旧事件覆盖
+        with self._early_lock:
+            early, self._early = self._early, {}
+            self.ready = True
+            for event, article, remote in early.values():
+                self._apply(event, article, remote)
+
+    # ==================== 邻居计算 ====================
+
+    def compute_all(self, block_size: int = 128) -> Iterable[Tuple[str, Neighbours]]:
+        """分块计算全部文章的前 k 个邻居（离线构建用），逐篇产出 (文章ID, 邻居)"""
+        import numpy as np
+
+        matrix, ids, k = self._matrix, self._ids, self.top_k
+        transposed = matrix.T.tocsc()
+        total = matrix.shape[0]
+        for start in range(0, total, block_size):
+            end = min(start + block_size, total)
+            scores = (matrix[start:end] @ transposed).toarray()
+            scores[np.arange(end - start), np.arange(start, end)] = -1   # 排除自身
+            width = min(k, total - 1)
+            if width <= 0:
+                for row in range(start, end):
+                    yield ids[row], []
+                continue
+            top = np.argpartition(-scores, width - 1, axis=1)[:, :width]
+            for offset, candidates in enumerate(top):
+                row_scores = scores[offset, candidates]
+                order = np.argsort(-row_scores)
+                yield ids[start + offset], [
+                    (ids[candidates[i]], round(float(row_scores[i]), 4))
+                    for i in order if row_scores[i] > 0
+                ]
+
+    def _query(self, vector, exclude: str) -> Neighbours:
+        """单个归一化向量与当前矩阵（含待合并行）的前 k 个邻居"""
+        import numpy as np
+
+        candidates: Neighbours = []
+        if self._ids:
+            scores = (self._matrix @ vector.T).toarray().ravel()
+            # 已删除的行可能占据前几名，多取一些再过滤
+            width = min(self.top_k + 1 + len(self._dead_rows), len(scores))
+            for index in np.argpartition(-scores, width - 1)[:width]:
+                if scores[index] > 0 and index not in self._dead_rows and self._ids[index] != exclude:
+                    candidates.append((self._ids[index], round(float(scores[index]), 4)))
+        for row, article_id in zip(self._appended, self._appended_ids):
+            score = float((row @ vector.T).toarray()[0, 0])
+            if score > 0 and article_id != exclude:
+                candidates.append((article_id, round(score, 4)))
+        candidates.sort(key=lambda item: -item[1])
+        return candidates[:self.top_k]
+
+    def insert(self, article: dict) -> Optional[Neighbours]:
+        """增量加入一篇文章，返回它的邻居列表；矩阵尚未构建时返回 None"""
+        article_id = article.get('id')
+        if not self.ready or not article_id:
+            return None
+        vector = self._weight(self._vectorize_one(self.features(article)))
+        with self._lock:
+            self._remove_locked(article_id)
+            self._fingerprints[article_id] = self.fingerprint(article)
+            neighbours = self._query(vector, exclude=article_id)
+            self._appended.append(vector)
+            self._appended_ids.append(article_id)
+            self.remember(article_id, neighbours)
+            # 新文章也可能进入邻居的前 k 名（只更新已缓存的列表，其余等下一次离线构建）
+            for other_id, score in neighbours:
+                cached = self._neighbours.get(other_id)
+                if cached is not None and (len(cached) < self.top_k or score > cached[-1][1]):
+                    merged = [item for item in cached if item[0] != article_id] + [(article_id, score)]
+                    merged.sort(key=lambda item: -item[1])
+                    self._neighbours[other_id] = merged[:self.top_k]
+            self._maybe_merge_locked()
+        return neighbours
+
+    def _maybe_merge_locked(self):
+        if len(self._appended) >= self.merge_threshold or len(self._dead_rows) >= self.merge_threshold:
+            self._merge_locked()
+
+    def _merge_locked(self):
+        """待合并行并入矩阵，同时剔除已删除/被替换的行"""
+        import numpy as np
+        from scipy import sparse
+
+        matrix, ids = self._matrix, self._ids
+        if self._dead_rows:
+            keep = np.setdiff1d(np.arange(len(ids)), np.fromiter(self._dead_rows, dtype=np.int64))
+            matrix = matrix[keep]
+            ids = [ids[row] for row in keep]
+        self._matrix = sparse.vstack([matrix, *self._appended]).tocsr()
+        self._ids = ids + self._appended_ids
+        self._rows = {article_id: row for row, article_id in enumerate(self._ids)}
+        self._appended, self._appended_ids = [], []
+        self._dead_rows = set()
+
+    def remove(self, article_id: Optional[str]):
+        if article_id:
+            with self._lock:
+                self._remove_locked(article_id)
+                if self._matrix is not None:
+                    self._maybe_merge_locked()
+
+    def _remove_locked(self, article_id: str):
+        row = self._rows.pop(article_id, None)
+        if row is not None:
+            self._dead_rows.add(row)
+        self._fingerprints.pop(article_id, None)
+        if article_id in self._appended_ids:
+            position = self._appended_ids.index(article_id)
+            del self._appended[position], self._appended_ids[position]
+        self._neighbours.pop(article_id, None)
+
+    # ==================== 查询与事件 ====================
+
+    def get(self, article_id: str) -> Optional[Neighbours]:
+        return self._neighbours.get(article_id)
+
+    def compute(self, article_id: str) -> Optional[Neighbours]:
+        """用内存矩阵现算一篇已索引文章的邻居（article_related 表中还没有结果时使用）"""
+        if not self.ready:
+            return None
+        with self._lock:
+            row = self._rows.get(article_id)
+            if row is not None:
+                vector = self._matrix[row]
+            elif article_id in self._appended_ids:
+                vector = self._appended[self._appended_ids.index(article_id)]
+            else:
+                return None
+            neighbours = self._query(vector, exclude=article_id)
+            self.remember(article_id, neighbours)
+        return neighbours
+
+    def remember(self, article_id: str, neighbours: Neighbours):
+        """缓存从 article_related 表读到的邻居列表（超过上限时淘汰最早的条目）"""
+        if len(self._neighbours) >= self.cache_size:
+            self._neighbours.pop(next(iter(self._neighbours)), None)
+        self._neighbours[article_id] = neighbours
+
+    def on_article_event(self, event: str, article):
+        if event == 'loaded':
+            if article.get('is_public_visible') is not False:
+                self._fingerprints[article['id']] = self.fingerprint(article)
+                self.collect(article['id'], self.features(article))
+        elif event == 'bootstrapped':
+            started = time.time()
+            self.build_collected()
+            print(f"Related index: {len(self._ids)} vectors in {time.time() - started:.1f}s")
+        elif event in ('created', 'updated', 'deleted') and article.get('id'):
+            remote = article_events.remote
+            with self._early_lock:
+                if not self.ready:
+                    self._early[article['id']] = (event, article, remote)
+                    return
+                self._apply(event, article, remote)
+
+    def _apply(self, event: str, article: dict, remote: bool):
+        article_id = article['id']
+        if event == 'deleted' or article.get('is_public_visible') is False:
+            self.remove(article_id)
+            return
+        with self._lock:
+            unchanged = self._fingerprints.get(article_id) == self.fingerprint(article)
+        if unchanged:
+            return
+        neighbours = self.insert(article)
+        # 变更订阅转来的事件由执行写入的那个进程回写，这里只更新内存
+        if neighbours is not None and not remote:
+            self._persist_async(article_id, neighbours)
+
+    @staticmethod
+    def _persist_async(article_id: str, neighbours: Neighbours):
+        from models.supabase_client import supabase_client
+
+        def persist():
+            try:
+                supabase_client.upsert_related_articles([(article_id, neighbours)])
+            except Exception as e:
+                print(f"保存相关推荐失败: {e}")
+
+        threading.Thread(target=persist, name='related-persist', daemon=True).start()
+
+
+related_index = RelatedIndex()
@@ -0,0 +1,417 @@
+"""
+文章表的本地只读副本（SQLite，WAL，位于 SHARED_STATE_DIR）
+
+公开诗词的总量不大且很少变化，首页、分页列表、作者作品、按作者分组这几个热点读取
+可以直接在本地副本上完成，不必每次经 HTTPS 访问 PostgREST：
+- 同步：持有文件锁的 worker 每 REPLICA_SYNC_SECONDS 按 (updated_at, id) 水位增量拉取变更行，
+  首次为全量拉取；所有 worker 共享同一个文件，读连接开启 mmap，页面由操作系统在进程间共享。
+- 点赞触发器只修改 like_count 而不刷新 updated_at，因此点赞与删除由本进程的 article_events 直接写入副本；
+  like_count_at 记录当前计数被读到的时间（微秒），事件与同步乱序到达时较旧的计数不会覆盖较新的；
+  其他途径（数据库后台、其他服务）的删除与计数变化由每 REPLICA_RECONCILE_SECONDS 一次的全量ID核对修正。
+- 新鲜度：最近一次成功同步超过 REPLICA_MAX_STALENESS 秒时不再使用副本，读取退回 Supabase。
+
+默认关闭（REPLICA_ENABLED），开启后首次全量同步完成前同样退回 Supabase。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+from utils.article_events import article_events
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，缺失时使用标准库
+    orjson = None
+
+try:
+    import fcntl
+except ImportError:  # Windows 开发环境没有 fcntl，单进程运行时直接视为持有锁
+    fcntl = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS replica_articles (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    author TEXT,
+    created_at TEXT,
+    updated_at TEXT,
+    is_public_visible INTEGER,
+    like_count INTEGER NOT NULL DEFAULT 0,
+    like_count_at INTEGER,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS replica_articles_public ON replica_articles (is_public_visible, created_at DESC);
+CREATE INDEX IF NOT EXISTS replica_articles_user ON replica_articles (user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS replica_articles_author ON replica_articles (author, created_at DESC);
+CREATE TABLE IF NOT EXISTS replica_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# 较新的版本才覆盖已有行：事件写入与同步线程可能以任意顺序到达；
+# 点赞不刷新 updated_at，计数单独按 like_count_at 比较
+UPSERT = """
+INSERT INTO replica_articles (id, user_id, author, created_at, updated_at, is_public_visible, like_count, like_count_at, data)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    user_id = excluded.user_id,
+    author = excluded.author,
+    created_at = excluded.created_at,
+    updated_at = excluded.updated_at,
+    is_public_visible = excluded.is_public_visible,
+    like_count = CASE WHEN replica_articles.like_count_at IS NULL OR excluded.like_count_at >= replica_articles.like_count_at
+                      THEN excluded.like_count ELSE replica_articles.like_count END,
+    like_count_at = MAX(excluded.like_count_at, COALESCE(replica_articles.like_count_at, 0)),
+    data = excluded.data
+WHERE replica_articles.updated_at IS NULL OR excluded.updated_at >= replica_articles.updated_at
+"""
+
+SET_LIKE_COUNT = """
+UPDATE replica_articles SET like_count = ?, like_count_at = ?
+WHERE id = ? AND (like_count_at IS NULL OR like_count_at <= ?)
+"""
+
+
+def _dumps(row: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(row)
+    return json.dumps(row, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _loads(data: bytes) -> dict:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _visibility(value) -> Optional[int]:
+    return None if value is None else int(bool(value))
+
+
+def _now_micros() -> int:
+    return int(time.time() * 1_000_000)
+
+
+class ArticleReplica:
+    def __init__(self):
+        self.enabled = False
+        self.path: Optional[str] = None
+        self.sync_seconds = 5.0
+        self.max_staleness = 30.0
+        self.reconcile_seconds = 300.0
+        self.batch_size = 500
+        self.mmap_bytes = 256 * 1024 * 1024
+        self.stats = {'local_reads': 0, 'fallbacks': 0, 'synced_rows': 0, 'reconciled_deletes': 0}
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._worker_pid: Optional[int] = None
+        self._lock_file = None
+        self._last_reconcile = 0.0
+        self._freshness = (0.0, False)             # (检查时间, 是否新鲜)
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get('REPLICA_ENABLED', False)
+        if not self.enabled:
+            return
+        self.path = config.get('REPLICA_PATH')
+        self.sync_seconds = config.get('REPLICA_SYNC_SECONDS', self.sync_seconds)
+        self.max_staleness = config.get('REPLICA_MAX_STALENESS', self.max_staleness)
+        self.reconcile_seconds = config.get('REPLICA_RECONCILE_SECONDS', self.reconcile_seconds)
+        self.batch_size = config.get('ARTICLE_INDEX_BATCH_SIZE', self.batch_size)
+        self.mmap_bytes = config.get('REPLICA_MMAP_BYTES', self.mmap_bytes)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.executescript(SCHEMA)
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(replica_articles)')}
+            if 'like_count_at' not in columns:
+                conn.execute('ALTER TABLE replica_articles ADD COLUMN like_count_at INTEGER')
+        finally:
+            conn.close()
+        article_events.subscribe(self.on_article_event)
+        app.before_request(self.ensure_worker)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA mmap_size={int(self.mmap_bytes)}')
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        """每个线程一个只读连接（fork 之后重新打开）"""
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.conn = self._connect()
+            local.conn.execute('PRAGMA query_only=1')
+            local.pid = os.getpid()
+        return local.conn
+
+    def _writer(self) -> sqlite3.Connection:
+        """每个线程一个写连接，供事件写入复用（fork 之后重新打开）"""
+        local = self._local
+        if getattr(local, 'writer_pid', None) != os.getpid():
+            local.writer = self._connect()
+            local.writer_pid = os.getpid()
+        return local.writer
+
+    def _get_meta(self, conn: sqlite3.Connection, key: str) -> Optional[str]:
+        row = conn.execute('SELECT value FROM replica_meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _set_meta(conn: sqlite3.Connection, key: str, value):
+        conn.execute('INSERT OR REPLACE INTO replica_meta (key, value) VALUES (?, ?)', (key, str(value)))
+
+    # ==================== 新鲜度 ====================
+
+    def fresh(self) -> bool:
+        """副本是否可以用于读取（结果缓存一秒，避免每个请求都查询元数据）"""
+        if not self.enabled:
+            return False
+        checked_at, fresh = self._freshness
+        now = time.time()
+        if now - checked_at < 1.0:
+            return fresh
+        try:
+            last_sync = self._get_meta(self._reader(), 'last_sync')
+        except sqlite3.Error:
+            last_sync = None
+        fresh = last_sync is not None and now - float(last_sync) <= self.max_staleness
+        self._freshness = (now, fresh)
+        return fresh
+
+    def lag(self) -> Optional[float]:
+        try:
+            last_sync = self._get_meta(self._reader(), 'last_sync')
+        except sqlite3.Error:
+            return None
+        return None if last_sync is None else round(time.time() - float(last_sync), 1)
+
+    # ==================== 本地查询 ====================
+
+    def _rows(self, sql: str, params: tuple) -> List[dict]:
+        self.stats['local_reads'] += 1
+        articles = []
+        for data, like_count in self._reader().execute(sql, params):
+            article = _loads(data)
+            article['like_count'] = like_count
+            articles.append(article)
+        return articles
+
+    @staticmethod
+    def _scope(user_id: Optional[str]):
+        """匿名用户只看公开文章，登录用户只看自己的全部文章（与 Supabase 查询一致）"""
+        if user_id is None:
+            return 'is_public_visible = 1', ()
+        return 'user_id = ?', (user_id,)
+
+    def recent_articles(self, limit: int, user_id: Optional[str] = None) -> List[dict]:
+        where, params = self._scope(user_id)
+        return self._rows(
+            f'SELECT data, like_count FROM replica_articles WHERE {where} ORDER BY created_at DESC LIMIT ?',
+            params + (limit,)
+        )
+
+    def page_articles(self, page: int, per_page: int, user_id: Optional[str] = None) -> List[dict]:
+        where, params = self._scope(user_id)
+        return self._rows(
+            f'SELECT data, like_count FROM replica_articles WHERE {where} ORDER BY created_at DESC LIMIT ? OFFSET ?',
+            params + (per_page, max(page - 1, 0) * per_page)
+        )
+
+    def author_articles(self, author: str) -> List[dict]:
+        return self._rows(
+            'SELECT data, like_count FROM replica_articles WHERE author = ? ORDER BY created_at DESC',
+            (author,)
+        )
+
+    def latest_per_author(self, limit: int, user_id: Optional[str] = None) -> List[dict]:
+        """按作者文章数从多到少，每位作者取最新一篇；数量相同时最近发布过的作者在前"""
+        where, params = self._scope(user_id)
+        return self._rows(
+            f"""
+            SELECT data, like_count FROM (
+                SELECT data, like_count, created_at,
+                       COUNT(*) OVER (PARTITION BY author) AS article_count,
+                       ROW_NUMBER() OVER (PARTITION BY author ORDER BY created_at DESC) AS position
+                FROM replica_articles WHERE {where}
+            )
+            WHERE position = 1
+            ORDER BY article_count DESC, created_at DESC
+            LIMIT ?
+            """,
+            params + (limit,)
+        )
+
+    # ==================== 写入 ====================
+
+    @staticmethod
+    def _values(article: dict, observed_at: int) -> tuple:
+        return (
+            article['id'], article.get('user_id'), article.get('author'), article.get('created_at'),
+            article.get('updated_at'), _visibility(article.get('is_public_visible')),
+            article.get('like_count') or 0, observed_at, _dumps(article)
+        )
+
+    def upsert(self, conn: sqlite3.Connection, articles: List[dict], observed_at: Optional[int] = None):
+        """observed_at 为读取这些行的时间（微秒），早于副本中计数时间的 like_count 不会覆盖"""
+        observed_at = observed_at or _now_micros()
+        conn.executemany(UPSERT, [self._values(article, observed_at) for article in articles if article.get('id')])
+
+    def on_article_event(self, event: str, article):
+        """本进程的写操作立即反映到副本，不等待下一轮同步"""
+        if event not in ('created', 'updated', 'deleted', 'liked'):
+            return
+        article_id = (article or {}).get('id')
+        if not article_id:
+            return
+        try:
+            conn = self._writer()
+            if event == 'deleted':
+                conn.execute('DELETE FROM replica_articles WHERE id = ?', (article_id,))
+            elif event == 'liked':
+                observed_at = article.get('observed_at') or _now_micros()
+                conn.execute(SET_LIKE_COUNT, (article.get('like_count') or 0, observed_at, article_id, observed_at))
+            else:
+                self.upsert(conn, [article])
+        except sqlite3.Error as e:
+            print(f"写入文章副本失败: {e}")
+
+    # ==================== 同步 ====================
+
+    def ensure_worker(self):
+        """确保当前进程中运行着同步线程（fork 之后需要重新启动）"""
+        if not self.enabled or self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker_pid == os.getpid():
+                return
+            self._worker_pid = os.getpid()
+            self._lock_file = None
+        threading.Thread(target=self._run, name='replica-sync', daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                # 只有持有文件锁的进程同步；它退出后其他 worker 在下一轮接管
+                if self._acquire_leadership():
+                    self.sync()
+                    if time.time() - self._last_reconcile >= self.reconcile_seconds:
+                        self.reconcile()
+            except Exception as e:
+                print(f"Replica sync error: {e}")
+            time.sleep(self.sync_seconds)
+
+    def _acquire_leadership(self) -> bool:
+        if self._lock_file is not None:
+            return True
+        if fcntl is None:
+            self._lock_file = True
+            return True
+        lock_file = open(self.path + '.lock', 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    @staticmethod
+    def _client():
+        from models.supabase_client import supabase_client
+
+        return supabase_client.service_supabase or supabase_client.supabase
+
+    def sync(self) -> int:
+        """按 (updated_at, id) 水位拉取变更行，返回本轮写入的行数"""
+        client = self._client()
+        conn = self._connect()
+        synced = 0
+        try:
+            watermark = self._get_meta(conn, 'watermark')
+            watermark_id = self._get_meta(conn, 'watermark_id') or ''
+            while True:
+                query = client.table('articles').select('*')
+                if watermark:
+                    query = query.or_(
+                        f'updated_at.gt."{watermark}",and(updated_at.eq."{watermark}",id.gt.{watermark_id})'
+                    )
+                observed_at = _now_micros()
+                rows = query.order('updated_at').order('id').limit(self.batch_size).execute().data or []
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    self.upsert(conn, rows, observed_at)
+                    stamped = [row for row in rows if row.get('updated_at')]
+                    if stamped:
+                        watermark, watermark_id = stamped[-1]['updated_at'], stamped[-1]['id']
+                        self._set_meta(conn, 'watermark', watermark)
+                        self._set_meta(conn, 'watermark_id', watermark_id)
+                    conn.execute('COMMIT')
+                except Exception:
+                    conn.execute('ROLLBACK')
+                    raise
+                synced += len(rows)
+                if len(rows) < self.batch_size or not stamped:
+                    break
+            self._set_meta(conn, 'last_sync', time.time())
+        finally:
+            conn.close()
+        self.stats['synced_rows'] += synced
+        return synced
+
+    def reconcile(self):
+        """全量核对ID与点赞数：清理上游已删除的行，修正不经过本进程的点赞计数"""
+        client = self._client()
+        conn = self._connect()
+        try:
+            # 核对期间新写入的行不在远端快照里，只清理不晚于开始时水位的行
+            cutoff = self._get_meta(conn, 'watermark') or ''
+            observed_at = _now_micros()
+            remote = {}
+            last_id = None
+            while True:
+                query = client.table('articles').select('id, like_count')
+                if last_id is not None:
+                    query = query.gt('id', last_id)
+                rows = query.order('id').limit(self.batch_size * 10).execute().data or []
+                remote.update((row['id'], row.get('like_count') or 0) for row in rows)
+                if len(rows) < self.batch_size * 10:
+                    break
+                last_id = rows[-1]['id']
+
+            local = {
+                article_id: (like_count, updated_at)
+                for article_id, like_count, updated_at in conn.execute('SELECT id, like_count, updated_at FROM replica_articles')
+            }
+            deleted = [(article_id,) for article_id in local.keys() - remote.keys()
+                       if (local[article_id][1] or '') <= cutoff]
+            # 核对开始之后由事件写入的计数更新，不被远端快照覆盖
+            changed = [(count, observed_at, article_id, observed_at) for article_id, count in remote.items()
+                       if article_id in local and local[article_id][0] != count]
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany('DELETE FROM replica_articles WHERE id = ?', deleted)
+            conn.executemany(SET_LIKE_COUNT, changed)
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+        self.stats['reconciled_deletes'] += len(deleted)
+        self._last_reconcile = time.time()
+
+    def snapshot(self) -> dict:
+        if not self.enabled:
+            return {**self.stats, 'enabled': False}
+        return {**self.stats, 'enabled': True, 'fresh': self.fresh(), 'lag_seconds': self.lag()}
+
+
+article_replica = ArticleReplica()
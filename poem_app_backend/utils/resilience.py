@@ -0,0 +1,172 @@
+"""
+Supabase 读取的熔断与降级
+
+- CircuitBreaker：按滑动窗口统计上游调用，错误率（超时、连接失败、5xx，以及超过 slow_call 的慢调用）
+  达到阈值后打开，打开期间的调用立即失败而不再占用 worker；open_seconds 之后进入半开状态，
+  只放行少量探测请求，探测成功则关闭、失败则重新打开。
+- 读路由在熔断打开或上游超时时改为返回热点缓存中最后一次成功的数据，
+  响应体带 stale 字段、响应头带 Warning / X-Stale-Age；没有可用的缓存时返回 503 与 Retry-After。
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from flask import g, has_request_context, jsonify
+
+# PostgREST / PostgreSQL 中表示上游不可用（而不是请求本身有误）的错误码
+UPSTREAM_ERROR_CODES = {'57014', '53300', '57P01', 'PGRST000', 'PGRST001', 'PGRST002', 'PGRST003'}
+
+
+class UpstreamUnavailable(Exception):
+    """上游不可用且没有可以降级返回的缓存数据，读路由返回 503"""
+
+    def __init__(self, message: str = "Supabase 暂时不可用", retry_after: float = 5.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    """熔断打开期间拒绝调用"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Supabase 暂时不可用（熔断中）", retry_after)
+
+
+class UpstreamTimeout(UpstreamUnavailable, TimeoutError):
+    """单次操作超过其超时时间"""
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """只有上游故障计入熔断统计，非法参数等客户端错误不计入"""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    module = type(error).__module__ or ''
+    if module.startswith(('httpx', 'httpcore')):
+        return True
+    code = getattr(error, 'code', None)
+    return isinstance(code, str) and (code in UPSTREAM_ERROR_CODES or code.startswith('5'))
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, name: str, failure_rate: float = 0.5, min_calls: int = 10, window: float = 30.0,
+                 slow_call: float = 2.0, open_seconds: float = 15.0, probes: int = 2):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.slow_call = slow_call
+        self.open_seconds = open_seconds
+        self.probes = probes
+        self.stats = {'opened': 0, 'rejected': 0, 'failures': 0, 'slow_calls': 0}
+
+        self._lock = threading.Lock()
+        self._calls = deque()  # (时间, 是否失败)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def retry_after(self) -> float:
+        if self._state != self.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def before_call(self) -> bool:
+        """
+        调用前检查，返回本次调用是否为半开状态下的探测。
+        熔断打开时抛出 CircuitOpenError。
+        """
+        with self._lock:
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self.stats['rejected'] += 1
+                    raise CircuitOpenError(self.retry_after())
+                self._state = self.HALF_OPEN
+                self._probes_in_flight = 0
+                self._probe_successes = 0
+            if self._state == self.HALF_OPEN:
+                if self._probes_in_flight >= self.probes:
+                    self.stats['rejected'] += 1
+                    raise CircuitOpenError(1.0)
+                self._probes_in_flight += 1
+                return True
+            return False
+
+    def record(self, elapsed: float, error: Optional[BaseException] = None, probe: bool = False):
+        slow = elapsed >= self.slow_call
+        failed = slow or (error is not None and is_upstream_failure(error))
+        now = time.monotonic()
+        with self._lock:
+            if slow:
+                self.stats['slow_calls'] += 1
+            if failed:
+                self.stats['failures'] += 1
+            if probe:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if failed:
+                    self._open_locked(now)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.probes:
+                        self._state = self.CLOSED
+                        self._calls.clear()
+                return
+            if self._state != self.CLOSED:
+                return
+            self._calls.append((now, failed))
+            while self._calls and self._calls[0][0] < now - self.window:
+                self._calls.popleft()
+            if len(self._calls) >= self.min_calls:
+                failures = sum(1 for _, call_failed in self._calls if call_failed)
+                if failures / len(self._calls) >= self.failure_rate:
+                    self._open_locked(now)
+
+    def _open_locked(self, now: float):
+        if self._state != self.OPEN:
+            self.stats['opened'] += 1
+            print(f"熔断器 {self.name} 打开，{self.open_seconds:.0f}s 后探测恢复")
+        self._state = self.OPEN
+        self._opened_at = now
+        self._calls.clear()
+
+    def snapshot(self) -> dict:
+        return {**self.stats, 'state': self._state, 'retry_after': round(self.retry_after(), 1)}
+
+
+# ==================== 降级响应 ====================
+
+def note_stale_read(age: float):
+    """记录本次请求使用了降级数据（取最旧的一份）"""
+    if has_request_context():
+        g.served_stale = max(g.get('served_stale', 0.0), age)
+
+
+def stale_marker() -> dict:
+    """需要合并进响应体的降级标记"""
+    if has_request_context() and 'served_stale' in g:
+        return {'stale': True, 'stale_age': round(g.served_stale, 1)}
+    return {}
+
+
+def add_stale_headers(response):
+    """after_request：降级响应带 Warning 头，并禁止共享缓存保存"""
+    if 'served_stale' in g:
+        response.headers['Warning'] = '110 - "Response is Stale"'
+        response.headers['X-Stale-Age'] = str(int(g.served_stale))
+        response.headers['Cache-Control'] = 'private, max-age=0, must-revalidate'
+    return response
+
+
+def unavailable_response(error: UpstreamUnavailable):
+    response = jsonify({'error': '服务暂时不可用，请稍后重试'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(max(1, int(error.retry_after + 0.5)))
+    return response
@@ -0,0 +1,240 @@
+"""
+诗词全文检索：进程内倒排索引
+
+- 分词：中日韩文字按二元组（bigram）切分，同时保留单字以支持单字查询；拉丁字母/数字按单词切分并转小写。
+  查询时长度 ≥ 2 的中文串只用二元组，单个汉字才用单字。
+- 倒排表：每个词项一个 Posting，文档号以差值（delta）存放在 array('H') 中，
+  差值超过 65535 时整体升级为 array('I')；词频存放在 array('B')。新文档号单调递增，因此增量追加不需要重排。
+- 删除/更新：旧文档号标记为已删除（查询时跳过），已删除比例超过阈值时整体压缩。
+- 排序：BM25，标题、标签、正文按不同权重计入词频。
+- 只索引公开可见的文章；文章转为私密时从索引中移除。
+"""
+
+import math
+import re
+import threading
+from array import array
+from collections import Counter
+from heapq import nlargest
+from itertools import accumulate
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.article_events import article_events
+
+_TOKEN_RE = re.compile(
+    r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]+'  # 中日韩文字串
+    r'|[A-Za-z0-9]+'
+)
+
+# 字段权重：词在标题中出现一次按 3 次计入词频
+FIELD_WEIGHTS = (('title', 3), ('tags', 2), ('content', 1))
+
+
+def tokenize(text: str, unigrams: bool = True) -> Iterable[str]:
+    """切分文本：中文二元组（可选单字）+ 拉丁单词"""
+    for match in _TOKEN_RE.finditer(text or ''):
+        run = match.group()
+        if run.isascii():
+            yield run.lower()
+            continue
+        if len(run) == 1:
+            yield run
+            continue
+        for i in range(len(run) - 1):
+            yield run[i:i + 2]
+        if unigrams:
+            yield from run
+
+
+def query_terms(query: str) -> List[str]:
+    """查询分词：长度 ≥ 2 的中文串只取二元组，去重后保持顺序"""
+    return list(dict.fromkeys(tokenize(query, unigrams=False)))
+
+
+class Posting:
+    """单个词项的倒排表（文档号差值 + 词频）"""
+
+    __slots__ = ('deltas', 'tfs', 'last')
+
+    def __init__(self):
+        self.deltas = array('H')
+        self.tfs = array('B')
+        self.last = 0
+
+    def append(self, docno: int, tf: int):
+        delta = docno - self.last
+        if delta > 0xFFFF and self.deltas.typecode == 'H':
+            self.deltas = array('I', self.deltas)
+        self.deltas.append(delta)
+        self.tfs.append(min(tf, 255))
+        self.last = docno
+
+    def docnos(self) -> Iterable[int]:
+        return accumulate(self.deltas)
+
+    def __len__(self):
+        return len(self.tfs)
+
+    def nbytes(self) -> int:
+        return len(self.deltas) * self.deltas.itemsize + len(self.tfs)
+
+
+class SearchIndex:
+    def __init__(self, k1: float = 1.2, b: float = 0.75, compact_ratio: float = 0.2):
+        self.k1 = k1
+        self.b = b
+        self.compact_ratio = compact_ratio
+        self._lock = threading.RLock()
+        self.ready = False
+        self._reset()
+
+    def _reset(self):
+        self._postings: Dict[str, Posting] = {}
+        self._doc_ids: List[Optional[str]] = []   # 文档号 -> 文章ID（已删除为 None）
+        self._docnos: Dict[str, int] = {}          # 文章ID -> 文档号
+        self._doc_lens = array('I')
+        self._total_len = 0
+        self._deleted = 0
+
+    def init_app(self, app):
+        article_events.subscribe(self.on_article_event)
+
+    # ==================== 索引维护 ====================
+
+    def on_article_event(self, event: str, article):
+        if event in ('loaded', 'created', 'updated'):
+            self.add(article)
+        elif event == 'deleted':
+            self.remove(article.get('id'))
+        elif event == 'bootstrapped':
+            self.ready = True
+
+    @staticmethod
+    def _weighted_terms(article: dict) -> Counter:
+        counts = Counter()
+        for field, weight in FIELD_WEIGHTS:
+            value = article.get(field)
+            if isinstance(value, list):
+                value = ' '.join(str(tag) for tag in value)
+            for term in tokenize(value or ''):
+                counts[term] += weight
+        return counts
+
+    def add(self, article: dict):
+        """新增或更新一篇文章；非公开文章只会被移除"""
+        article_id = article.get('id')
+        if not article_id:
+            return
+        if article.get('is_public_visible') is False:
+            self.remove(article_id)
+            return
+
+        counts = self._weighted_terms(article)
+        with self._lock:
+            self._remove_locked(article_id)
+            docno = len(self._doc_ids)
+            self._doc_ids.append(article_id)
+            self._docnos[article_id] = docno
+            doc_len = sum(counts.values())
+            self._doc_lens.append(doc_len)
+            self._total_len += doc_len
+            postings = self._postings
+            for term, tf in counts.items():
+                posting = postings.get(term)
+                if posting is None:
+                    posting = postings[term] = Posting()
+                posting.append(docno, tf)
+
+    def remove(self, article_id: Optional[str]):
+        if not article_id:
+            return
+        with self._lock:
+            self._remove_locked(article_id)
+            if self._deleted > 1000 and self._deleted > self.compact_ratio * len(self._doc_ids):
+                self._compact_locked()
+
+    def _remove_locked(self, article_id: str):
+        docno = self._docnos.pop(article_id, None)
+        if docno is None:
+            return
+        self._doc_ids[docno] = None
+        self._total_len -= self._doc_lens[docno]
+        self._deleted += 1
+
+    def _compact_locked(self):
+        """重新编号存活文档并重建倒排表，回收已删除文档占用的空间"""
+        remap = {}
+        doc_ids: List[Optional[str]] = []
+        doc_lens = array('I')
+        for docno, article_id in enumerate(self._doc_ids):
+            if article_id is not None:
+                remap[docno] = len(doc_ids)
+                doc_ids.append(article_id)
+                doc_lens.append(self._doc_lens[docno])
+
+        postings: Dict[str, Posting] = {}
+        for term, posting in self._postings.items():
+            rebuilt = Posting()
+            for docno, tf in zip(posting.docnos(), posting.tfs):
+                new_docno = remap.get(docno)
+                if new_docno is not None:
+                    rebuilt.append(new_docno, tf)
+            if len(rebuilt):
+                postings[term] = rebuilt
+
+        self._postings = postings
+        self._doc_ids = doc_ids
+        self._doc_lens = doc_lens
+        self._docnos = {article_id: docno for docno, article_id in enumerate(doc_ids)}
+        self._deleted = 0
+
+    # ==================== 查询 ====================
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> Tuple[List[Tuple[str, float]], int]:
+        """BM25 检索，返回 ([(文章ID, 得分)], 命中总数)"""
+        terms = query_terms(query)
+        if not terms:
+            return [], 0
+
+        with self._lock:
+            live_docs = len(self._docnos)
+            if not live_docs:
+                return [], 0
+            avg_len = self._total_len / live_docs
+            k1, b = self.k1, self.b
+            doc_ids, doc_lens = self._doc_ids, self._doc_lens
+            scores: Dict[int, float] = {}
+
+            for term in terms:
+                posting = self._postings.get(term)
+                if posting is None:
+                    continue
+                # 文档频率只计存活文档，已删除但尚未压缩的条目不能压低 IDF
+                live = [(docno, tf) for docno, tf in zip(posting.docnos(), posting.tfs) if doc_ids[docno] is not None]
+                df = len(live)
+                if not df:
+                    continue
+                idf = math.log(1 + (live_docs - df + 0.5) / (df + 0.5))
+                norm = k1 * (1 - b)
+                slope = k1 * b / avg_len
+                for docno, tf in live:
+                    score = idf * tf * (k1 + 1) / (tf + norm + slope * doc_lens[docno])
+                    scores[docno] = scores.get(docno, 0.0) + score
+
+            top = nlargest(offset + limit, scores.items(), key=lambda item: item[1])
+            results = [(doc_ids[docno], score) for docno, score in top[offset:]]
+            return results, len(scores)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'ready': self.ready,
+                'documents': len(self._docnos),
+                'deleted': self._deleted,
+                'terms': len(self._postings),
+                'postings': sum(len(p) for p in self._postings.values()),
+                'posting_bytes': sum(p.nbytes() for p in self._postings.values())
+            }
+
+
+search_index = SearchIndex()
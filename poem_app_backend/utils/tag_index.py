@@ -0,0 +1,186 @@
+"""
+标签索引：article_tags 表的进程内镜像
+
+- 每个标签一个按 (created_at 微秒, 文章ID) 升序排列的列表，标签页按游标倒序分页，只需一次二分查找；
+- 标签的文章数即列表长度，热门标签排行在变更后惰性重算；
+- 前缀自动补全使用字典树（trie），候选按文章数排序。
+
+与 search_index 一样订阅 article_events：启动扫描时构建，文章增删改时增量维护，只收录公开文章。
+索引就绪前路由退回到数据库中的 article_tags / tag_counts 表。
+"""
+
+import threading
+from bisect import bisect_left, insort
+from heapq import nlargest
+from typing import Dict, List, Optional, Tuple
+
+from utils.article_events import article_events
+from utils.timestamps import to_epoch_micros
+
+TagKey = Tuple[int, str]
+
+
+def normalize_tag(tag) -> str:
+    """标签规范化：去掉首尾空白并转小写（与迁移脚本中的 lower(btrim(tag)) 一致）"""
+    return str(tag or '').strip().lower()
+
+
+class _TrieNode:
+    __slots__ = ('children', 'terminal')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.terminal = False
+
+
+class TagIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.ready = False
+        self._entries: Dict[str, List[TagKey]] = {}        # 标签 -> 升序 (created_at, 文章ID)
+        self._article_tags: Dict[str, Tuple[TagKey, Tuple[str, ...]]] = {}  # 文章ID -> (排序键, 标签)
+        self._trie = _TrieNode()
+        self._popular: Optional[List[Tuple[str, int]]] = None
+
+    def init_app(self, app):
+        article_events.subscribe(self.on_article_event)
+
+    # ==================== 索引维护 ====================
+
+    def on_article_event(self, event: str, article):
+        if event in ('loaded', 'created', 'updated'):
+            self.add(article)
+        elif event == 'deleted':
+            self.remove(article.get('id'))
+        elif event == 'bootstrapped':
+            self.ready = True
+
+    def add(self, article: dict):
+        article_id = article.get('id')
+        if not article_id:
+            return
+        tags = tuple(dict.fromkeys(filter(None, (normalize_tag(tag) for tag in article.get('tags') or []))))
+        if article.get('is_public_visible') is False or not tags:
+            self.remove(article_id)
+            return
+
+        key = (to_epoch_micros(article.get('created_at')) or 0, article_id)
+        with self._lock:
+            if self._article_tags.get(article_id) == (key, tags):
+                return
+            self._remove_locked(article_id)
+            for tag in tags:
+                entries = self._entries.get(tag)
+                if entries is None:
+                    entries = self._entries[tag] = []
+                    self._trie_insert(tag)
+                insort(entries, key)
+            self._article_tags[article_id] = (key, tags)
+            self._popular = None
+
+    def remove(self, article_id: Optional[str]):
+        if not article_id:
+            return
+        with self._lock:
+            self._remove_locked(article_id)
+
+    def _remove_locked(self, article_id: str):
+        previous = self._article_tags.pop(article_id, None)
+        if previous is None:
+            return
+        key, tags = previous
+        for tag in tags:
+            entries = self._entries.get(tag)
+            if not entries:
+                continue
+            position = bisect_left(entries, key)
+            if position < len(entries) and entries[position] == key:
+                del entries[position]
+            if not entries:
+                del self._entries[tag]
+                self._trie_remove(tag)
+        self._popular = None
+
+    def _trie_insert(self, tag: str):
+        node = self._trie
+        for char in tag:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _TrieNode()
+            node = child
+        node.terminal = True
+
+    def _trie_remove(self, tag: str):
+        path = [self._trie]
+        for char in tag:
+            node = path[-1].children.get(char)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].terminal = False
+        # 自底向上剪掉不再有用的分支
+        for depth in range(len(tag), 0, -1):
+            node = path[depth]
+            if node.terminal or node.children:
+                break
+            del path[depth - 1].children[tag[depth - 1]]
+
+    # ==================== 查询 ====================
+
+    def page(self, tag: str, limit: int = 20, before: Optional[TagKey] = None) -> Tuple[List[str], Optional[TagKey]]:
+        """
+        标签页分页：返回 (文章ID列表, 下一页游标)。文章按创建时间倒序，
+        before 为上一页最后一篇的 (created_at 微秒, 文章ID)。
+        """
+        with self._lock:
+            entries = self._entries.get(normalize_tag(tag)) or []
+            end = bisect_left(entries, before) if before else len(entries)
+            start = max(0, end - limit)
+            keys = entries[start:end][::-1]
+        next_cursor = keys[-1] if keys and start > 0 else None
+        return [article_id for _, article_id in keys], next_cursor
+
+    def count(self, tag: str) -> int:
+        return len(self._entries.get(normalize_tag(tag)) or ())
+
+    def popular(self, limit: int = 20) -> List[Tuple[str, int]]:
+        popular = self._popular
+        if popular is None:
+            with self._lock:
+                popular = sorted(
+                    ((tag, len(entries)) for tag, entries in self._entries.items()),
+                    key=lambda item: (-item[1], item[0])
+                )
+                self._popular = popular
+        return popular[:limit]
+
+    def autocomplete(self, prefix: str, limit: int = 10) -> List[Tuple[str, int]]:
+        prefix = normalize_tag(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            node = self._trie
+            for char in prefix:
+                node = node.children.get(char)
+                if node is None:
+                    return []
+            matches = []
+            stack = [(node, prefix)]
+            while stack:
+                node, tag = stack.pop()
+                if node.terminal:
+                    matches.append((tag, len(self._entries.get(tag) or ())))
+                stack.extend((child, tag + char) for char, child in node.children.items())
+        return nlargest(limit, matches, key=lambda item: item[1])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'ready': self.ready,
+                'tags': len(self._entries),
+                'articles': len(self._article_tags),
+                'entries': sum(len(entries) for entries in self._entries.values())
+            }
+
+
+tag_index = TagIndex()
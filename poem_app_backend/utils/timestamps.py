@@ -0,0 +1,41 @@
+"""
+时间戳解析工具
+
+PostgREST 返回的 timestamptz 会省略小数秒末尾的 0（例如 2024-12-19T10:00:00.12345+00:00），
+Python 3.9 的 datetime.fromisoformat 只接受 3 位或 6 位小数，这里统一补齐后再解析。
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+_FRACTION_RE = re.compile(r'\.(\d+)')
+
+def parse_timestamp(value) -> Optional[datetime]:
+    """解析 ISO 8601 时间字符串为带时区的 datetime（无时区信息时视为 UTC），失败返回 None"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        text = str(value).strip().replace('Z', '+00:00').replace(' ', 'T', 1)
+        text = _FRACTION_RE.sub(lambda m: '.' + m.group(1)[:6].ljust(6, '0'), text, count=1)
+        try:
+            parsed = datetime.fromisoformat(text)
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+def to_epoch_micros(value) -> Optional[int]:
+    """ISO 时间字符串 -> 微秒级 Unix 时间戳"""
+    parsed = parse_timestamp(value)
+    if parsed is None:
+        return None
+    delta = parsed - datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+def from_epoch_micros(micros: int) -> str:
+    """微秒级 Unix 时间戳 -> ISO 8601 UTC 时间字符串"""
+    return (datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(microseconds=micros)).isoformat()
@@ -0,0 +1,369 @@
+"""
+热门文章（时间衰减）排行
+
+每篇文章的热度 = Σ 权重 × exp(-λ·(现在 - 事件时间))，λ 由半衰期 TRENDING_HALF_LIFE_HOURS 决定。
+所有文章随时间按同一比例衰减，因此在对数空间里存放 log Σ 权重 × exp(λ·(事件时间 - EPOCH))，
+它只在有新点赞时变化，排序与当前时刻无关：
+- 新点赞只需一次 logaddexp，并向堆中压入新条目（惰性堆，旧条目在出堆时按版本丢弃）；
+- 新文章以发布时间计入一次基础权重，启动扫描时已有的点赞按发布时间计入；
+- 取消点赞按被取消的那次点赞的时间（liked_at）减去它衰减后的权重；减去的量不超过当前得分中平均一份的权重
+  （剩余点赞数 + 基础权重 + 被取消的一次），已按发布时间折算的旧点赞被取消时不会把整篇文章的热度清零。
+
+多进程与持久化（SQLite，WAL，位于 SHARED_STATE_DIR）：
+- trending_events: 点赞事件日志；处理点赞的请求只把事件放进进程内队列并唤醒后台线程，
+  由后台线程批量写入，再按自增ID增量读取并应用（包括其他 worker 写入的事件）；
+- trending_scores: 持有文件锁的进程每 TRENDING_PERSIST_SECONDS 写入一次完整快照（含事件水位），
+  重启时加载快照并只回放水位之后的事件，不需要重新扫描 article_likes。
+"""
+
+import heapq
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from utils.article_events import article_events
+from utils.timestamps import to_epoch_micros
+
+try:
+    import fcntl
+except ImportError:  # Windows 开发环境没有 fcntl，单进程运行时直接视为持有锁
+    fcntl = None
+
+# 对数得分的时间原点（2024-01-01 UTC）
+EPOCH = 1704067200.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trending_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    article_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    delta INTEGER NOT NULL,
+    liked_at REAL,
+    like_count INTEGER
+);
+CREATE TABLE IF NOT EXISTS trending_scores (
+    article_id TEXT PRIMARY KEY,
+    log_score REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS trending_meta (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+
+def _logaddexp(a: float, b: float) -> float:
+    if a == -math.inf:
+        return b
+    if b == -math.inf:
+        return a
+    high, low = (a, b) if a > b else (b, a)
+    return high + math.log1p(math.exp(low - high))
+
+
+def _logsubexp(a: float, b: float) -> float:
+    """log(exp(a) - exp(b))，结果不为正数时返回 -inf"""
+    if b == -math.inf:
+        return a
+    if b >= a:
+        return -math.inf
+    return a + math.log1p(-math.exp(b - a))
+
+
+class TrendingIndex:
+    def __init__(self, half_life_hours: float = 24.0):
+        self.decay = math.log(2) / (half_life_hours * 3600)
+        self.path: Optional[str] = None
+        self.persist_seconds = 60.0
+        self.sync_seconds = 2.0
+        self.event_retention_seconds = 3600.0
+        self.ready = False
+
+        self._lock = threading.Lock()
+        self._scores: Dict[str, float] = {}           # 文章ID -> 对数得分
+        self._heap: List[Tuple[float, str]] = []      # (-对数得分, 文章ID)，可能含过期条目
+        self._watermark = 0                           # 已应用的最大事件ID
+        self._worker_pid: Optional[int] = None
+        self._lock_file = None
+        self._last_persist = 0.0
+        self._loaded_ids = set()                      # 启动扫描中见到的公开文章
+        self._pending = deque()                       # 等待后台线程写入事件日志的点赞
+        self._wakeup = threading.Event()
+
+    # ==================== 配置与事件 ====================
+
+    def init_app(self, app):
+        config = app.config
+        self.decay = math.log(2) / (config.get('TRENDING_HALF_LIFE_HOURS', 24.0) * 3600)
+        self.persist_seconds = config.get('TRENDING_PERSIST_SECONDS', self.persist_seconds)
+        self.path = config.get('TRENDING_PATH')
+        if self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = self._connect()
+            try:
+                conn.executescript(SCHEMA)
+                # 旧版本创建的事件表没有取消点赞所需的两列
+                columns = {row[1] for row in conn.execute('PRAGMA table_info(trending_events)')}
+                for column, kind in (('liked_at', 'REAL'), ('like_count', 'INTEGER')):
+                    if column not in columns:
+                        conn.execute(f'ALTER TABLE trending_events ADD COLUMN {column} {kind}')
+            finally:
+                conn.close()
+            self.load_snapshot()
+            app.before_request(self.ensure_worker)
+        article_events.subscribe(self.on_article_event)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def on_article_event(self, event: str, article):
+        if event == 'loaded' and article.get('is_public_visible') is not False:
+            self._loaded_ids.add(article.get('id'))
+        if event in ('loaded', 'created', 'updated'):
+            if article.get('is_public_visible') is False:
+                self.remove(article.get('id'))
+            else:
+                self.seed(article)
+        elif event == 'deleted':
+            self.remove(article.get('id'))
+        elif event == 'liked' and article.get('source') != 'change_feed':
+            # 变更订阅转来的点赞已由处理点赞的 worker 写入事件日志，不重复计入
+            liked_at = to_epoch_micros(article.get('liked_at'))
+            self.record_like(article['id'], article.get('delta', 1),
+                             liked_at=liked_at / 1e6 if liked_at else None, like_count=article.get('like_count'))
+        elif event == 'bootstrapped':
+            # 快照中已被删除的文章在启动扫描里不会出现，一并清理
+            with self._lock:
+                for article_id in set(self._scores) - self._loaded_ids:
+                    del self._scores[article_id]
+            self._loaded_ids = set()
+            self.ready = True
+
+    def seed(self, article: dict):
+        """首次见到的文章：发布时间计入一次基础权重，已有点赞按发布时间计入"""
+        article_id = article.get('id')
+        if not article_id or article_id in self._scores:
+            return
+        created = (to_epoch_micros(article.get('created_at')) or time.time() * 1e6) / 1e6
+        weight = 1 + max(article.get('like_count') or 0, 0)
+        with self._lock:
+            if article_id not in self._scores:
+                self._set_locked(article_id, math.log(weight) + self.decay * (created - EPOCH))
+
+    def remove(self, article_id: Optional[str]):
+        if article_id:
+            with self._lock:
+                self._scores.pop(article_id, None)
+
+    def _set_locked(self, article_id: str, log_score: float):
+        self._scores[article_id] = log_score
+        heapq.heappush(self._heap, (-log_score, article_id))
+        # 过期条目过多时重建堆
+        if len(self._heap) > 2 * len(self._scores) + 1024:
+            self._heap = [(-score, key) for key, score in self._scores.items()]
+            heapq.heapify(self._heap)
+
+    def _apply_locked(self, article_id: str, ts: float, delta: int, liked_at: Optional[float] = None,
+                      like_count: Optional[int] = None):
+        current = self._scores.get(article_id)
+        if current is None:
+            # 私密/已删除或尚未载入的文章，等 seed 时以 like_count 计入
+            return
+        if delta > 0:
+            contribution = math.log(delta) + self.decay * (ts - EPOCH)
+            self._set_locked(article_id, _logaddexp(current, contribution))
+            return
+        # 取消点赞：减去被取消的那次点赞衰减后的权重（时间未知时按现在），最多减去平均一份
+        contribution = math.log(-delta) + self.decay * ((liked_at or ts) - EPOCH)
+        units = max(like_count or 0, 0) + 2
+        contribution = min(contribution, current - math.log(units))
+        self._set_locked(article_id, _logsubexp(current, contribution))
+
+    def record_like(self, article_id: str, delta: int = 1, liked_at: Optional[float] = None,
+                    like_count: Optional[int] = None):
+        """
+        记录一次点赞（delta=1）或取消点赞（delta=-1）
+
+        Args:
+            liked_at: 取消点赞时，被取消的那次点赞的 Unix 时间
+            like_count: 变化后的点赞数（限制取消点赞减去的权重）
+        """
+        now = time.time()
+        if not self.path:
+            with self._lock:
+                self._apply_locked(article_id, now, delta, liked_at, like_count)
+            return
+        # 请求线程只入队，写入事件日志与回放由后台线程完成（deque.append 是原子操作）
+        self._pending.append((article_id, now, delta, liked_at, like_count))
+        self.ensure_worker()
+        self._wakeup.set()
+
+    def flush(self):
+        """把队列中的点赞批量写入事件日志"""
+        batch = []
+        while self._pending:
+            try:
+                batch.append(self._pending.popleft())
+            except IndexError:
+                break
+        if not batch:
+            return
+        conn = self._connect()
+        try:
+            conn.executemany(
+                'INSERT INTO trending_events (article_id, ts, delta, liked_at, like_count) VALUES (?, ?, ?, ?, ?)',
+                batch
+            )
+        except Exception:
+            # 写入失败时放回队首，下一轮重试
+            self._pending.extendleft(reversed(batch))
+            raise
+        finally:
+            conn.close()
+
+    # ==================== 查询 ====================
+
+    def top(self, limit: int = 20, offset: int = 0) -> List[Tuple[str, float]]:
+        """返回 [(文章ID, 当前热度)]，按热度从高到低"""
+        now_offset = self.decay * (time.time() - EPOCH)
+        wanted = offset + limit
+        with self._lock:
+            heap, scores = self._heap, self._scores
+            valid, seen = [], set()
+            while heap and len(valid) < wanted:
+                entry = heapq.heappop(heap)
+                negative, article_id = entry
+                # 惰性删除：得分已变化、文章已移除或重复的条目直接丢弃
+                if article_id in seen or scores.get(article_id) != -negative:
+                    continue
+                seen.add(article_id)
+                valid.append(entry)
+            for entry in valid:
+                heapq.heappush(heap, entry)
+        return [(article_id, math.exp(-negative - now_offset)) for negative, article_id in valid[offset:]]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'ready': self.ready,
+                'articles': len(self._scores),
+                'heap_entries': len(self._heap),
+                'watermark': self._watermark
+            }
+
+    # ==================== 多进程同步与持久化 ====================
+
+    def load_snapshot(self):
+        """加载上次持久化的得分快照，并回放之后的事件"""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT value FROM trending_meta WHERE key = 'watermark'").fetchone()
+            rows = conn.execute('SELECT article_id, log_score FROM trending_scores').fetchall()
+        finally:
+            conn.close()
+        with self._lock:
+            self._scores = dict(rows)
+            self._heap = [(-score, article_id) for article_id, score in rows]
+            heapq.heapify(self._heap)
+            self._watermark = int(row[0]) if row else 0
+        if rows:
+            self.ready = True
+        self.sync()
+
+    def sync(self):
+        """增量应用水位之后的点赞事件"""
+        if not self.path:
+            return
+        conn = self._connect()
+        try:
+            while True:
+                rows = conn.execute(
+                    'SELECT id, article_id, ts, delta, liked_at, like_count FROM trending_events '
+                    'WHERE id > ? ORDER BY id LIMIT 5000',
+                    (self._watermark,)
+                ).fetchall()
+                if not rows:
+                    return
+                with self._lock:
+                    for event_id, article_id, ts, delta, liked_at, like_count in rows:
+                        if event_id > self._watermark:
+                            self._apply_locked(article_id, ts, delta, liked_at, like_count)
+                            self._watermark = event_id
+        finally:
+            conn.close()
+
+    def ensure_worker(self):
+        """确保当前进程中运行着同步线程（fork 之后需要重新启动）"""
+        if not self.path or self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker_pid == os.getpid():
+                return
+            self._worker_pid = os.getpid()
+            self._lock_file = None
+            self._wakeup = threading.Event()
+        threading.Thread(target=self._run, name='trending-sync', daemon=True).start()
+
+    def _run(self):
+        while True:
+            # 有新点赞时立即唤醒，写入后马上回放，本进程的排行很快可见
+            self._wakeup.wait(self.sync_seconds)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                self.sync()
+                if time.time() - self._last_persist >= self.persist_seconds and self._acquire_leadership():
+                    self.persist()
+            except Exception as e:
+                print(f"Trending sync error: {e}")
+
+    def _acquire_leadership(self) -> bool:
+        if self._lock_file is not None:
+            return True
+        if fcntl is None:
+            self._lock_file = True
+            return True
+        lock_file = open(self.path + '.lock', 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def persist(self):
+        """写入完整快照，并清理已折叠进快照且超过保留时间的事件"""
+        with self._lock:
+            rows = [(article_id, score) for article_id, score in self._scores.items() if score != -math.inf]
+            watermark = self._watermark
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM trending_scores')
+            conn.executemany('INSERT INTO trending_scores (article_id, log_score) VALUES (?, ?)', rows)
+            conn.execute("INSERT OR REPLACE INTO trending_meta (key, value) VALUES ('watermark', ?)", (watermark,))
+            # 保留一段时间的事件，给还没追上的 worker 回放
+            conn.execute(
+                'DELETE FROM trending_events WHERE id <= ? AND ts < ?',
+                (watermark, time.time() - self.event_retention_seconds)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+        self._last_persist = time.time()
+
+
+trending_index = TrendingIndex()
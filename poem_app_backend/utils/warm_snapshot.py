@@ -0,0 +1,438 @@
+"""
+热缓存快照（worker 重启后不必从零预热）
+
+gunicorn 每个 worker 处理约 1000 个请求后被回收（max_requests + jitter），Render 重新部署会重启全部进程，
+新进程要分页扫描整张 articles 表才能建好搜索、标签、相关推荐等内存索引，热点文章与首页缓存也要逐个回源。
+WarmSnapshot 把这些状态定期写入 SHARED_STATE_DIR 下的一个二进制文件：
+- articles: 全部文章的紧凑记录（ArticleRecord.to_state()，marshal 编码，每 1000 篇一帧），点赞数随文章保存；
+- feeds:    读取缓存中匿名访问的列表条目（键 + 文章ID）；
+- cached:   读取缓存中的单篇文章ID（按最近使用顺序）；
+- hot:      HotArticles 的 Space-Saving 计数。
+搜索等索引由文章重新构建（只消耗 CPU），不单独保存。
+
+文件格式：文件头（魔数、Python 版本、字段签名、写入时间、水位、分段数）+ 分段表（名称、偏移、长度、CRC32）+ 分段数据；
+写入临时文件后原子替换。marshal 格式随 Python 版本变化，版本或字段不一致、校验失败的快照直接忽略。
+
+水位：快照中的文章对应数据库在水位时刻的状态。写入前先补读水位之后的变更（修改的文章、删除墓碑、点赞数，
+与 /api/sync 使用同样的查询，需要 create_article_sync.sql）并推进水位。启动时 article_events.bootstrap()
+先用 mmap 打开快照、补读水位之后的变更，合并后把每篇文章以 loaded 事件发布，各索引与全量扫描时一样构建；
+列表与单篇文章以已过期状态放回读取缓存，第一次读取直接返回并在后台刷新。
+快照不存在、无效、早于墓碑保留期或补读失败时退回全量扫描。
+
+快照由持有文件锁的一个 worker 每 WARM_SNAPSHOT_INTERVAL_SECONDS 写入一次，该 worker 退出时（gunicorn worker_exit）再写入一次。
+"""
+
+import marshal
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from utils.article_events import article_events
+from utils.article_record import FIELDS, ArticleRecord, record_key
+from utils.heavy_hitters import hot_articles
+
+try:
+    import fcntl
+except ImportError:  # Windows 开发环境没有 fcntl，单进程运行时直接视为持有锁
+    fcntl = None
+
+MAGIC = b'PVWARM01'
+# 魔数、Python 主/次版本、字段签名、写入时间与水位（微秒）、分段数
+HEADER = struct.Struct('<8s2BIqqI')
+# 分段名称、偏移、长度、CRC32
+SECTION = struct.Struct('<8sQQI')
+FRAME = struct.Struct('<I')
+FRAME_ARTICLES = 1000
+FIELDS_SIGNATURE = zlib.crc32(','.join(FIELDS).encode('ascii'))
+
+
+def _now_micros() -> int:
+    return int(time.time() * 1_000_000)
+
+
+class SnapshotFile:
+    """以 mmap 只读打开的快照文件；文件头或任一分段校验失败时抛出 ValueError"""
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # 空文件无法映射
+            self._file.close()
+            raise
+        self._view = memoryview(self._map)
+        self.sections: Dict[bytes, memoryview] = {}
+        try:
+            self._parse()
+        except Exception:
+            self.close()
+            raise
+
+    def _parse(self):
+        if len(self._map) < HEADER.size:
+            raise ValueError('快照文件过短')
+        magic, major, minor, signature, self.written_at, self.watermark, count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or (major, minor) != sys.version_info[:2] or signature != FIELDS_SIGNATURE:
+            raise ValueError('快照格式或 Python 版本不一致')
+        for index in range(count):
+            name, offset, length, checksum = SECTION.unpack_from(self._map, HEADER.size + index * SECTION.size)
+            view = self._view[offset:offset + length]
+            if len(view) != length or zlib.crc32(view) != checksum:
+                view.release()
+                raise ValueError(f'快照分段 {name.rstrip(bytes(1)).decode()} 校验失败')
+            self.sections[name.rstrip(bytes(1))] = view
+
+    def load(self, name: bytes, default=None):
+        view = self.sections.get(name)
+        return default if view is None else marshal.loads(view)
+
+    def frames(self, name: bytes) -> Iterator[list]:
+        """逐帧解码分段（每帧一个 marshal 列表），不把整个分段复制进内存"""
+        view = self.sections.get(name)
+        position = 0
+        while view is not None and position < len(view):
+            (length,) = FRAME.unpack_from(view, position)
+            position += FRAME.size
+            yield marshal.loads(view[position:position + length])
+            position += length
+
+    def close(self):
+        for view in self.sections.values():
+            view.release()
+        self.sections.clear()
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class WarmSnapshot:
+    def __init__(self):
+        self.enabled = False
+        self.path: Optional[str] = None
+        self.interval = 300.0
+        self.overlap_seconds = 5.0
+        self.retention_seconds = 90 * 86400.0
+        self.page_size = 500
+        self.max_pages = 20
+        self.watermark: Optional[int] = None
+        self.stats = {'written': 0, 'write_errors': 0, 'restored': 0, 'fallbacks': 0, 'bytes': 0,
+                      'last_written_at': None, 'restored_articles': 0, 'primed_entries': 0}
+
+        self._lock = threading.Lock()
+        self._records: Dict[object, ArticleRecord] = {}   # 登记键 -> 记录，跟踪全部文章
+        self._worker_pid: Optional[int] = None
+        self._lock_file = None
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get('WARM_SNAPSHOT_ENABLED', False)
+        self.interval = config.get('WARM_SNAPSHOT_INTERVAL_SECONDS', self.interval)
+        self.overlap_seconds = config.get('SYNC_OVERLAP_SECONDS', self.overlap_seconds)
+        self.retention_seconds = config.get('SYNC_TOMBSTONE_RETENTION_DAYS', 90) * 86400.0
+        self.page_size = config.get('SYNC_PAGE_SIZE', self.page_size)
+        self.max_pages = config.get('WARM_SNAPSHOT_MAX_PAGES', self.max_pages)
+        self.path = config.get('WARM_SNAPSHOT_PATH')
+        if not self.enabled or not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        article_events.subscribe(self.on_article_event)
+        app.before_request(self.ensure_worker)
+
+    # ==================== 跟踪文章 ====================
+
+    def on_article_event(self, event: str, article):
+        if event in ('loaded', 'created', 'updated'):
+            if article.get('id') is None:
+                return
+            record = ArticleRecord.from_row(article)
+            with self._lock:
+                self._records[record_key(article['id'])] = record
+        elif event == 'deleted':
+            with self._lock:
+                self._records.pop(record_key(article.get('id')), None)
+        elif event == 'liked':
+            self._set_like_count(article.get('id'), article.get('like_count'))
+        elif event == 'bootstrapped':
+            self.watermark = article_events.watermark
+
+    def _set_like_count(self, article_id, like_count):
+        if like_count is None:
+            return
+        key = record_key(article_id)
+        with self._lock:
+            record = self._records.get(key)
+            if record is not None and record.get('like_count') != like_count:
+                self._records[key] = ArticleRecord.from_row({**record.to_dict(), 'like_count': like_count})
+
+    # ==================== 补读变更 ====================
+
+    def _drain(self, fetch: Callable, column: str, since: int) -> List[dict]:
+        """从 since 起读完一个变更列表；超过 max_pages 页时放弃（变更太多不如全量扫描）"""
+        from models.supabase_client import supabase_client
+
+        rows, cursor = [], since
+        for _ in range(self.max_pages):
+            page, cursor = supabase_client.fetch_changes(fetch, column, cursor, self.page_size)
+            rows.extend(page)
+            if cursor is None:
+                return rows
+        raise RuntimeError(f'{column} 之后的变更超过 {self.max_pages} 页')
+
+    def changes_since(self, since: int) -> Tuple[Dict[str, dict], set, Dict[str, int], int]:
+        """
+        水位之后的变更
+
+        Returns:
+            (修改或新建的文章 {ID: 行}, 删除的文章ID, 点赞数变化 {ID: 计数}, 新水位)
+        """
+        from models.supabase_client import supabase_client as client
+
+        started = _now_micros()
+        changed, tombstones, likes = client.fan_out(
+            lambda: self._drain(lambda at, n, exact=False: client.get_articles_changed_since(at, n, exact=exact),
+                                'updated_at', since),
+            lambda: self._drain(lambda at, n, exact=False: client.get_tombstones_since(at, n, exact=exact),
+                                'deleted_at', since),
+            lambda: self._drain(lambda at, n, exact=False: client.get_like_counts_since(at, n, exact=exact),
+                                'like_count_updated_at', since)
+        )
+        changed = {row['id']: row for row in changed}
+        deleted = {row['article_id'] for row in tombstones}
+        like_counts = {row['id']: row.get('like_count') or 0 for row in likes if row['id'] not in changed}
+        return changed, deleted, like_counts, started - int(self.overlap_seconds * 1_000_000)
+
+    # ==================== 启动恢复 ====================
+
+    def restore(self, publish: Callable) -> Optional[Tuple[int, int]]:
+        """
+        从快照恢复：合并水位之后的变更，逐篇发布 loaded 事件，再把列表与热点放回缓存
+
+        Returns:
+            (发布的文章数, 新水位)；快照不可用时返回 None，由调用方全量扫描
+        """
+        if not self.enabled or not self.path or not os.path.exists(self.path):
+            return None
+        started = time.time()
+        try:
+            snapshot = SnapshotFile(self.path)
+        except (OSError, ValueError) as e:
+            print(f"Warm snapshot ignored: {e}")
+            self.stats['fallbacks'] += 1
+            return None
+
+        with snapshot:
+            if b'articles' not in snapshot.sections:
+                print("Warm snapshot ignored: no articles section")
+                self.stats['fallbacks'] += 1
+                return None
+            if snapshot.watermark < _now_micros() - self.retention_seconds * 1_000_000:
+                print("Warm snapshot ignored: older than tombstone retention")
+                self.stats['fallbacks'] += 1
+                return None
+            try:
+                changed, deleted, like_counts, watermark = self.changes_since(snapshot.watermark)
+            except Exception as e:
+                print(f"Warm snapshot reconcile failed, falling back to full scan: {e}")
+                self.stats['fallbacks'] += 1
+                return None
+
+            count = 0
+            for states in snapshot.frames(b'articles'):
+                for state in states:
+                    record = ArticleRecord.from_state(state)
+                    article_id = record.get('id')
+                    if article_id in deleted:
+                        continue
+                    row = changed.pop(article_id, None)
+                    if row is None:
+                        row = record.to_dict()
+                        if article_id in like_counts:
+                            row['like_count'] = like_counts[article_id]
+                    publish('loaded', row)
+                    count += 1
+            # 快照之后新建的文章
+            for row in changed.values():
+                publish('loaded', row)
+                count += 1
+
+            primed = self._prime(snapshot)
+            hot_articles.restore(snapshot.load(b'hot', []))
+
+        self.stats['restored'] += 1
+        self.stats['restored_articles'] = count
+        self.stats['primed_entries'] = primed
+        age = time.time() - snapshot.written_at / 1_000_000
+        print(f"Warm snapshot restored: {count} articles, {primed} cache entries "
+              f"(snapshot age {age:.0f}s, {time.time() - started:.1f}s)")
+        return count, watermark
+
+    def _prime(self, snapshot: SnapshotFile) -> int:
+        """列表与单篇文章以已过期状态放回读取缓存；列表中有文章已被删除时整条丢弃"""
+        from models.supabase_client import supabase_client
+
+        cache = supabase_client.read_cache
+        stale = supabase_client.read_cache_stale
+        primed = 0
+        with self._lock:
+            records = self._records
+            for article_id in snapshot.load(b'cached', []):
+                record = records.get(record_key(article_id))
+                if record is not None:
+                    primed += cache.prime(('article', article_id), record,
+                                          supabase_client.read_cache_ttl.get('article', 0), stale)
+            for key, keys in snapshot.load(b'feeds', []):
+                articles = [records.get(article_key) for article_key in keys]
+                if None not in articles:
+                    primed += cache.prime(key, articles, supabase_client.read_cache_ttl.get('feed', 0), stale)
+        return primed
+
+    # ==================== 写入 ====================
+
+    def reconcile(self):
+        """补读水位之后的变更并应用到跟踪的文章上（不发布事件，本进程的索引不受影响），推进水位"""
+        changed, deleted, like_counts, watermark = self.changes_since(self.watermark)
+        for row in changed.values():
+            record = ArticleRecord.from_row(row)
+            with self._lock:
+                self._records[record_key(row['id'])] = record
+        with self._lock:
+            for article_id in deleted:
+                self._records.pop(record_key(article_id), None)
+        for article_id, like_count in like_counts.items():
+            self._set_like_count(article_id, like_count)
+        self.watermark = max(self.watermark, watermark)
+
+    def _sections(self) -> Dict[bytes, bytes]:
+        from models.supabase_client import supabase_client
+
+        with self._lock:
+            states = [record.to_state() for record in self._records.values()]
+        frames = bytearray()
+        for start in range(0, len(states), FRAME_ARTICLES):
+            # 每帧单独编码：同一帧内重复的驻留字符串（作者、标签）只保存一次
+            encoded = marshal.dumps(states[start:start + FRAME_ARTICLES])
+            frames += FRAME.pack(len(encoded)) + encoded
+
+        cache = supabase_client.read_cache
+        # 只保存匿名访问的列表（键的最后一个元素是当前用户ID）
+        feeds = [
+            (key, [record.id for record in value])
+            for key, value in cache.entries('feed')
+            if key[-1] is None and isinstance(value, list) and all(isinstance(r, ArticleRecord) for r in value)
+        ]
+        cached = [key[1] for key, value in cache.entries('article') if isinstance(value, ArticleRecord)]
+        hot = [(item['id'], item['count'], item['error']) for item in hot_articles.top(hot_articles.tracker.capacity)]
+        return {
+            b'articles': bytes(frames),
+            b'feeds': marshal.dumps(feeds),
+            b'cached': marshal.dumps(cached),
+            b'hot': marshal.dumps(hot)
+        }
+
+    def write(self, reconcile: bool = True) -> bool:
+        """写入一次快照；本进程尚未完成启动扫描时跳过"""
+        if not self.enabled or not self.path or not article_events.bootstrapped or self.watermark is None:
+            return False
+        if reconcile:
+            try:
+                self.reconcile()
+            except Exception as e:
+                # 沿用旧水位写入仍然正确，只是下次恢复时补读的范围更大
+                print(f"Warm snapshot reconcile failed: {e}")
+        sections = self._sections()
+
+        offset = HEADER.size + SECTION.size * len(sections)
+        table = bytearray()
+        for name, data in sections.items():
+            table += SECTION.pack(name, offset, len(data), zlib.crc32(data))
+            offset += len(data)
+        header = HEADER.pack(MAGIC, sys.version_info[0], sys.version_info[1], FIELDS_SIGNATURE,
+                             _now_micros(), self.watermark, len(sections))
+
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            with open(temp_path, 'wb') as handle:
+                handle.write(header)
+                handle.write(table)
+                for data in sections.values():
+                    handle.write(data)
+                handle.flush()
+                os.fsync(handle.fileno())
+            os.replace(temp_path, self.path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.stats['written'] += 1
+        self.stats['bytes'] = offset
+        self.stats['last_written_at'] = time.time()
+        return True
+
+    def write_on_exit(self):
+        """worker 退出前由持有写入锁的 worker 写入最后一次快照（不再访问数据库）"""
+        if self._lock_file is None or self._worker_pid != os.getpid():
+            return
+        try:
+            self.write(reconcile=False)
+        except Exception as e:
+            print(f"Warm snapshot write on exit failed: {e}")
+
+    # ==================== 后台线程 ====================
+
+    def ensure_worker(self):
+        """确保当前进程中运行着定期写入线程（fork 之后需要重新启动）"""
+        if not self.enabled or self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker_pid == os.getpid():
+                return
+            self._worker_pid = os.getpid()
+            self._lock_file = None
+        threading.Thread(target=self._run, name='warm-snapshot', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                if article_events.bootstrapped and self._acquire_leadership():
+                    self.write()
+            except Exception as e:
+                self.stats['write_errors'] += 1
+                print(f"Warm snapshot write error: {e}")
+
+    def _acquire_leadership(self) -> bool:
+        if self._lock_file is not None:
+            return True
+        if fcntl is None:
+            self._lock_file = True
+            return True
+        lock_file = open(self.path + '.lock', 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def snapshot(self) -> dict:
+        return {**self.stats, 'enabled': self.enabled, 'tracked_articles': len(self._records),
+                'watermark_age_seconds': None if self.watermark is None else
+                round(time.time() - self.watermark / 1_000_000, 1)}
+
+
+warm_snapshot = WarmSnapshot()